@@ -0,0 +1,202 @@
+# autotuner.py  – ganancias PIDf automáticas contra la planta simulada
+# --------------------------------------------------------------------
+# Busca (Kp, Ki, Kd, N) que minimicen el ITAE del salto ang_ini → ref
+# sobre el lazo muestreado no lineal (simulador.simular_lote), con
+#   • tiempo de establecimiento ≤ Tss
+#   • sobrepaso ≤ Mp
+#   • fracción de muestras con el PWM saturado ≤ saturacion_max
+# Las restricciones entran como penalización al costo:
+#   costo = ITAE + ITAE_quieto · Σ excesos relativos
+# (ITAE_quieto = |salto|·D²/2, el de no moverse: violar un 10 % una
+# restricción cuesta como un 10 % de no hacer nada).
+#
+# Método de entropía cruzada en escala logarítmica: cada generación
+# sortea una población alrededor de la media, la evalúa en lote
+# (barrido.evaluar_ganancias, repartida en un pool de procesos abierto
+# una sola vez) y mueve media y dispersión hacia la élite.  Corta antes
+# si la dispersión colapsa, si no mejora en `paciencia` generaciones,
+# si se pasa de `tiempo_max` o si `detener()` da True (botón de la GUI).
+# Arranca de la asignación de polos para (Tss, Mp) o de `inicial`.
+#
+#   r = autoajustar(ctrl, Tss=12, Mp=0.2, ang_ini_rad=np.radians(-50),
+#                   ref_rad=0.0)                 # Ts = ctrl.Ts (el del sketch)
+#   ctrl.set_pidf_coefs(r["Kp"], r["Ki"], r["Kd"], r["N"], r["Ts"])
+#
+#   python autotuner.py --tss 12 --mp 0.2 --inicial -50 --ref 0
+# --------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+from barrido import evaluar_ganancias, planta_de
+
+GANANCIAS = ("Kp", "Ki", "Kd", "N")
+LIMITES_GANANCIAS = {                # mismos máximos que los spin boxes
+    "Kp": (1e-2, 1e4),
+    "Ki": (1e-3, 1e4),
+    "Kd": (1e-2, 1e4),
+    "N":  (1e-1, 1e3),
+}
+
+
+def costo_itae(metricas, Tss, Mp, saturacion_max, itae_quieto, duracion):
+    """(costo, exceso) de cada candidato a partir de sus métricas."""
+    ts = np.where(np.isnan(metricas["ts"]), 2.0 * duracion, metricas["ts"])
+    exceso = (np.maximum(ts / Tss - 1.0, 0.0)
+              + np.maximum(metricas["sobrepaso"] / (100.0 * Mp) - 1.0, 0.0)
+              + np.maximum(metricas["saturacion"] - saturacion_max, 0.0)
+              / max(saturacion_max, 1e-3))
+    costo = metricas["itae"] + itae_quieto * exceso
+    return np.where(np.isfinite(costo), costo, np.inf), exceso
+
+
+def autoajustar(sistema, Tss, Mp, ang_ini_rad, ref_rad, Ts=None,
+                duracion=None, saturacion_max=0.2, inicial=None,
+                poblacion=256, elite=0.1, generaciones=40, paciencia=6,
+                tol=1e-3, tiempo_max=10.0, procesos=None, semilla=None,
+                detener=None, progreso=None):
+    """
+    Optimiza el PIDf para el salto ang_ini_rad → ref_rad en `sistema`
+    (ControlSystem: planta y PWM_eq).
+
+    • Ts: período del PIDf simulado [s]; None → sistema.Ts (el del sketch).
+    • duracion: horizonte simulado [s]; None → 2·Tss (mín. 3 s).
+    • inicial: (Kp, Ki, Kd, N) de arranque; None → asignación de polos.
+    • procesos: None → uno por núcleo; 1 → en este proceso.
+    • detener(): se consulta entre generaciones; True → corta.
+    • progreso(generacion, mejor): después de cada generación.
+    Devuelve un dict con Kp, Ki, Kd, N, costo, factible, las métricas
+    del ganador, generaciones, evaluaciones, segundos y el motivo del
+    corte.
+    """
+    t0 = time.perf_counter()
+    Ts = sistema.Ts if Ts is None else Ts
+    duracion = max(2.0 * Tss, 3.0) if duracion is None else duracion
+    itae_quieto = abs(ref_rad - ang_ini_rad) * duracion ** 2 / 2.0 or 1.0
+    if inicial is None:
+        inicial = sistema.pidf_asignacion_polos(Tss, Mp)
+    lo = np.log([LIMITES_GANANCIAS[g][0] for g in GANANCIAS])
+    hi = np.log([LIMITES_GANANCIAS[g][1] for g in GANANCIAS])
+    mu = np.clip(np.log(np.maximum(np.asarray(inicial, dtype=float), 1e-9)), lo, hi)
+    sigma = np.ones(4)                              # ≈ ×2.7 alrededor de la media
+    n_elite = max(2, int(round(elite * poblacion)))
+    rng = np.random.default_rng(semilla)
+    procesos = procesos or os.cpu_count() or 1
+    evaluar = dict(planta=planta_de(sistema), pwm_eq=sistema.PWM_eq,
+                   ang_ini_rad=ang_ini_rad, ref_rad=ref_rad,
+                   duracion=duracion, Ts=Ts, procesos=procesos)
+
+    mejor = None
+    sin_mejora = 0
+    evaluaciones = 0
+    motivo = "generaciones"
+    pool = (concurrent.futures.ProcessPoolExecutor(procesos)
+            if procesos > 1 else None)
+    try:
+        for gen in range(generaciones):
+            x = np.clip(mu + sigma * rng.standard_normal((poblacion, 4)), lo, hi)
+            x[0] = mu                                   # la media también compite
+            if mejor is not None:
+                x[1] = mejor["_log"]                    # y el mejor hasta ahora
+            K = np.exp(x)
+            metricas = evaluar_ganancias(Kp=K[:, 0], Ki=K[:, 1], Kd=K[:, 2],
+                                         N=K[:, 3], pool=pool, **evaluar)
+            costo, exceso = costo_itae(metricas, Tss, Mp, saturacion_max,
+                                       itae_quieto, duracion)
+            evaluaciones += poblacion
+
+            orden = np.argsort(costo)
+            i = orden[0]
+            if mejor is None or costo[i] < mejor["costo"] * (1.0 - tol):
+                sin_mejora = 0
+            else:
+                sin_mejora += 1
+            if mejor is None or costo[i] < mejor["costo"]:
+                mejor = {**dict(zip(GANANCIAS, (float(k) for k in K[i]))),
+                         "costo": float(costo[i]),
+                         "factible": bool(exceso[i] == 0.0),
+                         **{m: float(v[i]) for m, v in metricas.items()},
+                         "_log": x[i].copy()}
+
+            elegidos = x[orden[:n_elite]]
+            mu = 0.7 * elegidos.mean(axis=0) + 0.3 * mu
+            sigma = 0.7 * elegidos.std(axis=0) + 0.3 * sigma
+            if progreso is not None:
+                progreso(gen, {k: v for k, v in mejor.items() if k != "_log"})
+
+            if sin_mejora >= paciencia:
+                motivo = "sin mejora"
+                break
+            if np.max(sigma) < tol:
+                motivo = "convergió"
+                break
+            if time.perf_counter() - t0 > tiempo_max:
+                motivo = "tiempo"
+                break
+            if detener is not None and detener():
+                motivo = "detenido"
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    resultado = {k: v for k, v in mejor.items() if k != "_log"}
+    resultado.update(generaciones=gen + 1, evaluaciones=evaluaciones,
+                     segundos=time.perf_counter() - t0, motivo=motivo,
+                     Tss=Tss, Mp=Mp, Ts=Ts, duracion=duracion)
+    print(f"[AUTOTUNER] Kp={resultado['Kp']:.4f} Ki={resultado['Ki']:.4f} "
+          f"Kd={resultado['Kd']:.4f} N={resultado['N']:.3f}  "
+          f"ITAE={resultado['itae']:.4g} ts={resultado['ts']:.2f} s "
+          f"Mp={resultado['sobrepaso']:.1f} %  "
+          f"{'factible' if resultado['factible'] else 'NO factible'}  "
+          f"({evaluaciones} candidatos, {resultado['segundos']:.1f} s, {motivo})")
+    return resultado
+
+
+def main(argv=None):
+    from control_utils import ControlSystem
+
+    ap = argparse.ArgumentParser(description="Autoajuste del PIDf (ITAE) contra la planta simulada")
+    ap.add_argument("--tss", type=float, default=12.0, help="tiempo de establecimiento máx. [s]")
+    ap.add_argument("--mp", type=float, default=0.2, help="sobrepaso máx. (fracción)")
+    ap.add_argument("--saturacion", type=float, default=0.2,
+                    help="fracción máx. de muestras con PWM saturado")
+    ap.add_argument("--eq", type=float, default=0.0, help="θ_eq [°]")
+    ap.add_argument("--inicial", type=float, default=-50.0, help="[°]")
+    ap.add_argument("--ref", type=float, default=0.0, help="[°]")
+    ap.add_argument("--ts", type=float, default=ControlSystem().Ts,
+                    help="período de muestreo [s] (por defecto el del sketch)")
+    ap.add_argument("--duracion", type=float, default=None, help="[s]")
+    ap.add_argument("--poblacion", type=int, default=256)
+    ap.add_argument("--generaciones", type=int, default=40)
+    ap.add_argument("--tiempo-max", type=float, default=10.0, help="[s]")
+    ap.add_argument("--procesos", type=int, default=None)
+    ap.add_argument("--semilla", type=int, default=None)
+    ap.add_argument("--salida", help="archivo JSON (por defecto stdout)")
+    args = ap.parse_args(argv)
+
+    ctrl = ControlSystem()
+    ctrl.set_equilibrium_angle_deg(args.eq)
+    r = autoajustar(ctrl, args.tss, args.mp, np.radians(args.inicial),
+                    np.radians(args.ref), Ts=args.ts, duracion=args.duracion,
+                    saturacion_max=args.saturacion, poblacion=args.poblacion,
+                    generaciones=args.generaciones, tiempo_max=args.tiempo_max,
+                    procesos=args.procesos, semilla=args.semilla,
+                    progreso=lambda g, m: print(
+                        f"[AUTOTUNER] gen {g:2d}  costo={m['costo']:.4g}",
+                        file=sys.stderr))
+    texto = json.dumps(r, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# barrido.py  – miles de juegos de ganancias PIDf en una sola corrida
+# --------------------------------------------------------------------
+# En vez de tocar los spin boxes y apretar "Recalcular respuesta" una
+# vez por candidato: se arma una grilla de (Kp, Ki, Kd, N), cada juego
+# se simula contra la planta de ControlSystem (simulador.simular_lote:
+# no lineal, PIDf discreto, saturación) y se miden
+#   • ts        tiempo de establecimiento [s] (banda ±2 % del salto;
+#               NaN si no se establece dentro del horizonte)
+#   • sobrepaso [%] del salto
+#   • ise       ∫ e² dt  [rad²·s]
+#   • itae      ∫ t·|e| dt  [rad·s²]
+#   • pwm_max   PWM máximo [µs]
+#   • saturacion fracción de muestras con el PWM en 1000 o 2000
+# Los candidatos se reparten en lotes vectorizados (numpy) entre un
+# ProcessPoolExecutor con un proceso por núcleo.  Las métricas vuelven
+# con la forma de la grilla: listas para un mapa de calor.
+#
+#   r = barrer_ganancias(ctrl, Kp=np.linspace(0, 200, 60)[:, None],
+#                        Kd=np.linspace(0, 120, 60)[None, :], Ki=28, N=8,
+#                        ang_ini_rad=np.radians(-50), ref_rad=0.0)
+#   plt.pcolormesh(r.Kd, r.Kp, r.ise)        # (60, 60)
+#   r.mejor("ise", ts_max=8, sobrepaso_max=20)
+#
+#   python barrido.py --kp 0 200 41 --kd 0 120 41 --ki 28 --n 8 --png mapa.png
+# --------------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+from pidf import coeficientes_pidf
+from simulador import simular_lote, LIMITES_DEG
+
+METRICAS = ("ts", "sobrepaso", "ise", "itae", "pwm_max", "saturacion")
+
+
+def metricas_escalon(t, ang, pwm, ang_ini_rad, ref_rad, banda=0.02,
+                     pwm_min=1000.0, pwm_max=2000.0):
+    """
+    Métricas de K respuestas (ang, pwm: (K, T)) a un salto de
+    ang_ini_rad a ref_rad.  Devuelve {métrica: (K,)}.
+    """
+    ang_ini = np.broadcast_to(np.asarray(ang_ini_rad, dtype=float), (len(ang),))
+    ref = np.broadcast_to(np.asarray(ref_rad, dtype=float), (len(ang),))
+    salto = ref - ang_ini
+    amplitud = np.where(salto != 0.0, np.abs(salto), 1.0)
+    e = ref[:, None] - ang
+    with np.errstate(invalid='ignore'):
+        fuera = ~(np.abs(e) <= banda * amplitud[:, None])      # NaN cuenta como fuera
+        # última muestra fuera de la banda → se establece en la siguiente
+        ultima = ang.shape[1] - 1 - np.argmax(fuera[:, ::-1], axis=1)
+        ts = np.where(fuera.any(axis=1), t[np.minimum(ultima + 1, len(t) - 1)], 0.0)
+        ts = np.where(fuera[:, -1], np.nan, ts)
+        pasado = np.sign(salto)[:, None] * (ang - ref[:, None])
+        sobrepaso = np.maximum(np.nanmax(pasado, axis=1), 0.0) / amplitud * 100.0
+    dt = t[1] - t[0] if len(t) > 1 else 0.0
+    return {
+        "ts": ts,
+        "sobrepaso": sobrepaso,
+        "ise": np.sum(e * e, axis=1) * dt,
+        "itae": np.abs(e) @ t * dt,
+        "pwm_max": np.max(pwm, axis=1),
+        "saturacion": np.mean((pwm <= pwm_min) | (pwm >= pwm_max), axis=1),
+    }
+
+
+def _evaluar_lote(planta, ganancias, pwm_eq, ang_ini_rad, ref_rad, duracion,
+                  Ts, subpasos, limites_deg, banda):
+    """Un lote de candidatos (lo que corre cada proceso del pool)."""
+    Kp, Ki, Kd, N = ganancias
+    coefs = coeficientes_pidf(Kp, Ki, Kd, N, Ts)
+    t, ang, pwm = simular_lote(planta, coefs, pwm_eq, ang_ini_rad, ref_rad,
+                               duracion, Ts, subpasos, limites_deg)
+    return metricas_escalon(t, ang, pwm, ang_ini_rad, ref_rad, banda)
+
+
+class ResultadoBarrido:
+    """
+    Métricas de un barrido, con la forma de la grilla de ganancias.
+
+    • r.Kp, r.Ki, r.Kd, r.N → ganancias (ya con esa forma).
+    • r.ts, r.sobrepaso, r.ise, r.itae, r.pwm_max, r.saturacion → métricas.
+    • r.mejor(criterio, **límites) → dict del mejor candidato que cumple
+      ts_max, sobrepaso_max, pwm_max_max (None si ninguno).
+    • r.guardar(ruta) → .npz con todo.
+    """
+
+    def __init__(self, ganancias, metricas, meta):
+        self.Kp, self.Ki, self.Kd, self.N = ganancias
+        for nombre in METRICAS:
+            setattr(self, nombre, metricas[nombre])
+        self.meta = meta
+
+    @property
+    def forma(self):
+        return self.Kp.shape
+
+    def __len__(self):
+        return self.Kp.size
+
+    def factibles(self, ts_max=None, sobrepaso_max=None, pwm_max_max=None):
+        ok = np.isfinite(self.ts) & np.isfinite(self.ise)
+        if ts_max is not None:
+            ok &= self.ts <= ts_max
+        if sobrepaso_max is not None:
+            ok &= self.sobrepaso <= sobrepaso_max
+        if pwm_max_max is not None:
+            ok &= self.pwm_max <= pwm_max_max
+        return ok
+
+    def mejor(self, criterio="ise", **limites):
+        valores = getattr(self, criterio)
+        ok = self.factibles(**limites)
+        if not ok.any():
+            return None
+        i = np.unravel_index(np.argmin(np.where(ok, valores, np.inf)), self.forma)
+        return {
+            "indice": tuple(int(j) for j in i),
+            "Kp": float(self.Kp[i]), "Ki": float(self.Ki[i]),
+            "Kd": float(self.Kd[i]), "N": float(self.N[i]),
+            **{m: float(getattr(self, m)[i]) for m in METRICAS},
+        }
+
+    def guardar(self, ruta):
+        np.savez(ruta, Kp=self.Kp, Ki=self.Ki, Kd=self.Kd, N=self.N,
+                 **{m: getattr(self, m) for m in METRICAS},
+                 **{f"meta_{k}": v for k, v in self.meta.items()})
+
+
+def barrer_ganancias(sistema, Kp, Ki, Kd, N, ang_ini_rad, ref_rad,
+                     duracion=10.0, Ts=0.022, pwm_eq=None, subpasos=1,
+                     limites_deg=LIMITES_DEG, banda=0.02, procesos=None,
+                     por_lote=1024):
+    """
+    Simula todas las combinaciones de Kp, Ki, Kd, N (se hace broadcast:
+    usar ejes distintos, p. ej. Kp[:, None] y Kd[None, :], para una
+    grilla) y devuelve un ResultadoBarrido.
+
+    • sistema: ControlSystem (planta y, si pwm_eq es None, su PWM_eq).
+    • procesos: None → un proceso por núcleo; 1 → en este proceso.
+    • por_lote: candidatos por tarea (cada una vectorizada con numpy).
+    """
+    ganancias = np.broadcast_arrays(*(np.asarray(g, dtype=float)
+                                      for g in (Kp, Ki, Kd, N)))
+    forma = ganancias[0].shape
+    pwm_eq = sistema.PWM_eq if pwm_eq is None else pwm_eq
+    procesos = procesos or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    if procesos == 1:
+        planos = evaluar_ganancias(planta_de(sistema), *ganancias, pwm_eq,
+                                   ang_ini_rad, ref_rad, duracion, Ts,
+                                   subpasos, limites_deg, banda,
+                                   por_lote=por_lote)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(procesos) as pool:
+            planos = evaluar_ganancias(planta_de(sistema), *ganancias, pwm_eq,
+                                       ang_ini_rad, ref_rad, duracion, Ts,
+                                       subpasos, limites_deg, banda,
+                                       pool=pool, procesos=procesos,
+                                       por_lote=por_lote)
+    metricas = {m: v.reshape(forma) for m, v in planos.items()}
+    total = ganancias[0].size
+    meta = {"candidatos": total, "procesos": procesos,
+            "duracion": duracion, "Ts": Ts, "ang_ini_rad": ang_ini_rad,
+            "ref_rad": ref_rad, "segundos": time.perf_counter() - t0}
+    print(f"[BARRIDO] {total} candidatos en {meta['segundos']:.2f} s "
+          f"({procesos} procesos)")
+    return ResultadoBarrido(tuple(np.array(g) for g in ganancias), metricas, meta)
+
+
+def planta_de(sistema):
+    """(I, C, Lm, m, r) de un ControlSystem, como floats (se puede picklear)."""
+    return tuple(float(v) for v in (sistema.I, sistema.C, sistema.Lm,
+                                    sistema.m, sistema.r))
+
+
+def evaluar_ganancias(planta, Kp, Ki, Kd, N, pwm_eq, ang_ini_rad, ref_rad,
+                      duracion, Ts=0.022, subpasos=1, limites_deg=LIMITES_DEG,
+                      banda=0.02, pool=None, procesos=1, por_lote=1024):
+    """
+    Métricas (planas, {métrica: (K,)}) de K juegos de ganancias.  Con
+    `pool` (un Executor ya abierto, p. ej. para muchas llamadas seguidas)
+    los lotes se reparten entre sus `procesos`; sin pool, en este proceso.
+    """
+    planos = [g.ravel() for g in np.broadcast_arrays(
+        *(np.asarray(g, dtype=float) for g in (Kp, Ki, Kd, N)))]
+    total = planos[0].size
+    # que haya al menos un lote por proceso
+    por_lote = max(1, min(por_lote, -(-total // procesos)))
+    tramos = [slice(i, min(i + por_lote, total)) for i in range(0, total, por_lote)]
+    argumentos = [(planta, tuple(g[s] for g in planos), pwm_eq, ang_ini_rad,
+                   ref_rad, duracion, Ts, subpasos, limites_deg, banda)
+                  for s in tramos]
+    if pool is None or len(tramos) == 1:
+        partes = [_evaluar_lote(*a) for a in argumentos]
+    else:
+        partes = list(pool.map(_evaluar_lote, *zip(*argumentos)))
+    return {m: np.concatenate([p[m] for p in partes]) for m in METRICAS}
+
+
+def graficar_mapa(resultado, metrica="ise", ruta=None):
+    """Mapa de calor de una métrica en una grilla de dos ganancias."""
+    import matplotlib
+    if ruta is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    ejes = [g for g in ("Kp", "Ki", "Kd", "N")
+            if np.ptp(getattr(resultado, g)) > 0]
+    if len(ejes) != 2 or len(resultado.forma) != 2:
+        raise ValueError(f"Hace falta una grilla 2D de dos ganancias (variaron {ejes})")
+    fil, col = (ejes if np.ptp(getattr(resultado, ejes[0])[:, 0]) > 0
+                else ejes[::-1])
+    y = getattr(resultado, fil)[:, 0]
+    x = getattr(resultado, col)[0, :]
+    z = getattr(resultado, metrica)
+    logaritmica = metrica in ("ise", "itae")
+    if logaritmica:
+        z = np.log10(z)
+    fig, ax = plt.subplots(figsize=(6, 5))
+    m = ax.pcolormesh(x, y, z, shading="auto")
+    fig.colorbar(m, ax=ax, label=f"log10 {metrica}" if logaritmica else metrica)
+    ax.set_xlabel(col)
+    ax.set_ylabel(fil)
+    ax.set_title(f"Barrido PIDf: {metrica}")
+    if ruta is not None:
+        fig.savefig(ruta, dpi=120, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+def main(argv=None):
+    from control_utils import ControlSystem
+
+    def rango(v):
+        return np.linspace(*v[:2], int(v[2])) if len(v) == 3 else np.array(v[:1])
+
+    ap = argparse.ArgumentParser(description="Barrido de ganancias PIDf contra la planta no lineal")
+    for g in ("kp", "ki", "kd", "n"):
+        ap.add_argument(f"--{g}", type=float, nargs='+',
+                        help="un valor, o desde hasta cantidad")
+    ap.add_argument("--tss", type=float, default=12.0,
+                    help="para las ganancias que no se barren (asignación de polos)")
+    ap.add_argument("--mp", type=float, default=0.2)
+    ap.add_argument("--eq", type=float, default=0.0, help="θ_eq [°]")
+    ap.add_argument("--inicial", type=float, default=-50.0, help="[°]")
+    ap.add_argument("--ref", type=float, default=0.0, help="[°]")
+    ap.add_argument("--duracion", type=float, default=10.0, help="[s]")
+    ap.add_argument("--procesos", type=int, default=None)
+    ap.add_argument("--criterio", choices=METRICAS, default="ise")
+    ap.add_argument("--salida", help="archivo .npz")
+    ap.add_argument("--png", help="mapa de calor de --criterio (grilla 2D)")
+    args = ap.parse_args(argv)
+
+    ctrl = ControlSystem()
+    ctrl.set_equilibrium_angle_deg(args.eq)
+    base = dict(zip(("kp", "ki", "kd", "n"),
+                    (float(g) for g in ctrl.pidf_asignacion_polos(args.tss, args.mp))))
+    valores = [rango(getattr(args, g)) if getattr(args, g) else np.array([base[g]])
+               for g in ("kp", "ki", "kd", "n")]
+    barridos = [i for i, v in enumerate(valores) if len(v) > 1]
+    # cada ganancia barrida en su propio eje → grilla
+    ganancias = []
+    for i, v in enumerate(valores):
+        forma = [1] * max(len(barridos), 1)
+        if i in barridos:
+            forma[barridos.index(i)] = len(v)
+        ganancias.append(v.reshape(forma))
+
+    r = barrer_ganancias(ctrl, *ganancias, np.radians(args.inicial),
+                         np.radians(args.ref), args.duracion,
+                         procesos=args.procesos)
+    mejor = r.mejor(args.criterio)
+    print(f"[BARRIDO] mejor por {args.criterio}: {mejor}", file=sys.stderr)
+    if args.salida:
+        r.guardar(args.salida)
+    if args.png:
+        graficar_mapa(r, args.criterio, args.png)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# benchmark_pidf.py  – costo por paso del PIDf de la PC, antes y después
+# --------------------------------------------------------------------
+# Compara, en µs por muestra:
+#   • antes_escalar  → ControlSystem.calcular_pwm como era (np.radians +
+#                      np.clip sobre escalares, atributos sueltos)
+#   • paso           → ControladorPIDf.paso (numba si está instalado)
+#   • paso_python    → el mismo _paso sin compilar (sólo si hay numba,
+#                      para ver cuánto aporta)
+#   • antes_bloque   → el PIDf corrido dos veces por bloque, como antes:
+#                      lfilter en el hilo serie + calcular_pwm_lote en
+#                      el timer de la GUI
+#   • lote           → ControladorPIDf.lote, una sola vez por bloque
+# y verifica que paso, lote (en bloques y de una vez) y pwm_pidf_lote
+# den exactamente lo mismo que antes_escalar.
+#
+#   python benchmark_pidf.py
+#   python benchmark_pidf.py --muestras 200000 --bloque 10 --salida pidf.json
+# --------------------------------------------------------------------
+import sys
+import json
+import time
+import argparse
+import platform
+
+import numpy as np
+
+import pidf
+from pidf import ControladorPIDf, coeficientes_pidf, pwm_pidf_lote
+
+VERSION_FORMATO = 1
+GANANCIAS = (2.0, 0.8, 0.3, 25.0)          # Kp, Ki, Kd, N
+TS = 0.022
+PWM_EQ = 1480.0
+REF_RAD = np.radians(5.0)
+
+
+class _PIDfAnterior:
+    """Copia del camino escalar de ControlSystem antes de pidf.py."""
+
+    def __init__(self, coefs):
+        self.a0, self.a1, self.a2, self.a3, self.a4, self.a5 = (float(a) for a in coefs)
+        self.anguloReferencia_rad = REF_RAD
+        self.PWM_eq = PWM_EQ
+        self.error_km1 = self.error_km2 = 0.0
+        self.u_km1 = self.u_km2 = 0.0
+
+    def calcular_pwm(self, ang_actual_deg):
+        theta_rad = np.radians(ang_actual_deg)
+        error = self.anguloReferencia_rad - theta_rad
+
+        u = (1.0 / self.a3) * (
+            self.a0 * error + self.a1 * self.error_km1 + self.a2 * self.error_km2
+            - self.a4 * self.u_km1 - self.a5 * self.u_km2
+        )
+        pwm = np.clip(u + self.PWM_eq, 1000.0, 2000.0)
+
+        self.error_km2 = self.error_km1
+        self.error_km1 = error
+        self.u_km2 = self.u_km1
+        self.u_km1 = u
+        return pwm
+
+    def calcular_pwm_lote(self, ang_deg):
+        estado = (self.error_km1, self.error_km2, self.u_km1, self.u_km2)
+        pwm, fin = pwm_pidf_lote(ang_deg, (self.a0, self.a1, self.a2,
+                                           self.a3, self.a4, self.a5),
+                                 self.anguloReferencia_rad, self.PWM_eq, estado,
+                                 exacto=False)      # lfilter, como antes
+        self.error_km1, self.error_km2, self.u_km1, self.u_km2 = (float(x) for x in fin)
+        return pwm
+
+
+def _controlador():
+    c = ControladorPIDf(pwm_eq=PWM_EQ)
+    c.set_ganancias(*GANANCIAS, TS)
+    c.ref_rad = REF_RAD
+    return c
+
+
+def _angulos(n, semilla=0):
+    """Ángulos parecidos a un log real: escalón + ruido del MPU."""
+    rng = np.random.default_rng(semilla)
+    t = np.arange(n) * TS
+    return -45.0 + 50.0 * (1.0 - np.exp(-t / 2.0)) * (1.0 + 0.1 * np.sin(t)) \
+        + rng.normal(0.0, 0.3, n)
+
+
+def _medir(funcion, repeticiones):
+    """Mejor de `repeticiones` [s] (el mínimo es lo menos ruidoso)."""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def correr(muestras=50000, bloque=10, repeticiones=5) -> dict:
+    ang = _angulos(muestras)
+    ang_lista = ang.tolist()                 # el hilo serie entrega escalares
+    bloques = [ang[i:i + bloque] for i in range(0, muestras, bloque)]
+    coefs = coeficientes_pidf(*GANANCIAS, TS)
+
+    # --- verificación: mismo resultado que antes, bit a bit ---
+    ref = _PIDfAnterior(coefs)
+    nuevo = _controlador()
+    esperado = np.array([ref.calcular_pwm(a) for a in ang_lista])
+    obtenido = np.array([nuevo.paso(a) for a in ang_lista])
+    iguales = bool(np.array_equal(esperado, obtenido))
+    nuevo = _controlador()
+    en_lote = np.concatenate([nuevo.lote(b) for b in bloques])
+    dif_lote = float(np.max(np.abs(en_lote - esperado)))
+    de_una_vez = _controlador().lote(ang)        # ≥ LOTE_LFILTER muestras
+    en_pidf_lote, _ = pwm_pidf_lote(ang, coefs, REF_RAD, PWM_EQ)
+    lote_iguales = bool(np.array_equal(en_lote, esperado)
+                        and np.array_equal(de_una_vez, esperado)
+                        and np.array_equal(en_pidf_lote, esperado))
+
+    casos = {}
+
+    def escalar_antes():
+        c = _PIDfAnterior(coefs)
+        f = c.calcular_pwm
+        for a in ang_lista:
+            f(a)
+    casos['antes_escalar'] = escalar_antes
+
+    def escalar_paso():
+        f = _controlador().paso
+        for a in ang_lista:
+            f(a)
+    casos['paso'] = escalar_paso
+
+    if pidf.HAY_NUMBA:
+        def escalar_python():
+            x = _controlador()._x.tolist()
+            f = pidf._paso.py_func
+            for a in ang_lista:
+                f(x, a)
+        casos['paso_python'] = escalar_python
+
+    def bloque_antes():
+        hilo, gui = _PIDfAnterior(coefs), _PIDfAnterior(coefs)
+        for b in bloques:
+            hilo.calcular_pwm_lote(b)        # pwm_sw en el hilo serie
+            gui.calcular_pwm_lote(b)         # otra vez en el timer (se usaba éste)
+    casos['antes_bloque'] = bloque_antes
+
+    def bloque_lote():
+        c = _controlador()
+        for b in bloques:
+            c.lote(b)
+    casos['lote'] = bloque_lote
+
+    for f in casos.values():                 # calentar (y compilar con numba)
+        f()
+    us = {nombre: _medir(f, repeticiones) / muestras * 1e6
+          for nombre, f in casos.items()}
+
+    return {
+        'muestras': muestras,
+        'bloque': bloque,
+        'numba': pidf.HAY_NUMBA,
+        'us_por_muestra': us,
+        'aceleracion': {
+            'escalar': us['antes_escalar'] / us['paso'],
+            'bloque': us['antes_bloque'] / us['lote'],
+        },
+        'paso_igual_a_antes': iguales,
+        'lote_igual_a_antes': lote_iguales,
+        'lote_max_dif_pwm': dif_lote,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Costo por paso del PIDf, antes y después de pidf.py")
+    ap.add_argument("--muestras", type=int, default=50000)
+    ap.add_argument("--bloque", type=int, default=10,
+                    help="muestras por lectura del puerto (modo lote)")
+    ap.add_argument("--repeticiones", type=int, default=5)
+    ap.add_argument("--salida", help="archivo JSON (por defecto stdout)")
+    args = ap.parse_args(argv)
+
+    r = correr(args.muestras, args.bloque, args.repeticiones)
+    for nombre, v in r['us_por_muestra'].items():
+        print(f"[BENCH] {nombre:<14} {v:8.3f} µs/muestra", file=sys.stderr)
+    print(f"[BENCH] numba={r['numba']}  escalar ×{r['aceleracion']['escalar']:.1f}  "
+          f"bloque ×{r['aceleracion']['bloque']:.1f}  "
+          f"paso==antes: {r['paso_igual_a_antes']}  "
+          f"lote==antes: {r['lote_igual_a_antes']}", file=sys.stderr)
+
+    resultado = {
+        'version_formato': VERSION_FORMATO,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        **r,
+    }
+    texto = json.dumps(resultado, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
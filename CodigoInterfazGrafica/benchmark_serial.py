@@ -0,0 +1,255 @@
+# benchmark_serial.py  – banco de pruebas de punta a punta del enlace serie
+# --------------------------------------------------------------------
+# SerialComm + protocolo + un consumidor igual a ControlApp._update,
+# contra el Arduino emulado (emulador_arduino.py) en un pty.
+#
+# Mide por caso (baud × formato × modo):
+#   • tramas parseadas por segundo
+#   • tramas rechazadas / perdidas, desbordes del búfer circular y
+#     bytes perdidos en el RX del Arduino
+#   • ocupación del búfer a lo largo del tiempo
+#   • RTT trama → comando: desde que el Arduino arma la trama hasta que
+#     procesa el PWM calculado con ella
+#   • salud del enlace (SerialComm.estadisticas): rechazos por motivo,
+#     uso medido del enlace en cada sentido
+# Con --negociar cada caso arranca a `baud` y negocia ($BAUD / $PING).
+#
+# Salida JSON (stdout o --salida) para comparar entre versiones:
+#   python benchmark_serial.py --baudios 9600 115200 --duracion 5
+#   python benchmark_serial.py --sin-limite --salida bench.json
+# --------------------------------------------------------------------
+import sys
+import json
+import time
+import argparse
+import platform
+
+import numpy as np
+
+from control_utils import ControlSystem
+from emulador_arduino import EmuladorArduino
+from io_utils import SerialComm, linea_pidf
+
+FORMATOS = {                       # nombre → (formato, con_tiempo)
+    'texto':    ('texto', False),
+    'texto+t':  ('texto', True),
+    'binario':  ('binario', False),
+    'binario+t': ('binario', True),
+}
+MODOS = ('sondeo', 'evento')       # PIDf en el timer de la GUI | en el hilo serie
+VERSION_FORMATO = 1
+
+
+def _resumen(valores) -> dict:
+    """Mismas claves que EstadisticaMovil.resumen(), sobre todas las muestras."""
+    v = np.asarray(valores, dtype=float)
+    if len(v) == 0:
+        return {'n': 0, 'media': float('nan'), 'p50': float('nan'),
+                'p99': float('nan'), 'max': float('nan')}
+    p50, p99 = np.percentile(v, [50, 99])
+    return {'n': int(len(v)), 'media': float(v.mean()), 'p50': float(p50),
+            'p99': float(p99), 'max': float(v.max())}
+
+
+def _clave_pwm(pwm) -> bytes:
+    """Línea que manda send_pidf_data para una consigna de PWM sola."""
+    nan = float('nan')
+    return linea_pidf(nan, nan, nan, nan, nan, nan, float(pwm), 1).encode()
+
+
+def _rtt(emu, candidatos) -> np.ndarray:
+    """
+    Empareja cada comando procesado por el Arduino con la trama que lo
+    originó: la última trama enviada antes de recibirlo cuyo PWM calculado
+    da exactamente esa línea.  `candidatos`: {línea: [nº de trama, …]}.
+    """
+    t_tx = dict(emu.registro_tx)
+    rtt = []
+    for linea, t_rx in emu.registro_rx:
+        mejor = None
+        for seq in candidatos.get(linea, ()):
+            t = t_tx.get(seq)
+            if t is not None and t < t_rx and (mejor is None or t > mejor):
+                mejor = t
+        if mejor is not None:
+            rtt.append(t_rx - mejor)
+    return np.array(rtt)
+
+
+def correr_caso(baud=9600, formato='texto', modo='sondeo', duracion=5.0,
+                tiempo_real=True, rampa_esc=False, periodo_gui=0.05,
+                max_batch=200, muestras_cola=200, negociar=False) -> dict:
+    """
+    Corre un caso y devuelve sus métricas.  Por defecto el Arduino
+    emulado no hace la rampa del ESC (1 ms por µs): con ella el período
+    del loop depende de la acción de control y no del enlace.  Con
+    `negociar` el emulador arranca antes que la PC (si no, nadie
+    contesta el $BAUD).
+    """
+    fmt, con_tiempo = FORMATOS[formato]
+    ctrl = ControlSystem()
+    ctrl.set_pidf_coefs(*ctrl.pidf_asignacion_polos(12, 0.2), ctrl.Ts)
+
+    emu = EmuladorArduino(ctrl=ControlSystem(), baud=baud,
+                          tiempo_real=tiempo_real, formato=fmt,
+                          con_tiempo=con_tiempo, rampa_esc=rampa_esc,
+                          registrar=True).abrir()
+    comm = SerialComm(port=emu.puerto, baud=baud, negociar=negociar)
+    comm.pidf = ctrl.pidf          # como Rig: un solo PIDf, en el hilo serie
+    if negociar:
+        emu.start()
+    comm.start()
+    if not comm.running or not comm.esperar_conexion(timeout=10.0):
+        comm.stop()
+        emu.stop()
+        raise RuntimeError(f"No se pudo abrir {emu.puerto}")
+    if modo == 'evento':
+        comm.set_control_en_lazo(ctrl.calcular_pwm)
+    if not negociar:
+        emu.start()
+    # la PC numera desde la primera trama que lee: tras negociar, las
+    # anteriores se descartaron
+    desfase = emu.tramas_antes_de_negociar
+
+    candidatos = {}
+    cola = []                      # (t, muestras pendientes)
+    consumidas = 0
+    pisadas = 0                # filas sobrescritas mientras se leían
+    t0 = time.perf_counter()
+    t_prox = t0
+    try:
+        while True:
+            ahora = time.perf_counter()
+            if ahora - t0 >= duracion:
+                break
+            cola.append((ahora - t0, len(comm.rx_buffer)))
+
+            # --- igual que ControlApp._update ---
+            ultima = None
+            for vista in comm.rx_buffer.vistas(max_batch):
+                if modo == 'evento':
+                    for seq, pwm in zip(vista['seq'], vista['pwm_sw']):
+                        candidatos.setdefault(_clave_pwm(pwm), []).append(int(seq) + desfase)
+                    ultima = (float(vista['t'][-1]), float(vista['pwm_sw'][-1]),
+                              int(vista['seq'][-1]))
+                else:
+                    ultima = (float(vista['t'][-1]), float(vista['pwm_sw'][-1]),
+                              int(vista['seq'][-1]) + desfase)
+                consumidas += len(vista)
+                n_pisadas = comm.rx_buffer.consumir(len(vista))
+                if n_pisadas:
+                    # la vista se sobrescribió mientras se leía: ni sus
+                    # seq ni su último PWM son confiables
+                    pisadas += n_pisadas
+                    ultima = None
+
+            if ultima is not None and modo == 'sondeo':
+                t, pwm, seq = ultima
+                candidatos.setdefault(_clave_pwm(pwm), []).append(seq)
+                comm.send_pidf_data(np.nan, np.nan, np.nan, np.nan, np.nan,
+                                    np.nan, pwm, 1, t_origen=t)
+
+            t_prox += periodo_gui
+            espera = t_prox - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                t_prox = time.perf_counter()
+        t_total = time.perf_counter() - t0
+        time.sleep(0.1)            # que lleguen los últimos comandos
+    finally:
+        tx = comm.estadisticas_tx()
+        latencia_pc = comm.estadisticas_latencia()
+        llegada = comm.estadisticas_llegada()
+        utilizacion = comm.utilizacion_enlace(ventana=None)   # desde start
+        enlace = comm.estadisticas(ventana=None)
+        proto = comm._protocol
+        comm.set_control_en_lazo(None)
+        comm.stop()                # primero la PC: si no, el pty se cierra bajo sus pies
+        emu.stop()
+
+    serie = np.array(cola, dtype=float).reshape(-1, 2)
+    paso = max(1, len(serie) // muestras_cola)
+    return {
+        'baud': baud,
+        'baud_final': comm.baud,
+        'formato': formato,
+        'modo': modo,
+        'tiempo_real': tiempo_real,
+        'rampa_esc': rampa_esc,
+        'duracion_s': t_total,
+        'tramas_emitidas': emu.tramas_enviadas,
+        'tramas_parseadas': consumidas,
+        'fps': consumidas / t_total,
+        'tramas_rechazadas': getattr(proto, 'tramas_rechazadas', 0),
+        'tramas_perdidas': getattr(proto, 'tramas_perdidas', 0),
+        'desbordes_buffer': comm.rx_buffer.desbordes,
+        'filas_pisadas': pisadas,
+        'bytes_rx_perdidos_arduino': emu.bytes_rx_perdidos,
+        'comandos_enviados': tx.get('comandos_enviados', 0),
+        'comandos_coalescidos': tx.get('comandos_coalescidos', 0),
+        'comandos_procesados_arduino': emu.comandos_recibidos,
+        'rtt_s': _resumen(_rtt(emu, candidatos)),
+        'latencia_pc_s': latencia_pc,
+        'llegada_s': llegada,
+        'utilizacion_enlace': utilizacion,
+        'rechazos': enlace['tramas']['rechazadas'],
+        'bytes_descartados': enlace['rx']['descartados'],
+        'cola': {
+            'max': comm.rx_buffer.max_ocupacion,
+            'media': float(serie[:, 1].mean()) if len(serie) else 0.0,
+            'serie': serie[::paso].tolist(),
+        },
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark del enlace serie contra el Arduino emulado")
+    ap.add_argument("--baudios", type=int, nargs='+', default=[9600, 115200])
+    ap.add_argument("--formatos", nargs='+', choices=list(FORMATOS),
+                    default=list(FORMATOS))
+    ap.add_argument("--modos", nargs='+', choices=MODOS, default=list(MODOS))
+    ap.add_argument("--duracion", type=float, default=5.0, help="[s] por caso")
+    ap.add_argument("--periodo-gui", type=float, default=0.05,
+                    help="[s] período del timer de la GUI")
+    ap.add_argument("--sin-limite", action="store_true",
+                    help="Arduino sin esperas ni límite de baud (estrés)")
+    ap.add_argument("--rampa-esc", action="store_true",
+                    help="emular la rampa del ESC (loop más lento)")
+    ap.add_argument("--negociar", action="store_true",
+                    help="negociar el baud rate partiendo de cada --baudios")
+    ap.add_argument("--salida", help="archivo JSON (por defecto stdout)")
+    args = ap.parse_args(argv)
+
+    casos = []
+    for baud in args.baudios:
+        for formato in args.formatos:
+            for modo in args.modos:
+                r = correr_caso(baud, formato, modo, args.duracion,
+                                tiempo_real=not args.sin_limite,
+                                rampa_esc=args.rampa_esc,
+                                periodo_gui=args.periodo_gui,
+                                negociar=args.negociar)
+                print(f"[BENCH] {r['baud_final']:>7} {formato:<9} {modo:<7} "
+                      f"{r['fps']:8.1f} fps  rtt p50={r['rtt_s']['p50'] * 1e3:7.2f} ms  "
+                      f"cola max={r['cola']['max']}  "
+                      f"rx={r['utilizacion_enlace']['rx_pct']:5.1f} %", file=sys.stderr)
+                casos.append(r)
+
+    resultado = {
+        'version_formato': VERSION_FORMATO,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'casos': casos,
+    }
+    texto = json.dumps(resultado, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
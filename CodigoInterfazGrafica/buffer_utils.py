@@ -0,0 +1,138 @@
+# buffer_utils.py  – búfer circular preasignado para la telemetría
+# --------------------------------------------------------------------
+# Un productor (hilo de lectura serie) y un consumidor (GUI).
+# --------------------------------------------------------------------
+import numpy as np
+
+
+# una fila por trama recibida
+TELEMETRIA_DTYPE = np.dtype([
+    ('t',      'f8'),     # [s]  llegada a la PC (perf_counter)
+    ('angle',  'f8'),     # [°]
+    ('error',  'f8'),     # [°]
+    ('pwm_hw', 'f8'),     # PWM aplicado por el Arduino
+    ('pwm_sw', 'f8'),     # PWM del PIDf software
+    ('seq',    'i8'),     # nº de secuencia (huecos = tramas perdidas)
+    ('t_mcu',  'f8'),     # [s]  millis() del Arduino (NaN si no viene)
+])
+
+
+class RingBuffer:
+    """
+    Búfer circular de capacidad fija, un productor / un consumidor.
+
+    • El productor llama a `escribir(bloque)`; el consumidor obtiene
+      vistas contiguas con `vistas()` (sin copiar) y luego libera lo
+      procesado con `consumir(n)`.
+    • Los índices `_w` / `_r` sólo crecen y cada uno lo escribe un solo
+      hilo, así que no hace falta lock.
+    • Política cuando se llena:
+        'sobrescribir' → se pisan las muestras más viejas
+        'descartar'    → se descartan las nuevas
+      En ambos casos `desbordes` cuenta las muestras perdidas.
+    • Las vistas apuntan al búfer mismo.  Con 'descartar' siguen válidas
+      hasta consumir(); con 'sobrescribir', si el productor da la vuelta
+      mientras el consumidor las recorre, las filas más viejas pueden
+      cambiar por debajo.  consumir(n) vuelve a mirar el índice de
+      escritura y cuenta esas filas como desbordes (y devuelve cuántas
+      fueron): quien necesite datos garantizados usa 'descartar' o copia.
+    """
+    SOBRESCRIBIR = 'sobrescribir'
+    DESCARTAR    = 'descartar'
+
+    def __init__(self, capacidad=16384, dtype=TELEMETRIA_DTYPE,
+                 politica=SOBRESCRIBIR):
+        if politica not in (self.SOBRESCRIBIR, self.DESCARTAR):
+            raise ValueError(f"Política desconocida: {politica}")
+        self.capacidad = int(capacidad)
+        self.politica = politica
+        self._datos = np.zeros(self.capacidad, dtype=dtype)
+        self._w = 0                  # total escrito   (productor)
+        self._w_reservado = 0        # hasta dónde se está escribiendo (productor)
+        self._r = 0                  # total consumido (consumidor)
+        self.desbordes = 0
+        self.max_ocupacion = 0       # marca de agua alta
+
+    @property
+    def dtype(self):
+        return self._datos.dtype
+
+    def __len__(self):
+        return min(self._w - self._r, self.capacidad)
+
+    # ---------------  lado productor -------------------------------
+    def escribir(self, bloque) -> int:
+        """Copia `bloque` al búfer. Devuelve cuántas filas se guardaron."""
+        n = len(bloque)
+        if n == 0:
+            return 0
+        cap = self.capacidad
+        w = self._w
+
+        if self.politica == self.DESCARTAR:
+            libre = cap - (w - self._r)
+            if n > libre:
+                self.desbordes += n - libre
+                bloque, n = bloque[:libre], libre
+                if n == 0:
+                    return 0
+        elif n > cap:
+            # sólo entran las últimas `cap`; el consumidor ve el salto
+            w += n - cap
+            bloque, n = bloque[n - cap:], cap
+
+        # se publica antes de copiar: consumir() ve también la vuelta en curso
+        self._w_reservado = w + n
+        i = w % cap
+        k = min(n, cap - i)
+        self._datos[i:i + k] = bloque[:k]
+        if k < n:
+            self._datos[:n - k] = bloque[k:]
+        self._w = w + n
+
+        ocupacion = min(self._w - self._r, cap)
+        if ocupacion > self.max_ocupacion:
+            self.max_ocupacion = ocupacion
+        return n
+
+    # ---------------  lado consumidor ------------------------------
+    def vistas(self, max_n=None):
+        """
+        Devuelve 0, 1 o 2 vistas (por la vuelta del anillo) con las
+        muestras pendientes, sin copiar.  No avanza la lectura.
+        """
+        cap = self.capacidad
+        w, r = self._w, self._r
+        if w - r > cap:              # el productor dio la vuelta
+            self.desbordes += w - r - cap
+            r = self._r = w - cap
+        n = w - r
+        if max_n is not None:
+            n = min(n, max_n)
+        if n <= 0:
+            return []
+
+        i = r % cap
+        k = min(n, cap - i)
+        if k == n:
+            return [self._datos[i:i + n]]
+        return [self._datos[i:], self._datos[:n - k]]
+
+    def consumir(self, n) -> int:
+        """
+        Libera `n` filas ya procesadas.  Devuelve cuántas de ellas el
+        productor pisó mientras se leían (sólo con 'sobrescribir'); se
+        suman a `desbordes`.
+        """
+        r = self._r
+        pisadas = 0
+        if self.politica == self.SOBRESCRIBIR:
+            limite = max(self._w_reservado, self._w) - self.capacidad
+            pisadas = max(0, min(r + n, limite) - r)
+            self.desbordes += pisadas
+        self._r = r + n
+        return pisadas
+
+    def vaciar(self):
+        """Descarta todo lo pendiente."""
+        self._r = self._w
@@ -0,0 +1,248 @@
+# cache_utils.py  – memoización de modelos y simulaciones de lazo cerrado
+# --------------------------------------------------------------------
+# "Recalcular respuesta" arma feedback(C·Gp·Gm, 1) y corre dos
+# forced_response aunque no haya cambiado nada; mover θ_eq rearma la
+# G(s) mecánica en cada paso del spin box.  Acá:
+#   • clave_canonica(*partes) → hash estable de funciones de
+#     transferencia, arreglos, números, textos, tuplas y dicts
+#     ([1, 2] y [1.0, 2.0] dan la misma clave)
+#   • CacheLRU → memoria acotada (LRU) + opcionalmente un directorio
+#     en disco que sobrevive a reinicios (un .pkl por clave, también
+#     acotado; lo más viejo se borra primero)
+#
+#   cache = CacheLRU(max_entradas=64, directorio="cache")
+#   clave = clave_canonica("lazo", C_tf, Gp, Gm)
+#   T = cache.obtener_o_calcular(clave, lambda: feedback(C_tf*Gp*Gm, 1))
+# --------------------------------------------------------------------
+import os
+import pickle
+import hashlib
+import threading
+import collections
+
+import numpy as np
+
+VERSION_CACHE = 1
+_EXTENSION = ".pkl"
+
+
+# ════════════════════════════════════════════════════════════════════
+# 1)  Clave canónica
+# ════════════════════════════════════════════════════════════════════
+def _es_numero(v):
+    return isinstance(v, (int, float, complex, np.number))
+
+
+def _alimentar(h, x):
+    """Vuelca `x` en el hash `h` con una etiqueta de tipo por elemento."""
+    if x is None:
+        h.update(b'N')
+    elif isinstance(x, (bool, np.bool_)):
+        h.update(b'B1' if x else b'B0')
+    elif isinstance(x, str):
+        h.update(b'S%d:' % len(x.encode()) + x.encode())
+    elif isinstance(x, bytes):
+        h.update(b'Y%d:' % len(x) + x)
+    elif hasattr(x, 'num') and hasattr(x, 'den'):      # TransferFunction
+        h.update(b'TF')
+        _alimentar(h, x.num)
+        _alimentar(h, x.den)
+        _alimentar(h, float(x.dt or 0))
+    elif isinstance(x, dict):
+        h.update(b'D%d:' % len(x))
+        for k in sorted(x, key=str):
+            _alimentar(h, str(k))
+            _alimentar(h, x[k])
+    elif isinstance(x, (list, tuple)) and not all(_es_numero(v) for v in x):
+        h.update(b'L%d:' % len(x))                     # anidado (p. ej. tf.num)
+        for v in x:
+            _alimentar(h, v)
+    else:                                               # número o arreglo
+        a = np.asarray(x)
+        if a.dtype.kind not in 'biufc':
+            raise TypeError(f"clave_canonica: tipo no soportado {type(x).__name__}")
+        a = a.astype(complex if np.iscomplexobj(a) else float) + 0.0   # -0.0 → 0.0
+        if a.dtype == complex and not np.any(a.imag):
+            a = a.real
+        a = np.ascontiguousarray(a)
+        h.update(b'A%s%r:' % (a.dtype.str.encode(), a.shape))
+        h.update(a.tobytes())
+
+
+def clave_canonica(*partes) -> str:
+    """Hash (hex) de `partes`, igual entre ejecuciones y procesos."""
+    h = hashlib.sha1(b'v%d' % VERSION_CACHE)
+    for p in partes:
+        _alimentar(h, p)
+    return h.hexdigest()
+
+
+# ════════════════════════════════════════════════════════════════════
+# 2)  CacheLRU
+# ════════════════════════════════════════════════════════════════════
+class CacheLRU:
+    """
+    Cache acotado en memoria (LRU) con un nivel opcional en disco.
+
+    • obtener(clave) → valor o KeyError; busca en memoria y después en
+      disco (un acierto en disco vuelve a memoria).
+    • guardar(clave, valor) → en los dos niveles.
+    • obtener_o_calcular(clave, funcion) → lo de siempre.  `funcion`
+      corre fuera del lock: dos hilos con la misma clave pueden
+      calcular a la vez (gana el último, el resultado es el mismo).
+    • Los valores se devuelven tal cual (sin copiar): los arreglos que
+      se guardan conviene marcarlos de sólo lectura.
+    • Se puede usar desde varios hilos (StepWorker corre en un QThread).
+    • En disco: `directorio`/<clave>.pkl con pickle; un archivo que no
+      se puede leer (versión vieja de python-control, escritura a
+      medias) cuenta como fallo y se borra.
+    """
+
+    def __init__(self, max_entradas=64, directorio=None, max_archivos=512):
+        self.max_entradas = int(max_entradas)
+        self.max_archivos = int(max_archivos)
+        self.directorio = None
+        self._datos = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = self.aciertos_disco = self.fallos = 0
+        if directorio is not None:
+            self.usar_disco(directorio)
+
+    def usar_disco(self, directorio):
+        """Activa (o cambia) el nivel en disco; None lo desactiva."""
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return clave in self._datos or (
+            self.directorio is not None and os.path.exists(self._ruta(clave)))
+
+    # ---------------------------------------------------------------
+    def obtener(self, clave):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+        valor = self._leer_disco(clave)
+        with self._lock:
+            if valor is _FALTA:
+                self.fallos += 1
+                raise KeyError(clave)
+            self.aciertos_disco += 1
+            self._meter(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._meter(clave, valor)
+        self._escribir_disco(clave, valor)
+
+    def obtener_o_calcular(self, clave, funcion):
+        try:
+            return self.obtener(clave)
+        except KeyError:
+            pass
+        valor = funcion()
+        self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self, disco=False):
+        with self._lock:
+            self._datos.clear()
+        if disco and self.directorio is not None:
+            for nombre in self._archivos():
+                _borrar(os.path.join(self.directorio, nombre))
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.aciertos_disco + self.fallos
+        return {
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "aciertos": self.aciertos,
+            "aciertos_disco": self.aciertos_disco,
+            "fallos": self.fallos,
+            "tasa_acierto": (self.aciertos + self.aciertos_disco) / consultas
+                            if consultas else 0.0,
+            "disco": self.directorio,
+        }
+
+    # ---------------------------------------------------------------
+    def _meter(self, clave, valor):
+        """Con el lock tomado."""
+        self._datos[clave] = valor
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave + _EXTENSION)
+
+    def _archivos(self):
+        try:
+            return [n for n in os.listdir(self.directorio) if n.endswith(_EXTENSION)]
+        except OSError:
+            return []
+
+    def _leer_disco(self, clave):
+        if self.directorio is None:
+            return _FALTA
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                valor = pickle.load(f)
+        except FileNotFoundError:
+            return _FALTA
+        except Exception as e:
+            print(f"[CACHE] {ruta}: no se pudo leer ({e}); se descarta")
+            _borrar(ruta)
+            return _FALTA
+        try:
+            os.utime(ruta)                      # LRU también en disco
+        except OSError:
+            pass
+        return valor
+
+    def _escribir_disco(self, clave, valor):
+        if self.directorio is None:
+            return
+        ruta = self._ruta(clave)
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, ruta)
+        except Exception as e:
+            print(f"[CACHE] {ruta}: no se pudo escribir ({e})")
+            _borrar(tmp)
+            return
+        self._podar_disco()
+
+    def _podar_disco(self):
+        nombres = self._archivos()
+        if len(nombres) <= self.max_archivos:
+            return
+        rutas = [os.path.join(self.directorio, n) for n in nombres]
+        edades = []
+        for r in rutas:
+            try:
+                edades.append((os.path.getmtime(r), r))
+            except OSError:
+                pass
+        edades.sort()
+        for _, r in edades[:len(edades) - self.max_archivos]:
+            _borrar(r)
+
+
+_FALTA = object()
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
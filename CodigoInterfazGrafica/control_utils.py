@@ -1,5 +1,16 @@
 import numpy as np
-from control import TransferFunction, tf, feedback
+from control import TransferFunction, tf, feedback, forced_response
+
+from pidf import ControladorPIDf, coeficientes_pidf, pwm_pidf_lote
+from cache_utils import CacheLRU, clave_canonica
+
+# Modelos ya armados (G(s) mecánicas, lazos, tablas): sólo en memoria,
+# reconstruirlos cuesta menos que un pickle a disco.
+CACHE_MODELOS = CacheLRU(max_entradas=64)
+# Respuestas al escalón (compartido por todos los bancos); main.py les
+# agrega el nivel en disco con CACHE_RESPUESTAS.usar_disco(...).
+CACHE_RESPUESTAS = CacheLRU(max_entradas=64)
+
 
 class ControlSystem:
     def __init__(self):
@@ -12,21 +23,12 @@ class ControlSystem:
 
         # === Estado ===
         self.theta_eq_rad = 0.0
-        self.anguloReferencia_rad = 0.0
 
-        # === PIDf (parámetros y coeficientes) ===
+        # === PIDf: coeficientes, estado, referencia y PWM de equilibrio ===
+        # (SerialComm usa este mismo objeto, ver Rig)
         self.Kp = 0; self.Ki = 0; self.Kd = 0; self.N = 1
         self.Ts = 0.022  # [s] período de muestreo
-        self.a0 = self.a1 = self.a2 = self.a3 = self.a4 = self.a5 = 0
-
-        # === Estados anteriores del PIDf ===
-        self.error_km1 = 0.0
-        self.error_km2 = 0.0
-        self.u_km1 = 0.0
-        self.u_km2 = 0.0
-
-        # === PWM equilibrio ===
-        self.PWM_eq = self.pwm_equilibrio()
+        self.pidf = ControladorPIDf(pwm_eq=self.pwm_equilibrio())
 
         # === Modelos dinámicos ===
         self.motor_models = {
@@ -36,9 +38,28 @@ class ControlSystem:
             'Modelo sin fricción': self._make_mech_tf(self.theta_eq_rad)
         }
 
-    # === PWM equilibrio ===
-    def pwm_equilibrio(self):
-        fuerza_eq = -(self.C * np.cos(self.theta_eq_rad)) / self.Lm
+    # === Referencia y PWM de equilibrio (viven en el controlador) ===
+    @property
+    def anguloReferencia_rad(self):
+        return self.pidf.ref_rad
+
+    @anguloReferencia_rad.setter
+    def anguloReferencia_rad(self, valor):
+        self.pidf.ref_rad = valor
+
+    @property
+    def PWM_eq(self):
+        return self.pidf.pwm_eq
+
+    @PWM_eq.setter
+    def PWM_eq(self, valor):
+        self.pidf.pwm_eq = valor
+
+    # === PWM equilibrio (acepta arreglos de θ_eq) ===
+    def pwm_equilibrio(self, theta_eq_rad=None):
+        if theta_eq_rad is None:
+            theta_eq_rad = self.theta_eq_rad
+        fuerza_eq = -(self.C * np.cos(theta_eq_rad)) / self.Lm
         return (fuerza_eq - self.r) / self.m
 
     # === Generar G(s) mecánico ===
@@ -47,13 +68,29 @@ class ControlSystem:
         B = (self.C * np.sin(theta_eq_rad)) / self.I
         self.last_A = A
         self.last_B = B
-        return TransferFunction([A], [1, 0, B])
+        return CACHE_MODELOS.obtener_o_calcular(
+            clave_canonica("mecanica", A, B),
+            lambda: TransferFunction([A], [1, 0, B]))
 
     def set_equilibrium_angle_deg(self, angle_deg):
         self.theta_eq_rad = np.radians(angle_deg)
         self.mech_models['Mecánica 1'] = self._make_mech_tf(self.theta_eq_rad)
         self.PWM_eq = self.pwm_equilibrio()
 
+    def set_parametros_fisicos(self, **valores):
+        """
+        Cambia I, C, Lm, m y/o r (p. ej. con IdentificadorRLS.sugerencia)
+        y rearma lo que depende de ellos: modelos y PWM_eq.
+        """
+        for nombre, valor in valores.items():
+            if nombre not in ('I', 'C', 'Lm', 'm', 'r'):
+                raise ValueError(f"Parámetro físico desconocido: {nombre}")
+            setattr(self, nombre, float(valor))
+        self.motor_models['Modelo estático 1'] = TransferFunction([self.m], [1])
+        for nombre in self.mech_models:
+            self.mech_models[nombre] = self._make_mech_tf(self.theta_eq_rad)
+        self.PWM_eq = self.pwm_equilibrio()
+
     def get_motor_tf(self, name='Modelo estático 1'):
         return self.motor_models[name]
 
@@ -63,6 +100,71 @@ class ControlSystem:
     def get_real_plant_tf(self):
         return self.get_motor_tf() * self.get_mech_tf()
 
+    # === Lazo cerrado y respuesta al escalón (memoizados) ===
+    def lazo_cerrado(self, C_tf, Gp, Gm):
+        """(feedback(C·Gp·Gm, 1), polos, ceros), del cache si ya se armó."""
+        def armar():
+            T = feedback(C_tf * Gp * Gm, 1)
+            return T, _solo_lectura(T.poles()), _solo_lectura(T.zeros())
+        return CACHE_MODELOS.obtener_o_calcular(
+            clave_canonica("lazo", C_tf, Gp, Gm), armar)
+
+    def respuesta_escalon(self, C_tf, Gp, Gm, ang_ini_rad, ref_rad, duracion,
+                          lineal=False, puntos=2000):
+        """
+        Lo que calcula StepWorker: salto de `ang_ini_rad` a `ref_rad`
+        durante `duracion` s, más polos y ceros del lazo lineal C·Gp·Gm
+        para el diagrama.  Devuelve (t, ángulo, pwm, polos, ceros) en
+        arreglos de sólo lectura.
+
+        • lineal=False: el lazo real (simulador.py: planta no lineal con
+          I, C, Lm, m, r, PIDf discreto de self.pidf a self.Ts, como en
+          el sketch, y saturación).  C_tf, Gp y Gm sólo dan polos y ceros.
+        • lineal=True: forced_response de feedback(C_tf·Gp·Gm, 1), para
+          controladores que no son el PIDf manual (asignación de polos,
+          polos/ceros movidos a mano, C(s) de un archivo).
+        La clave incluye todo lo que cambia el resultado en cada caso.
+        """
+        if lineal:
+            def simular():
+                T, poles, zeros = self.lazo_cerrado(C_tf, Gp, Gm)
+                t = np.linspace(0.0, duracion, puntos)
+                u = np.full_like(t, ref_rad - ang_ini_rad)
+                _, y = forced_response(T, T=t, U=u)
+                y = y + ang_ini_rad
+                _, delta_pwm = forced_response(C_tf, T=t, U=ref_rad - y)
+                pwm = np.clip(delta_pwm + self.pwm_equilibrio(), 1000, 2000)
+                return (_solo_lectura(t), _solo_lectura(y), _solo_lectura(pwm),
+                        poles, zeros)
+
+            clave = clave_canonica("escalon_lineal", C_tf, Gp, Gm,
+                                   self.theta_eq_rad, self.C, self.Lm, self.m,
+                                   self.r, float(ang_ini_rad), float(ref_rad),
+                                   float(duracion), int(puntos))
+            return CACHE_RESPUESTAS.obtener_o_calcular(clave, simular)
+
+        from simulador import simular_lazo
+
+        def simular():
+            _, poles, zeros = self.lazo_cerrado(C_tf, Gp, Gm)
+            c = self.pidf.copia()
+            if c._tabla is None and c.Ts != self.Ts:
+                # el sketch arma a0 … a5 con su T, no con el de la PC
+                c.set_ganancias(c.Kp, c.Ki, c.Kd, c.N, self.Ts)
+            r = simular_lazo(self, c, ang_ini_rad, duracion, ref_rad, Ts=self.Ts)
+            return (_solo_lectura(r["t"]), _solo_lectura(r["angulo"]),
+                    _solo_lectura(r["pwm"]), poles, zeros)
+
+        tabla = self.pidf._tabla
+        clave = clave_canonica("escalon", C_tf, Gp, Gm, self.theta_eq_rad,
+                               self.I, self.C, self.Lm, self.m, self.r,
+                               self.pidf.Kp, self.pidf.Ki, self.pidf.Kd,
+                               self.pidf.N, self.pidf.coeficientes,
+                               self.pidf.pwm_eq, self.Ts,
+                               None if tabla is None else tabla,
+                               float(ang_ini_rad), float(ref_rad), float(duracion))
+        return CACHE_RESPUESTAS.obtener_o_calcular(clave, simular)
+
     # === PIDf continuo como función de transferencia ===
     def pidf_tf(self, Kp, Ki, Kd, N):
         s = tf([1, 0], [0, 1])
@@ -76,71 +178,167 @@ class ControlSystem:
         tf_2nd_order = TransferFunction([wn**2], [1, 2*zeta*wn, wn**2])
         return tf_2nd_order, zeta, wn
 
+    # === Ganancias PIDf por asignación de polos (igual que el sketch) ===
+    def pidf_asignacion_polos(self, Tss, Mp, theta_eq_rad=None):
+        """
+        Réplica de calcularPIDfCompleto() de Principal.ino.
+        Devuelve (Kp, Ki, Kd, N); acepta arreglos de θ_eq.
+        """
+        if theta_eq_rad is None:
+            theta_eq_rad = self.theta_eq_rad
+        A = self.Lm / self.I
+        B = self.C * np.sin(theta_eq_rad) / self.I
+
+        lnMp = np.log(Mp)
+        zeta = -lnMp / np.sqrt(np.pi**2 + lnMp**2)
+        wn   = 4.0 / (zeta * Tss)
+
+        # polos deseados p1, p2
+        p1 = 10.0 * zeta * wn
+        p2 = 12.0 * zeta * wn
+        alpha1 = p1 + p2 + 2.0 * zeta * wn
+        alpha2 = p1 * p2 + 2.0 * zeta * wn * (p1 + p2) + wn**2
+        alpha3 = 2.0 * zeta * wn * p1 * p2 + wn**2 * (p1 + p2)
+        alpha4 = wn**2 * p1 * p2
+
+        Kp = (alpha3 - alpha1 * B - (alpha4 / alpha1)) / (alpha1 * self.m * A)
+        Ki = alpha4 / (alpha1 * self.m * A)
+        Kd = (alpha2 - B - Kp * self.m * A) / (alpha1 * self.m * A)
+        N  = alpha1
+        return Kp, Ki, Kd, N
+
     # === Establecer parámetros del PID y calcular coeficientes ===
     def set_pid_params(self, Kp, Ki, Kd, N):
         self.Kp = Kp
         self.Ki = Ki
         self.Kd = Kd
         self.N  = N
+        self.pidf.set_ganancias(Kp, Ki, Kd, N, self.Ts)
 
-        T = self.Ts
-        a = Kp + Kd * N
-        b = Kp * N + Ki
-        c = Ki * N
-        d = N
-
-        K1 = (b * d - c) / (d * d)
-        K2 = c / d
-        K3 = (a * d * d - b * d + c) / (d * d)
-
-        self.a0 = K1 + K3
-        self.a1 = -K1 - K1 * np.exp(-d * T) + K2 * T - 2.0 * K3
-        self.a2 = K1 * np.exp(-d * T) - K2 * T * np.exp(-d * T) + K3
-        self.a3 = 1.0
-        self.a4 = -np.exp(-d * T) - 1.0
-        self.a5 = np.exp(-d * T)
-
-        print(f"[CONTROL] PIDf discreto actualizado. a0={self.a0:.3f}, ..., a5={self.a5:.3f}")
+        a = self.pidf.coeficientes
+        print(f"[CONTROL] PIDf discreto actualizado. a0={a[0]:.3f}, ..., a5={a[5]:.3f}")
 
     # === Calcular PWM desde el ángulo actual (en grados) ===
     def calcular_pwm(self, ang_actual_deg):
-        theta_rad = np.radians(ang_actual_deg)
-        error = self.anguloReferencia_rad - theta_rad
+        return self.pidf.paso(ang_actual_deg)
 
-        u = (1.0 / self.a3) * (
-            self.a0 * error + self.a1 * self.error_km1 + self.a2 * self.error_km2
-            - self.a4 * self.u_km1 - self.a5 * self.u_km2
-        )
-        pwm = np.clip(u + self.PWM_eq, 1000.0, 2000.0)
+    # === calcular_pwm sobre un arreglo de ángulos (una sola llamada) ===
+    def calcular_pwm_lote(self, ang_deg, exacto=True):
+        """
+        Igual, bit a bit, que llamar calcular_pwm muestra por muestra
+        (usa y deja rolado el estado del controlador); exacto=False es
+        el modo rápido con lfilter (ver ControladorPIDf.lote).  Para
+        otras ganancias o un estado inicial explícito, ver pwm_pidf_lote().
+        """
+        return self.pidf.lote(ang_deg, exacto=exacto)
 
-        # Actualizar estados
-        self.error_km2 = self.error_km1
-        self.error_km1 = error
-        self.u_km2 = self.u_km1
-        self.u_km1 = u
+    # === Ganancias programadas por ángulo (tabla de puntos de operación) ===
+    def tabla_operacion(self, Tss, Mp, Ts=None, paso_deg=1.0,
+                        desde_deg=-90.0, hasta_deg=90.0):
+        """TablaPuntosOperacion para estos parámetros (memoizada)."""
+        Ts = self.Ts if Ts is None else Ts
+        clave = clave_canonica("tabla", self.I, self.C, self.Lm, self.m, self.r,
+                               Tss, Mp, Ts, paso_deg, desde_deg, hasta_deg)
+        return CACHE_MODELOS.obtener_o_calcular(
+            clave, lambda: TablaPuntosOperacion(self, Tss, Mp, Ts, paso_deg,
+                                                desde_deg, hasta_deg))
 
-        return pwm
+    def set_programacion(self, tabla=None):
+        """
+        Con una TablaPuntosOperacion, el PIDf de la PC toma a0 … a5 y
+        PWM_eq de la tabla en el ángulo medido, muestra a muestra.
+        None → vuelve a las ganancias fijas (Kp, Ki, Kd, N) y al PWM_eq
+        de θ_eq.  El estado del filtro no se toca.
+        """
+        if tabla is None:
+            with self.pidf:                # el hilo de lectura ve todo o nada
+                self.pidf.programar(None)
+                self.pidf.set_ganancias(self.Kp, self.Ki, self.Kd, self.N, self.pidf.Ts)
+                self.PWM_eq = self.pwm_equilibrio()
+            print("[CONTROL] Ganancias fijas")
+        else:
+            self.pidf.programar(tabla.theta_deg[0], tabla.paso, tabla.filas_pidf())
+            print(f"[CONTROL] Ganancias programadas: {tabla}")
 
     def set_pidf_coefs(self, kp, ki, kd, n, Ts):
         # Coeficientes del PIDf discreto usando el mismo cálculo que Arduino
-        a = kp + kd * n
-        b = kp * n + ki
-        c = ki * n
-        d = n
-
-        K1 = (b * d - c) / (d * d)
-        K2 = c / d
-        K3 = (a * d * d - b * d + c) / (d * d)
-
-        self.a0 = K1 + K3
-        self.a1 = -K1 - K1 * np.exp(-d * Ts) + K2 * Ts - 2.0 * K3
-        self.a2 = K1 * np.exp(-d * Ts) - K2 * Ts * np.exp(-d * Ts) + K3
-        self.a3 = 1.0
-        self.a4 = -np.exp(-d * Ts) - 1.0
-        self.a5 = np.exp(-d * Ts)
-
-        # Guardar estados iniciales
-        self.e_km1 = 0.0
-        self.e_km2 = 0.0
-        self.u_km1 = 0.0
-        self.u_km2 = 0.0
+        self.Kp, self.Ki, self.Kd, self.N = kp, ki, kd, n
+        with self.pidf:                    # ganancias y reinicio, de una vez
+            self.pidf.set_ganancias(kp, ki, kd, n, Ts)
+
+            # Guardar estados iniciales
+            self.pidf.reiniciar()
+
+
+# === Puntos de operación en función de θ_eq (para programar ganancias) ===
+class TablaPuntosOperacion:
+    """
+    Linealización y PIDf por asignación de polos sobre una grilla
+    uniforme de θ_eq, armada de una vez con operaciones vectorizadas.
+
+    Columnas (COLUMNAS): A, B de G(s) = A / (s² + B), PWM_eq, las
+    ganancias Kp, Ki, Kd, N para (Tss, Mp) y a0 … a5 del PIDf discreto.
+
+    • tabla["B"] → la columna en toda la grilla.
+    • interpolar(θ_deg) → fila(s) interpolada(s) linealmente, O(1) por
+      muestra (índice directo, sin búsqueda); θ fuera de rango → extremo.
+    • consultar(θ_deg) → {columna: valor} de un ángulo.
+    • filas_pidf() → (a0 … a5, PWM_eq) para ControladorPIDf.programar.
+    """
+
+    COLUMNAS = ("A", "B", "pwm_eq", "Kp", "Ki", "Kd", "N",
+                "a0", "a1", "a2", "a3", "a4", "a5")
+
+    def __init__(self, sistema, Tss, Mp, Ts, paso_deg=1.0,
+                 desde_deg=-90.0, hasta_deg=90.0):
+        n = max(int(round((hasta_deg - desde_deg) / paso_deg)) + 1, 2)
+        self.theta_deg = np.linspace(desde_deg, hasta_deg, n)
+        self.paso = (hasta_deg - desde_deg) / (n - 1)
+        self.Tss, self.Mp, self.Ts = Tss, Mp, Ts
+
+        th = np.radians(self.theta_deg)
+        A = np.full(n, sistema.Lm / sistema.I)
+        B = sistema.C * np.sin(th) / sistema.I
+        pwm_eq = sistema.pwm_equilibrio(th)
+        Kp, Ki, Kd, N = np.broadcast_arrays(       # Ki y N no dependen de θ
+            *sistema.pidf_asignacion_polos(Tss, Mp, th), th)[:4]
+        coefs = coeficientes_pidf(Kp, Ki, Kd, N, Ts)
+        self.valores = _solo_lectura(
+            np.column_stack((A, B, pwm_eq, Kp, Ki, Kd, N, coefs)))
+        self._col = {c: i for i, c in enumerate(self.COLUMNAS)}
+
+    def __len__(self):
+        return len(self.theta_deg)
+
+    def __getitem__(self, columna):
+        return self.valores[:, self._col[columna]]
+
+    def __repr__(self):
+        return (f"TablaPuntosOperacion({len(self)} puntos, "
+                f"{self.theta_deg[0]:g}°…{self.theta_deg[-1]:g}° cada {self.paso:g}°, "
+                f"Tss={self.Tss:g}, Mp={self.Mp:g})")
+
+    def indice(self, theta_deg):
+        """(i, w): θ está entre la fila i y la i+1, con peso w en la i+1."""
+        f = (np.asarray(theta_deg, dtype=float) - self.theta_deg[0]) / self.paso
+        f = np.clip(f, 0.0, len(self) - 1)
+        i = np.minimum(f.astype(np.int64), len(self) - 2)
+        return i, f - i
+
+    def interpolar(self, theta_deg):
+        i, w = self.indice(theta_deg)
+        w = np.asarray(w)[..., None]
+        return self.valores[i] + w * (self.valores[i + 1] - self.valores[i])
+
+    def consultar(self, theta_deg) -> dict:
+        return dict(zip(self.COLUMNAS, (float(v) for v in self.interpolar(theta_deg))))
+
+    def filas_pidf(self):
+        j = [self._col[c] for c in ("a0", "a1", "a2", "a3", "a4", "a5", "pwm_eq")]
+        return self.valores[:, j]
+
+
+def _solo_lectura(a):
+    a = np.array(a)
+    a.setflags(write=False)
+    return a
@@ -0,0 +1,178 @@
+# decimacion.py  – envolvente mín/máx por columna de píxel para las gráficas
+# --------------------------------------------------------------------
+# Entre el búfer de datos y las curvas de pyqtgraph: en lugar de pasarle
+# a setData toda la historia, se guardan "columnas" de tiempo con el
+# mínimo y el máximo de cada serie.  Las columnas tienen todas el mismo
+# ancho `dt`; cuando hay más de 2·`columnas` se fusionan de a pares
+# (dt se duplica).  Así:
+#   • agregar() cuesta O(muestras nuevas), nunca O(historia)
+#   • curva() devuelve ≤ 4·`columnas` puntos, dure lo que dure la sesión
+#   • un pico de una sola muestra sigue viéndose (queda en el máx/mín)
+#
+#   env = DecimadorEnvolvente(columnas=1000, series=3)
+#   env.agregar(t, angulo, error, pwm)        # bloques, t no decreciente
+#   env.recortar(t_min)                        # ventana deslizante
+#   x, y = env.curva(0)                        # → curve.setData(x, y)
+# --------------------------------------------------------------------
+import numpy as np
+
+
+class DecimadorEnvolvente:
+    """
+    Envolvente mín/máx incremental de `series` señales que comparten el
+    eje de tiempo.
+
+    Cada columna guarda cuántas muestras tiene, su primera y última
+    muestra (t, y) y el mín/máx de cada serie.  curva() dibuja por
+    columna dos puntos, (t_primera, mín) y (t_última, máx) —o al revés
+    si la señal baja dentro de la columna— para que las pendientes no
+    se vean como un serrucho.
+
+    `columnas` ≈ ancho del gráfico en píxeles.  El ancho de columna se
+    adapta a la historia que se muestra; si después se acorta la
+    ventana, las columnas no vuelven a partirse (se verán más anchas).
+    """
+
+    def __init__(self, columnas=1000, series=1, dt_inicial=1e-3):
+        self.columnas = int(columnas)
+        self.series = int(series)
+        self.dt_inicial = float(dt_inicial)
+        self._cap = 2 * self.columnas + 2        # +1 por la alineación al fusionar
+        self.reiniciar()
+
+    def reiniciar(self):
+        cap, s = self._cap, self.series
+        self.dt = self.dt_inicial
+        self._origen = None                      # t de la columna k = 0
+        self._k0 = 0                             # índice de la 1ª columna guardada
+        self._nb = 0                             # columnas en uso
+        self._cnt = np.zeros(cap, dtype=np.int64)
+        self._t_ini = np.zeros(cap)
+        self._t_fin = np.zeros(cap)
+        self._y_ini = np.zeros((cap, s))
+        self._y_fin = np.zeros((cap, s))
+        self._min = np.full((cap, s), np.inf)
+        self._max = np.full((cap, s), -np.inf)
+
+    def __len__(self):
+        """Columnas con al menos una muestra."""
+        return int(np.count_nonzero(self._cnt[:self._nb]))
+
+    @property
+    def muestras(self) -> int:
+        return int(self._cnt[:self._nb].sum())
+
+    @property
+    def t_inicio(self):
+        """t de la muestra más vieja que se conserva (None si no hay)."""
+        llenas = np.flatnonzero(self._cnt[:self._nb])
+        return float(self._t_ini[llenas[0]]) if len(llenas) else None
+
+    # ---------------------------------------------------------------
+    def agregar(self, t, *ys):
+        """Agrega un bloque: `t` (no decreciente) y una señal por serie."""
+        if len(ys) != self.series:
+            raise ValueError(f"Se esperaban {self.series} series, llegaron {len(ys)}")
+        t = np.asarray(t, dtype=float)
+        n = len(t)
+        if n == 0:
+            return
+        Y = np.empty((n, self.series))
+        for j, y in enumerate(ys):
+            Y[:, j] = y
+
+        if self._origen is None:
+            self._origen = t[0]
+        k = np.floor((t - self._origen) / self.dt).astype(np.int64)
+        # una muestra "del pasado" (reloj que retrocede) cae en la última columna
+        k = np.maximum(k, self._k0 + max(self._nb - 1, 0))
+        while k[-1] - self._k0 >= self._cap - 1:
+            self._fusionar()
+            k >>= 1                              # ⌊x/2dt⌋ = ⌊⌊x/dt⌋/2⌋
+
+        # grupos consecutivos de la misma columna
+        inicio = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        fin = np.r_[inicio[1:], n] - 1
+        idx = k[inicio] - self._k0
+        cnt = np.diff(np.r_[inicio, n])
+        g_min = np.minimum.reduceat(Y, inicio, axis=0)
+        g_max = np.maximum.reduceat(Y, inicio, axis=0)
+
+        nueva = self._cnt[idx] == 0              # sólo el 1º grupo puede no serlo
+        self._t_ini[idx] = np.where(nueva, t[inicio], self._t_ini[idx])
+        self._y_ini[idx] = np.where(nueva[:, None], Y[inicio], self._y_ini[idx])
+        self._t_fin[idx] = t[fin]
+        self._y_fin[idx] = Y[fin]
+        self._min[idx] = np.minimum(self._min[idx], g_min)
+        self._max[idx] = np.maximum(self._max[idx], g_max)
+        self._cnt[idx] += cnt
+        self._nb = max(self._nb, int(idx[-1]) + 1)
+
+    def recortar(self, t_min):
+        """Descarta las columnas que terminan antes de `t_min`."""
+        nb = self._nb
+        viejas = (self._cnt[:nb] == 0) | (self._t_fin[:nb] < t_min)
+        j = nb if viejas.all() else int(np.argmin(viejas))
+        if j == 0:
+            return
+        self._mover(j, 0, nb - j)
+        self._k0 += j
+        self._nb = nb - j
+
+    # ---------------------------------------------------------------
+    def curva(self, serie=0):
+        """(x, y) listos para setData: 2 puntos por columna no vacía."""
+        nb = self._nb
+        llenas = np.flatnonzero(self._cnt[:nb])
+        if len(llenas) == 0:
+            return np.empty(0), np.empty(0)
+        y_min = self._min[llenas, serie]
+        y_max = self._max[llenas, serie]
+        sube = self._y_fin[llenas, serie] >= self._y_ini[llenas, serie]
+        x = np.column_stack((self._t_ini[llenas], self._t_fin[llenas])).ravel()
+        y = np.column_stack((np.where(sube, y_min, y_max),
+                             np.where(sube, y_max, y_min))).ravel()
+        return x, y
+
+    # ---------------------------------------------------------------
+    def _mover(self, desde, hasta, n):
+        """Copia n columnas de `desde` a `hasta` y vacía lo que sobra."""
+        for a in (self._cnt, self._t_ini, self._t_fin, self._y_ini,
+                  self._y_fin, self._min, self._max):
+            a[hasta:hasta + n] = a[desde:desde + n].copy()
+        self._vaciar(hasta + n, max(desde + n, hasta + n))
+
+    def _vaciar(self, i, j):
+        self._cnt[i:j] = 0
+        self._min[i:j] = np.inf
+        self._max[i:j] = -np.inf
+
+    def _fusionar(self):
+        """Duplica dt: las columnas (2i, 2i+1) pasan a ser la columna i."""
+        if self._k0 % 2:                         # alinear a índice par
+            self._mover(0, 1, self._nb)
+            self._vaciar(0, 1)
+            self._k0 -= 1
+            self._nb += 1
+        nb = self._nb + self._nb % 2
+        a, b = slice(0, nb, 2), slice(1, nb, 2)
+        ca, cb = self._cnt[a], self._cnt[b]
+        hay_a, hay_b = ca > 0, cb > 0
+
+        t_ini = np.where(hay_a, self._t_ini[a], self._t_ini[b])
+        y_ini = np.where(hay_a[:, None], self._y_ini[a], self._y_ini[b])
+        t_fin = np.where(hay_b, self._t_fin[b], self._t_fin[a])
+        y_fin = np.where(hay_b[:, None], self._y_fin[b], self._y_fin[a])
+        y_min = np.minimum(self._min[a], self._min[b])
+        y_max = np.maximum(self._max[a], self._max[b])
+        cnt = ca + cb
+
+        m = nb // 2
+        self._vaciar(0, self._cap)
+        self._cnt[:m] = cnt
+        self._t_ini[:m], self._t_fin[:m] = t_ini, t_fin
+        self._y_ini[:m], self._y_fin[:m] = y_ini, y_fin
+        self._min[:m], self._max[:m] = y_min, y_max
+        self._k0 //= 2
+        self._nb = m
+        self.dt *= 2.0
@@ -0,0 +1,529 @@
+# emulador_arduino.py  – Principal.ino "de mentira" sobre un pseudo-terminal
+# --------------------------------------------------------------------
+# Simula la planta con los parámetros de ControlSystem (I, C, Lm, m, r)
+# y habla el mismo protocolo que el sketch:
+#   PC → Arduino : "Tss,Mp,kp,ki,kd,n,pwm,toggle\n"   (leerDatosDesdePC)
+#   Arduino → PC : "#ang,err,pwm\r\n"                   (enviarDatosALaPC)
+#                  o la trama binaria (TELEMETRIA_BINARIA)
+#                  y "Calibre el ESC …" si el ESC no está calibrado.
+#   Enlace       : "nan,nan,$BAUD,<b>" / "nan,nan,$PING" (negociación)
+# SerialComm(port=emu.puerto) funciona sin cambios.  Sólo POSIX (pty).
+#
+#   python emulador_arduino.py               → 9600 baud, tiempo real
+#   python emulador_arduino.py --sin-limite  → lo más rápido posible
+# --------------------------------------------------------------------
+import os
+import sys
+import tty
+import math
+import time
+import select
+import random
+import argparse
+import threading
+
+from control_utils import ControlSystem
+from io_utils import empaquetar_trama_binaria
+
+
+class EmuladorArduino:
+    """
+    Emula Principal.ino (pasos 2 a 8 de loop()) contra una planta no
+    lineal  I·θ'' = Lm·F + C·cos θ,  F = máx(0, m·PWM + r).
+
+    • tiempo_real=True  → período de 21 ms como el sketch, bytes al ritmo
+      de `baud` (8N1) y búferes de 64 bytes del AVR: si el TX se llena el
+      loop se frena, si el RX se llena se pierden bytes.
+    • tiempo_real=False → el tiempo simulado avanza igual pero sin
+      esperas ni límite de baud ("unthrottled").
+    • Se reproducen las rarezas del sketch: el toggle sólo se aplica si
+      la línea trae algún otro dato válido, una vez recibido un PWM de la
+      PC se usa siempre, el motor sólo gira con Tss ≥ 12 y el ESC hace
+      una rampa de 1 µs por ms.
+    • Negocia el baud rate como procesarComandoEnlace(); con
+      `baud_max_cable` las velocidades mayores "no pasan" (el $PING
+      llega ilegible) para probar la vuelta a la velocidad anterior.
+    No se emula el registro en SD ni el menú del LCD.
+    """
+    RX_BUFFER_AVR = 64
+    TX_BUFFER_AVR = 64
+    BANNER_ESC = b"Calibre el ESC antes de intentar usar el motor.\r\n"
+    BAUDIOS_PERMITIDOS = (115200, 250000, 500000, 1000000)
+    TIMEOUT_PING = 0.5                      # [s] TIMEOUT_PING_MS
+
+    def __init__(self, ctrl=None, baud=9600, tiempo_real=True,
+                 formato='texto', con_tiempo=False, esc_calibrado=True,
+                 angulo_inicial_deg=-50.4, limites_deg=(-50.4, 50.4),
+                 T_ms=22.0, T_procesamiento_ms=1.0, rampa_esc=True,
+                 ruido_deg=0.0, registrar=False, baud_max_cable=None):
+        self.ctrl = ctrl if ctrl is not None else ControlSystem()
+        self.baud = baud
+        self.baud_inicial = baud
+        self.baud_max_cable = baud_max_cable
+        self.tiempo_real = tiempo_real
+        self.formato = formato                  # 'texto' | 'binario'
+        self.con_tiempo = con_tiempo            # agrega millis()
+        self.esc_calibrado = esc_calibrado
+        self.limites_rad = tuple(math.radians(x) for x in limites_deg)
+        self.Ts_loop = (T_ms - T_procesamiento_ms) / 1000.0
+        self.Ts = T_ms / 1000.0
+        self.rampa_esc = rampa_esc
+        self.ruido_deg = ruido_deg
+        self.registrar = registrar              # para benchmark_serial.py
+        self._t_byte = 10.0 / baud
+
+        # --- planta ---
+        self.theta = math.radians(angulo_inicial_deg)
+        self.omega = 0.0
+        self.t_sim = 0.0                        # [s] millis()/1000 emulado
+
+        # --- variables globales del sketch ---
+        self.Tss, self.Mp = 12.0, 0.20
+        self.Kp = self.Ki = self.Kd = self.N = 0.0
+        self.a = [0.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+        self.error_km1 = self.error_km2 = 0.0
+        self.u_km1 = self.u_km2 = 0.0
+        self.pwm_pc = 1000.0
+        self.usePwmPc = False
+        self.controlActivo = False
+        self.angulo_equilibrio_rad = 0.0
+        self.anguloReferencia_rad = 0.0
+        self.PWM_equilibrio = 0.0
+        self.velocidadActual = 1000
+        self._lastEq, self._lastTss = -999.0, -1.0
+        self._calcular_pidf_completo()
+
+        # --- puerto ---
+        self._master = self._slave = None
+        self.puerto = None
+        self._rx_linea = bytearray()            # static buf[] de leerDatosDesdePC
+        self._rx_avr = bytearray()              # búfer RX del AVR (64 B)
+        self._rx_cable = bytearray()            # bytes aún "en el cable"
+        self._t_rx_prev = None
+        self._tx_cola = bytearray()
+        self._tx_cond = threading.Condition()
+        self._seq = 0
+
+        self._vivo = False
+        self._hilos = []
+
+        # --- contadores ---
+        self.tramas_enviadas = 0
+        self.comandos_recibidos = 0
+        self.bytes_rx_perdidos = 0
+        self.tramas_antes_de_negociar = 0       # la PC numera desde acá
+
+        # con registrar=True (perf_counter):
+        self.registro_tx = []                   # (nº de trama, hora de envío)
+        self.registro_rx = []                   # (línea, hora en que se procesa)
+
+    # ---------------------------------------------------------------
+    def abrir(self):
+        """Crea el pty sin arrancar el loop (así la PC no pierde tramas)."""
+        if self._master is None:
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)             # sin eco ni traducción CR/LF
+            self.puerto = os.ttyname(self._slave)
+        return self
+
+    def start(self):
+        self.abrir()
+        self._vivo = True
+        self._hilos = [threading.Thread(target=self._loop, daemon=True)]
+        if self.tiempo_real:
+            self._hilos.append(threading.Thread(target=self._pacer_tx, daemon=True))
+        for h in self._hilos:
+            h.start()
+        return self
+
+    def stop(self):
+        self._vivo = False
+        with self._tx_cond:
+            self._tx_cond.notify_all()
+        for h in self._hilos:
+            h.join(timeout=1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ════════════════════════════════════════════════════════════════
+    #                    loop() de Principal.ino
+    # ════════════════════════════════════════════════════════════════
+    def _loop(self):
+        t_wall = time.perf_counter()
+        while self._vivo:
+            t_inicio = time.perf_counter()
+            self._t_cuerpo = 0.0                # [s] lo que "tarda" el cuerpo
+            pwm_previo = self.velocidadActual
+
+            # 2) Leer y aplicar datos de PC
+            got, d = self._leer_datos_desde_pc()
+            if got:
+                if not any(math.isnan(x) for x in d['pid']):
+                    self.Kp, self.Ki, self.Kd, self.N = d['pid']
+                if not math.isnan(d['Tss']) and not math.isnan(d['Mp']):
+                    self.Tss, self.Mp = d['Tss'], d['Mp']
+                if not math.isnan(d['pwm']):
+                    self.pwm_pc = d['pwm']
+                    self.usePwmPc = True
+                self.controlActivo = d['toggle']
+
+            # 3) Leer sensor
+            ang_deg = math.degrees(self.theta)
+            if self.ruido_deg:
+                ang_deg += random.gauss(0.0, self.ruido_deg)
+            ang_rad = math.radians(ang_deg)
+            error = self.anguloReferencia_rad - ang_rad
+
+            # 4) Calcular PWM
+            if self.usePwmPc:
+                pwm_out = min(max(self.pwm_pc, 1000.0), 2000.0)
+            else:
+                a0, a1, a2, a3, a4, a5 = self.a
+                u = (1.0 / a3) * (a0 * error + a1 * self.error_km1 + a2 * self.error_km2
+                                  - a4 * self.u_km1 - a5 * self.u_km2)
+                pwm_out = min(max(u + self.PWM_equilibrio, 1000.0), 2000.0)
+                self.u_km2, self.u_km1 = self.u_km1, u
+
+            # 5) Aplicar y mostrar
+            pwm_aplicado = pwm_out if self.controlActivo else 1000.0
+            error_deg = math.degrees(error)
+            if self.controlActivo and self.Tss >= 12:
+                self._escribir_velocidad_esc(int(pwm_aplicado))
+            else:
+                self._escribir_velocidad_esc(1000)
+
+            self.error_km2, self.error_km1 = self.error_km1, error
+
+            # 6) Recalcular PID si cambió
+            if self.controlActivo and self.Tss >= 8 and \
+                    (self.angulo_equilibrio_rad != self._lastEq or self.Tss != self._lastTss):
+                self._calcular_pidf_completo()
+                self._lastEq, self._lastTss = self.angulo_equilibrio_rad, self.Tss
+                self.error_km1 = self.error_km2 = 0.0
+                self.u_km1 = self.u_km2 = 0.0
+
+            # 8) Enviar datos a PC
+            self._enviar_datos_a_la_pc(ang_deg, error_deg, pwm_aplicado)
+
+            # la planta evoluciona hasta el próximo loop()
+            dt = max(self.Ts_loop, self._t_cuerpo + 1e-3)
+            self._avanzar_planta(pwm_previo, self.velocidadActual, dt)
+            self.t_sim += dt
+
+            if self.tiempo_real:
+                t_wall += dt
+                espera = t_wall - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    t_wall = time.perf_counter()
+            elif time.perf_counter() - t_inicio > 0.1:
+                t_wall = time.perf_counter()
+
+    # ---------------------------------------------------------------
+    def _calcular_pidf_completo(self):
+        c = self.ctrl
+        ang_eq = self.angulo_equilibrio_rad
+        self.Kp, self.Ki, self.Kd, self.N = (
+            float(x) for x in c.pidf_asignacion_polos(self.Tss, self.Mp, ang_eq))
+
+        a = self.Kp + self.Kd * self.N
+        b = self.Kp * self.N + self.Ki
+        cc = self.Ki * self.N
+        d = self.N
+        K1 = (b * d - cc) / (d * d)
+        K2 = cc / d
+        K3 = (a * d * d - b * d + cc) / (d * d)
+        e = math.exp(-d * self.Ts)
+        self.a = [K1 + K3, -K1 - K1 * e + K2 * self.Ts - 2.0 * K3,
+                  K1 * e - K2 * self.Ts * e + K3, 1.0, -e - 1.0, e]
+
+        fuerza_eq = -(c.C * math.cos(ang_eq)) / c.Lm
+        self.PWM_equilibrio = (fuerza_eq - c.r) / c.m
+
+    def _escribir_velocidad_esc(self, velocidad):
+        if not self.esc_calibrado:
+            self._serial_write(self.BANNER_ESC)
+            return
+        if self.rampa_esc:
+            self._t_cuerpo += abs(velocidad - self.velocidadActual) * 1e-3
+        self.velocidadActual = velocidad
+
+    def _avanzar_planta(self, pwm_ini, pwm_fin, dt, h=1e-3):
+        """Integra dt segundos; el ESC sube/baja 1 µs por ms hasta pwm_fin."""
+        c = self.ctrl
+        lo, hi = self.limites_rad
+        paso_pwm = 1 if pwm_fin > pwm_ini else -1
+
+        def f(th, om):
+            return om, (c.Lm * fuerza + c.C * math.cos(th)) / c.I
+
+        pasos = max(1, int(round(dt / h)))
+        h = dt / pasos
+        th, om = self.theta, self.omega
+        for k in range(pasos):                  # RK4
+            if self.rampa_esc and k < abs(pwm_fin - pwm_ini):
+                pwm = pwm_ini + paso_pwm * (k + 1)
+            else:
+                pwm = pwm_fin
+            fuerza = max(0.0, c.m * pwm + c.r) if pwm > 1000 else 0.0
+            k1t, k1o = f(th, om)
+            k2t, k2o = f(th + 0.5 * h * k1t, om + 0.5 * h * k1o)
+            k3t, k3o = f(th + 0.5 * h * k2t, om + 0.5 * h * k2o)
+            k4t, k4o = f(th + h * k3t, om + h * k3o)
+            th += h / 6.0 * (k1t + 2 * k2t + 2 * k3t + k4t)
+            om += h / 6.0 * (k1o + 2 * k2o + 2 * k3o + k4o)
+            if th <= lo or th >= hi:            # tope mecánico, choque plástico
+                th = min(max(th, lo), hi)
+                om = 0.0
+        self.theta, self.omega = th, om
+
+    # ════════════════════════════════════════════════════════════════
+    #                    CodigoComunicacionSoftware
+    # ════════════════════════════════════════════════════════════════
+    def _leer_datos_desde_pc(self):
+        """Procesa a lo sumo una línea, igual que leerDatosDesdePC()."""
+        self._recibir()
+        rx = self._rx_avr
+        while rx:
+            c = rx[0]
+            del rx[:1]
+            if c == 0x0D:                       # '\r'
+                continue
+            if c != 0x0A:                       # '\n'
+                if len(self._rx_linea) < 79:
+                    self._rx_linea.append(c)
+                continue
+
+            linea = bytes(self._rx_linea)
+            self._rx_linea.clear()
+            if b'$' in linea:
+                self._comando_enlace(linea)
+                return False, None
+            self.comandos_recibidos += 1
+            if self.registrar:
+                self.registro_rx.append((linea, time.perf_counter()))
+            datos = [_atof(tok) for tok in linea.split(b',') if tok][:10]
+            n = len(datos)
+            nan = float('nan')
+            d = {'Tss': nan, 'Mp': nan, 'pid': (nan,) * 4, 'pwm': nan,
+                 'toggle': self.controlActivo}
+            valido = False
+            if n >= 2:
+                if not math.isnan(datos[0]) and datos[0] >= 0:
+                    d['Tss'] = datos[0]; valido = True
+                if not math.isnan(datos[1]) and datos[1] >= 0:
+                    d['Mp'] = datos[1]; valido = True
+            if n >= 6 and not any(math.isnan(x) for x in datos[2:6]):
+                d['pid'] = tuple(datos[2:6]); valido = True
+            if n >= 7 and not math.isnan(datos[6]) and 1000 <= datos[6] <= 2000:
+                d['pwm'] = datos[6]; valido = True
+            if n >= 8:
+                d['toggle'] = datos[7] > 0.5
+            # en el sketch las variables no recibidas quedan sin inicializar;
+            # acá valen NaN (no se aplican) y el toggle conserva su valor
+            return valido, d
+        return False, None
+
+    def _comando_enlace(self, linea):
+        """procesarComandoEnlace(): $BAUD,<b> y $PING."""
+        cmd = linea[linea.index(b'$'):]
+        if cmd.startswith(b'$BAUD,'):
+            nuevo = int(_atof(cmd[6:]))
+            if nuevo not in self.BAUDIOS_PERMITIDOS and nuevo != self.baud_inicial:
+                self._serial_write(f"$ERR,{nuevo}\r\n".encode())
+                return
+            self._serial_write(f"$OK,{nuevo}\r\n".encode())
+            self._serial_flush()
+            anterior = self.baud
+            self._cambiar_baud(nuevo)
+            if self._esperar_ping(nuevo):
+                self.tramas_antes_de_negociar = self.tramas_enviadas
+            else:
+                self._cambiar_baud(anterior)
+        elif cmd.startswith(b'$PING'):
+            self._serial_write(f"$PONG,{self.baud}\r\n".encode())
+
+    def _cambiar_baud(self, baud):
+        """Serial.end() + Serial.begin(baud): se descarta lo recibido."""
+        self.baud = baud
+        self._t_byte = 10.0 / baud
+        self._rx_avr.clear()
+        self._rx_cable.clear()
+        self._rx_linea.clear()
+        self._t_rx_prev = None
+
+    def _esperar_ping(self, baud) -> bool:
+        t0 = time.perf_counter()
+        linea = bytearray()
+        legible = self.baud_max_cable is None or baud <= self.baud_max_cable
+        try:
+            while self._vivo and time.perf_counter() - t0 < self.TIMEOUT_PING:
+                self._recibir()
+                if not self._rx_avr:
+                    time.sleep(0.001)
+                    continue
+                c = self._rx_avr[0]
+                del self._rx_avr[:1]
+                if c == 0x0D:
+                    continue
+                if c != 0x0A:
+                    if len(linea) < 23:
+                        linea.append(c)
+                    continue
+                if legible and b'$PING' in linea:
+                    self._serial_write(f"$PONG,{baud}\r\n".encode())
+                    self._serial_flush()
+                    return True
+                linea.clear()
+            return False
+        finally:
+            self._t_cuerpo += time.perf_counter() - t0
+
+    def _recibir(self):
+        if self._master is None:
+            return
+        while select.select([self._master], [], [], 0)[0]:
+            try:
+                datos = os.read(self._master, 4096)
+            except OSError:
+                return
+            if not datos:
+                return
+            self._rx_cable.extend(datos)
+
+        if not self.tiempo_real:
+            self._rx_avr.extend(self._rx_cable)
+            self._rx_cable.clear()
+            return
+
+        # al ritmo del baud rate y con el búfer de 64 bytes del AVR
+        ahora = time.perf_counter()
+        if self._t_rx_prev is None or not self._rx_cable:
+            self._t_rx_prev = ahora
+        n = int((ahora - self._t_rx_prev) / self._t_byte)
+        if n <= 0:
+            return
+        self._t_rx_prev += n * self._t_byte
+        llegan = self._rx_cable[:n]
+        del self._rx_cable[:n]
+        libre = self.RX_BUFFER_AVR - len(self._rx_avr)
+        if len(llegan) > libre:
+            self.bytes_rx_perdidos += len(llegan) - libre
+            llegan = llegan[:libre]
+        self._rx_avr.extend(llegan)
+
+    def _enviar_datos_a_la_pc(self, ang_deg, err_deg, pwm):
+        ms = int(round((self.t_sim + self._t_cuerpo) * 1000.0))   # después de la rampa
+        if self.formato == 'binario':
+            trama = empaquetar_trama_binaria(self._seq, ang_deg, err_deg, pwm,
+                                             ms if self.con_tiempo else None)
+            self._seq = (self._seq + 1) & 0xFF
+        elif self.con_tiempo:
+            trama = f"#{ang_deg:.4f},{err_deg:.4f},{pwm:.4f},{ms}\r\n".encode()
+        else:
+            trama = f"#{ang_deg:.4f},{err_deg:.4f},{pwm:.4f}\r\n".encode()
+        if self.registrar:
+            self.registro_tx.append((self.tramas_enviadas, time.perf_counter()))
+        self._serial_write(trama)
+        self.tramas_enviadas += 1
+
+    def _serial_write(self, datos: bytes):
+        if not self.tiempo_real:
+            try:
+                os.write(self._master, datos)
+            except OSError:
+                pass
+            return
+
+        # Serial.write bloquea mientras el búfer TX de 64 bytes está lleno
+        with self._tx_cond:
+            for i in range(len(datos)):
+                while self._vivo and len(self._tx_cola) >= self.TX_BUFFER_AVR:
+                    t0 = time.perf_counter()
+                    self._tx_cond.wait(0.05)
+                    self._t_cuerpo += time.perf_counter() - t0
+                self._tx_cola.append(datos[i])
+            self._tx_cond.notify_all()
+
+    def _serial_flush(self):
+        """Serial.flush(): espera a que salga todo el búfer TX."""
+        if not self.tiempo_real:
+            return
+        with self._tx_cond:
+            while self._vivo and self._tx_cola:
+                self._tx_cond.wait(0.05)
+
+    def _pacer_tx(self):
+        """Saca los bytes del búfer TX al ritmo del baud rate."""
+        t_prox = time.perf_counter()
+        while self._vivo:
+            with self._tx_cond:
+                while self._vivo and not self._tx_cola:
+                    self._tx_cond.wait(0.05)
+                    t_prox = time.perf_counter()
+                if not self._vivo:
+                    return
+                # de a ~1 ms de bytes por vez
+                k = max(1, int(1e-3 / self._t_byte))
+                trozo = bytes(self._tx_cola[:k])
+                del self._tx_cola[:k]
+                self._tx_cond.notify_all()
+            try:
+                os.write(self._master, trozo)
+            except OSError:
+                return
+            t_prox += len(trozo) * self._t_byte
+            espera = t_prox - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+
+
+def _atof(tok: bytes) -> float:
+    """atof() de avr-libc: toma el prefijo numérico y si no hay nada, 0."""
+    tok = tok.strip()
+    for fin in range(len(tok), 0, -1):
+        try:
+            return float(tok[:fin])
+        except ValueError:
+            continue
+    return 0.0
+
+
+# ===================================================================
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Emulador de Principal.ino en un pty")
+    ap.add_argument("--baud", type=int, default=9600)
+    ap.add_argument("--sin-limite", action="store_true",
+                    help="sin esperas ni límite de baud (unthrottled)")
+    ap.add_argument("--binario", action="store_true", help="trama binaria")
+    ap.add_argument("--con-tiempo", action="store_true", help="agrega millis()")
+    ap.add_argument("--esc-sin-calibrar", action="store_true")
+    args = ap.parse_args()
+
+    emu = EmuladorArduino(baud=args.baud, tiempo_real=not args.sin_limite,
+                          formato='binario' if args.binario else 'texto',
+                          con_tiempo=args.con_tiempo,
+                          esc_calibrado=not args.esc_sin_calibrar).start()
+    print(f"[EMU] Arduino emulado en {emu.puerto}  (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(1.0)
+            print(f"[EMU] θ={math.degrees(emu.theta):7.2f}°  "
+                  f"tramas={emu.tramas_enviadas}  comandos={emu.comandos_recibidos}",
+                  file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emu.stop()
@@ -0,0 +1,219 @@
+# grabador.py  – sesiones en archivos columnares mapeados en memoria
+# --------------------------------------------------------------------
+# Una sesión es una carpeta:
+#   sesion.json   → columnas (nombre, dtype), metadatos, cerrada sí/no
+#   <col>.bin     → una columna cruda (t, angle, error, pwm_hw, …)
+#   filas.i8      → nº de filas válidas (int64), se escribe DESPUÉS
+#                   de los datos
+# Los .bin se preasignan y crecen de a `filas_por_bloque` filas.  Si el
+# proceso muere, lo escrito ya está en el page cache del sistema y
+# `filas.i8` nunca cuenta filas a medio escribir.
+#
+#   g = GrabadorSesion("sesiones/prueba"); g.agregar(bloque); g.cerrar()
+#   s = LectorSesion("sesiones/prueba")    # aunque se esté grabando
+#   s.actualizar(); s["angle"]             # np.memmap, sin copiar
+# --------------------------------------------------------------------
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from buffer_utils import TELEMETRIA_DTYPE
+
+
+VERSION_SESION = 1
+ARCHIVO_META = "sesion.json"
+ARCHIVO_FILAS = "filas.i8"
+
+
+def _agrandar_archivo(ruta, nbytes):
+    fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, nbytes)
+    finally:
+        os.close(fd)
+
+
+def _escribir_meta(ruta, meta):
+    tmp = os.path.join(ruta, ARCHIVO_META + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(ruta, ARCHIVO_META))
+
+
+class GrabadorSesion:
+    """
+    Escritor de una sesión (un solo hilo escritor; `agregar` y `cerrar`
+    están protegidos por un lock para poder cerrar desde otro hilo).
+
+    • agregar(bloque) copia las filas a los .bin mapeados y recién
+      después actualiza filas.i8.
+    • Cada `intervalo_flush` segundos se hace msync (protege también
+      ante un corte de luz, no sólo ante un crash del proceso).
+    • Al cerrar, los .bin se recortan a las filas efectivas.
+    En Windows no se puede agrandar un archivo mapeado por otro proceso:
+    con lectores abiertos conviene un `filas_por_bloque` generoso.
+    """
+
+    def __init__(self, ruta, dtype=TELEMETRIA_DTYPE, filas_por_bloque=65536,
+                 meta=None, intervalo_flush=1.0):
+        os.makedirs(ruta)                        # nunca pisa una sesión
+        self.ruta = ruta
+        self.dtype = np.dtype(dtype)
+        self.filas_por_bloque = int(filas_por_bloque)
+        self.intervalo_flush = intervalo_flush
+        self.n = 0
+        self.capacidad = 0
+        self._cols = {}
+        self._lock = threading.Lock()
+        self._cerrado = False
+        self._t_flush = time.monotonic()
+
+        self._meta = {
+            "version": VERSION_SESION,
+            "columnas": [[c, self.dtype[c].str] for c in self.dtype.names],
+            "creada": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "cerrada": False,
+            **(meta or {}),
+        }
+        _escribir_meta(ruta, self._meta)
+
+        ruta_filas = os.path.join(ruta, ARCHIVO_FILAS)
+        _agrandar_archivo(ruta_filas, 8)
+        self._filas = np.memmap(ruta_filas, dtype='<i8', mode='r+', shape=(1,))
+        self._crecer(self.filas_por_bloque)
+
+    def _archivo(self, nombre):
+        return os.path.join(self.ruta, f"{nombre}.bin")
+
+    def _crecer(self, minimo):
+        bloques = -(-minimo // self.filas_por_bloque)
+        nueva = max(bloques * self.filas_por_bloque,
+                    self.capacidad + self.filas_por_bloque)
+        for nombre in self.dtype.names:
+            viejo = self._cols.pop(nombre, None)
+            if viejo is not None:
+                viejo.flush()
+                del viejo
+            dt = self.dtype[nombre]
+            _agrandar_archivo(self._archivo(nombre), nueva * dt.itemsize)
+            self._cols[nombre] = np.memmap(self._archivo(nombre), dtype=dt,
+                                           mode='r+', shape=(nueva,))
+        self.capacidad = nueva
+
+    def __len__(self):
+        return self.n
+
+    def agregar(self, bloque) -> int:
+        """Agrega las filas de `bloque` (array estructurado con estas columnas)."""
+        k = len(bloque)
+        with self._lock:
+            if self._cerrado or k == 0:
+                return 0
+            n = self.n
+            if n + k > self.capacidad:
+                self._crecer(n + k)
+            for nombre, col in self._cols.items():
+                col[n:n + k] = bloque[nombre]
+            self.n = n + k
+            self._filas[0] = self.n              # recién ahora "existen"
+            if time.monotonic() - self._t_flush > self.intervalo_flush:
+                self._flush()
+        return k
+
+    def _flush(self):
+        for col in self._cols.values():
+            col.flush()
+        self._filas.flush()
+        self._t_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if not self._cerrado:
+                self._flush()
+
+    def cerrar(self):
+        with self._lock:
+            if self._cerrado:
+                return
+            self._cerrado = True
+            self._flush()
+            for nombre in list(self._cols):
+                del self._cols[nombre]
+                _agrandar_archivo(self._archivo(nombre),
+                                  self.n * self.dtype[nombre].itemsize)
+            self._meta.update(cerrada=True, filas=self.n)
+            _escribir_meta(self.ruta, self._meta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class LectorSesion:
+    """
+    Lector de una sesión, cerrada o todavía en grabación.
+
+    • s["angle"] → np.memmap de sólo lectura con las filas válidas
+      (sin copiar).  s.datos() → {columna: memmap}.
+    • actualizar() relee cuántas filas hay y vuelve a mapear si el
+      escritor agrandó los archivos.  Devuelve el nº de filas.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(os.path.join(ruta, ARCHIVO_META), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != VERSION_SESION:
+            raise ValueError(f"Versión de sesión no soportada: {self.meta.get('version')}")
+        self.dtype = np.dtype([(c, d) for c, d in self.meta["columnas"]])
+        self._filas = np.memmap(os.path.join(ruta, ARCHIVO_FILAS),
+                                dtype='<i8', mode='r', shape=(1,))
+        self._cols = {}
+        self._mapeadas = 0
+        self.n = 0
+        self.actualizar()
+
+    def actualizar(self) -> int:
+        n = int(self._filas[0])
+        if n > self._mapeadas:
+            self._mapear()
+        self.n = min(n, self._mapeadas)
+        return self.n
+
+    def _mapear(self):
+        cols, filas = {}, None
+        for nombre in self.dtype.names:
+            dt = self.dtype[nombre]
+            ruta = os.path.join(self.ruta, f"{nombre}.bin")
+            k = os.path.getsize(ruta) // dt.itemsize
+            filas = k if filas is None else min(filas, k)
+            cols[nombre] = (ruta, dt, k)
+        if not filas:
+            return
+        self._cols = {nombre: np.memmap(ruta, dtype=dt, mode='r', shape=(k,))
+                      for nombre, (ruta, dt, k) in cols.items()}
+        self._mapeadas = filas
+
+    @property
+    def cerrada(self):
+        with open(os.path.join(self.ruta, ARCHIVO_META), encoding='utf-8') as f:
+            return json.load(f).get("cerrada", False)
+
+    def __len__(self):
+        return self.n
+
+    def columnas(self):
+        return list(self.dtype.names)
+
+    def __getitem__(self, nombre):
+        if not self.n:
+            return np.empty(0, dtype=self.dtype[nombre])
+        return self._cols[nombre][:self.n]
+
+    def datos(self) -> dict:
+        return {nombre: self[nombre] for nombre in self.dtype.names}
@@ -0,0 +1,250 @@
+# identificacion.py  – identificación en línea de la planta (RLS)
+# --------------------------------------------------------------------
+# Las constantes de ControlSystem salen de sketches sueltos
+# (ObtenerModeloMotor, ObtenerModeloSensor).  Acá se reestiman con la
+# telemetría, muestra a muestra, con mínimos cuadrados recursivos con
+# factor de olvido.  El modelo es lineal en los parámetros:
+#     θ'' = A·m·PWM + A·r + (C/I)·cos θ          (A = Lm/I)
+#     y = θ''    φ = [PWM/1000, 1, cos θ]    w = [1000·A·m, A·r, C/I]
+# Con θ y PWM solos se identifican A·m, A·r y C/I, pero no A por
+# separado: A queda en el valor configurado (Lm, I de la geometría) y
+# de w salen m, r y C.  B(θ_eq) = (C/I)·sin θ_eq.
+#
+# Por muestra (O(1), compilado con numba si está):
+#   • θ'' por diferencia segunda dividida (intervalos h_b, h_f
+#     desiguales), centrada en k-1, y el PWM promediado con el mismo
+#     núcleo triangular: es el modelo muestreado exacto para PWM por
+#     tramos, sin sesgo de ZOH ni de derivada
+#   • el PWM de cada tramo no es un escalón: escribirVelocidadEnESC
+#     sube/baja 1 µs por ms (`rampa`) y bloquea, así que además alarga
+#     el loop; h = max(Ts − t_proc, |ΔPWM|·rampa + t_proc), con Ts el de
+#     ControlSystem (T del sketch)
+#   • con millis() en la trama (t_mcu) los instantes salen de ahí
+#     (menos la rampa: millis() se lee después); la hora de llegada a
+#     la PC no sirve, su jitter es del orden de h
+#   • y y φ pasan por el mismo pasabajos de 2º orden (no cambia la
+#     relación lineal y baja el ruido de la derivada segunda)
+#   • sólo se usan tramos con empuje (PWM > pwm_min) y lejos de los
+#     topes; una trama perdida (salto de seq) reinicia la historia
+#   • RLS con olvido λ; si traza(P) supera `traza_max` (poca
+#     excitación) se deja de olvidar para que P no explote
+# La confianza es el desvío estándar de cada estimación, σ_e·√P_ii,
+# con σ_e² = media móvil del residuo².  Con ruido de ángulo grande
+# (≳ 0.1°) la derivada segunda también ensucia cos θ y las estimaciones
+# se sesgan; sugerencia() sólo propone cambios que superen n_sigma·σ.
+#
+#   ident = IdentificadorRLS(ctrl)
+#   ident.agregar(vista['angle'], vista['pwm_hw'], vista['seq'], vista['t_mcu'])
+#   ident.estimaciones()           # {"m": (valor, σ), "r": …, "C": …, …}
+#   ident.sugerencia(ctrl)         # {"m": …} si se apartó de lo configurado
+#   ctrl.set_parametros_fisicos(**ident.sugerencia(ctrl))
+# --------------------------------------------------------------------
+import math
+
+import numpy as np
+
+from pidf import HAY_NUMBA, njit
+
+# índices del vector de estado
+_W = 0                      # w[0:3]
+_P = 3                      # P[3:12], 3×3 por filas
+_F1 = 12                    # pasabajos, 1ª etapa: y, φ0, φ1, φ2
+_F2 = 16                    # 2ª etapa
+_TH1, _TH2 = 20, 21         # θ[k-1], θ[k-2]
+_U1, _U2, _U3 = 22, 23, 24  # µs enteros escritos al ESC en k-1, k-2, k-3
+_S1, _S2 = 25, 26           # instantes de muestreo de k-1, k-2 [s]
+_SEQ = 27                   # última seq
+_HIST = 28                  # muestras de historia seguidas (0 … 3)
+_CAL = 29                   # muestras válidas seguidas en el pasabajos
+_E2 = 30                    # media móvil del residuo²
+_N = 31                     # actualizaciones del RLS
+_LARGO = 32
+
+
+@njit(cache=True)
+def _pasos(x, ang_deg, pwm, seq, t, Ts, rampa, t_proc, lam, alfa, traza_max,
+           pwm_min, lim_rad, calentamiento):
+    for k in range(len(ang_deg)):
+        th = math.radians(ang_deg[k])
+        u = math.floor(pwm[k])                     # el ESC recibe un int
+        if seq[k] - x[_SEQ] != 1.0:                # trama perdida
+            x[_HIST] = 0.0
+            x[_CAL] = 0.0
+        x[_SEQ] = seq[k]
+
+        # instante de muestreo: millis() de la trama se toma después de la
+        # rampa del ESC; sin millis(), el período del sketch
+        tau = abs(u - x[_U1]) * rampa if x[_HIST] >= 1.0 else 0.0
+        if not math.isnan(t[k]):
+            s = t[k] - tau
+        elif x[_HIST] >= 2.0:
+            s = x[_S1] + max(Ts - t_proc, abs(x[_U1] - x[_U2]) * rampa + t_proc)
+        else:
+            s = x[_S1] + Ts
+
+        if x[_HIST] >= 3.0:
+            th1 = x[_TH1]
+            th2 = x[_TH2]
+            hb = x[_S1] - x[_S2]
+            hf = s - x[_S1]
+            valida = (x[_U1] > pwm_min and x[_U2] > pwm_min and x[_U3] > pwm_min
+                      and hb > 0.0 and hf > 0.0 and abs(th) < lim_rad
+                      and abs(th1) < lim_rad and abs(th2) < lim_rad)
+            if valida:
+                # diferencia segunda dividida, centrada en k-1, y el PWM
+                # promediado con el mismo núcleo triangular (rampas incluidas)
+                d = 0.5 * hb * hf * (hb + hf)
+                y = (hb * (th - th1) + hf * (th2 - th1)) / d
+                df = x[_U1] - x[_U2]
+                tf = min(abs(df) * rampa, hf)
+                db = x[_U2] - x[_U3]
+                tb = min(abs(db) * rampa, hb)
+                fwd = x[_U1] * hf * hf / 2.0 - df * (hf * tf / 2.0 - tf * tf / 6.0)
+                bwd = x[_U2] * hb * hb / 2.0 - db * tb * tb / 6.0
+                f0 = 0.001 * (hb * fwd + hf * bwd) / d
+                f2 = math.cos(th1)
+                if x[_CAL] == 0.0:
+                    x[_F1] = y
+                    x[_F1 + 1] = f0
+                    x[_F1 + 2] = 1.0
+                    x[_F1 + 3] = f2
+                    for i in range(4):
+                        x[_F2 + i] = x[_F1 + i]
+                else:
+                    x[_F1] += alfa * (y - x[_F1])
+                    x[_F1 + 1] += alfa * (f0 - x[_F1 + 1])
+                    x[_F1 + 2] += alfa * (1.0 - x[_F1 + 2])
+                    x[_F1 + 3] += alfa * (f2 - x[_F1 + 3])
+                    for i in range(4):
+                        x[_F2 + i] += alfa * (x[_F1 + i] - x[_F2 + i])
+                x[_CAL] += 1.0
+
+                if x[_CAL] > calentamiento:
+                    yf = x[_F2]
+                    p0 = x[_F2 + 1]
+                    p1 = x[_F2 + 2]
+                    p2 = x[_F2 + 3]
+                    # g = P·φ
+                    g0 = x[_P] * p0 + x[_P + 1] * p1 + x[_P + 2] * p2
+                    g1 = x[_P + 3] * p0 + x[_P + 4] * p1 + x[_P + 5] * p2
+                    g2 = x[_P + 6] * p0 + x[_P + 7] * p1 + x[_P + 8] * p2
+                    traza = x[_P] + x[_P + 4] + x[_P + 8]
+                    l = lam if traza < traza_max else 1.0
+                    den = l + p0 * g0 + p1 * g1 + p2 * g2
+                    e = yf - (x[_W] * p0 + x[_W + 1] * p1 + x[_W + 2] * p2)
+                    x[_W] += g0 / den * e
+                    x[_W + 1] += g1 / den * e
+                    x[_W + 2] += g2 / den * e
+                    # P ← (P − g·gᵀ/den) / λ   (simétrica: sólo el triángulo superior)
+                    x[_P] = (x[_P] - g0 * g0 / den) / l
+                    x[_P + 1] = (x[_P + 1] - g0 * g1 / den) / l
+                    x[_P + 2] = (x[_P + 2] - g0 * g2 / den) / l
+                    x[_P + 4] = (x[_P + 4] - g1 * g1 / den) / l
+                    x[_P + 5] = (x[_P + 5] - g1 * g2 / den) / l
+                    x[_P + 8] = (x[_P + 8] - g2 * g2 / den) / l
+                    x[_P + 3] = x[_P + 1]
+                    x[_P + 6] = x[_P + 2]
+                    x[_P + 7] = x[_P + 5]
+                    x[_E2] += (1.0 - lam) * (e * e - x[_E2])
+                    x[_N] += 1.0
+            else:
+                x[_CAL] = 0.0
+
+        x[_TH2] = x[_TH1]
+        x[_TH1] = th
+        x[_U3] = x[_U2]
+        x[_U2] = x[_U1]
+        x[_U1] = u
+        x[_S2] = x[_S1]
+        x[_S1] = s
+        x[_HIST] = min(x[_HIST] + 1.0, 3.0)
+
+
+class IdentificadorRLS:
+    """
+    Estimación en línea de m, r y C (A = Lm/I fijo) desde la telemetría.
+
+    • agregar(ang_deg, pwm_hw, seq, t_mcu=None): bloques del búfer, en
+      orden; t_mcu [s] (NaN o None → período del sketch).
+    • estimaciones() → {"m", "r", "C", "C_I", "A", "B"}: (valor, σ).
+    • deriva(sistema) → {"m", "r", "C"}: (estimado − configurado) / |configurado|.
+    • sugerencia(sistema, umbral, n_sigma) → los parámetros que se
+      apartan más de `umbral` (relativo) y más de n_sigma·σ de lo
+      configurado; {} si no hay datos suficientes o nada cambió.
+    • reiniciar(sistema): vuelve a arrancar desde los valores de sistema.
+    """
+
+    def __init__(self, sistema, Ts=None, rampa=1e-3, t_proc=1e-3, lam=0.998,
+                 fc=2.0, traza_max=1e4, pwm_min=1100.0, lim_deg=48.0, p0=100.0,
+                 min_muestras=500):
+        self.Ts = float(sistema.Ts if Ts is None else Ts)
+        self.rampa = float(rampa)
+        self.t_proc = float(t_proc)
+        self.lam = float(lam)
+        self.alfa = 1.0 - math.exp(-2.0 * math.pi * fc * self.Ts)
+        self.traza_max = float(traza_max)
+        self.pwm_min = float(pwm_min)
+        self.lim_rad = math.radians(lim_deg)
+        self.calentamiento = float(math.ceil(3.0 / self.alfa))   # 2º orden: ~3 τ
+        self.p0 = float(p0)
+        self.min_muestras = int(min_muestras)
+        self.reiniciar(sistema)
+
+    def reiniciar(self, sistema):
+        """Arranca desde los parámetros configurados en `sistema`."""
+        self.A = sistema.Lm / sistema.I
+        self.I = sistema.I
+        x = np.zeros(_LARGO)
+        x[_W:_W + 3] = (1000.0 * self.A * sistema.m, self.A * sistema.r,
+                        sistema.C / sistema.I)
+        x[_P:_P + 9] = (np.eye(3) * self.p0).ravel()
+        x[_SEQ] = -2.0                                 # fuerza "trama perdida"
+        self._x = x if HAY_NUMBA else x.tolist()
+
+    @property
+    def muestras(self):
+        """Actualizaciones del RLS (muestras válidas usadas)."""
+        return int(self._x[_N])
+
+    def agregar(self, ang_deg, pwm, seq, t_mcu=None):
+        t = (np.full(len(seq), np.nan) if t_mcu is None
+             else np.asarray(t_mcu, dtype=float))
+        args = (self.Ts, self.rampa, self.t_proc, self.lam, self.alfa,
+                self.traza_max, self.pwm_min, self.lim_rad, self.calentamiento)
+        if HAY_NUMBA:
+            _pasos(self._x, np.asarray(ang_deg, dtype=float),
+                   np.asarray(pwm, dtype=float), np.asarray(seq, dtype=float),
+                   t, *args)
+        else:
+            # sin numba, escalares de Python (listas) es lo más barato
+            _pasos(self._x, np.asarray(ang_deg, dtype=float).tolist(),
+                   np.asarray(pwm, dtype=float).tolist(),
+                   np.asarray(seq, dtype=float).tolist(), t.tolist(), *args)
+
+    def estimaciones(self, theta_eq_rad=0.0) -> dict:
+        x = self._x
+        w = [x[_W], x[_W + 1], x[_W + 2]]
+        s = math.sqrt(max(x[_E2], 0.0))
+        sw = [s * math.sqrt(max(x[_P + 4 * i], 0.0)) for i in range(3)]
+        seno = math.sin(theta_eq_rad)
+        return {
+            "m": (w[0] / (1000.0 * self.A), sw[0] / (1000.0 * self.A)),
+            "r": (w[1] / self.A, sw[1] / self.A),
+            "C": (w[2] * self.I, sw[2] * self.I),
+            "C_I": (w[2], sw[2]),
+            "A": (self.A, 0.0),
+            "B": (w[2] * seno, sw[2] * abs(seno)),
+        }
+
+    def deriva(self, sistema) -> dict:
+        est = self.estimaciones()
+        return {p: (est[p][0] - getattr(sistema, p)) / abs(getattr(sistema, p))
+                for p in ("m", "r", "C")}
+
+    def sugerencia(self, sistema, umbral=0.05, n_sigma=3.0) -> dict:
+        if self.muestras < self.min_muestras:
+            return {}
+        est = self.estimaciones()
+        return {p: est[p][0] for p, d in self.deriva(sistema).items()
+                if abs(d) > umbral
+                and abs(est[p][0] - getattr(sistema, p)) > n_sigma * est[p][1]}
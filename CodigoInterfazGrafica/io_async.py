@@ -0,0 +1,357 @@
+# io_async.py  – backend asyncio para SerialComm
+# --------------------------------------------------------------------
+# Misma API que io_utils.SerialComm (start, stop, send_command,
+# send_pidf_data, queue, rx_buffer, set_control_en_lazo, …) pero sin
+# hilos por puerto: un único event loop atiende varios bancos, el
+# servidor de telemetría y los grabadores.
+#   • POSIX   → loop.add_reader / add_writer sobre el fd del puerto
+#               (lecturas y escrituras no bloqueantes)
+#   • Windows → el ProactorEventLoop no tiene add_reader: se sondea
+#               in_waiting cada `periodo_sondeo` segundos
+#
+#   comms = [SerialCommAsync(port=p) for p in ("/dev/ttyUSB0", "/dev/ttyUSB1")]
+#   for c in comms: c.start()          # todos en el mismo loop
+# --------------------------------------------------------------------
+import os
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+import serial
+
+from io_utils import SerialComm, _ColaTX
+
+
+_bucle = None
+_bucle_lock = threading.Lock()
+
+
+def bucle_compartido():
+    """Event loop común a todos los SerialCommAsync, en un hilo daemon."""
+    global _bucle
+    with _bucle_lock:
+        if _bucle is None:
+            _bucle = asyncio.new_event_loop()
+            threading.Thread(target=_bucle.run_forever, daemon=True,
+                             name="SerialComm-asyncio").start()
+        return _bucle
+
+
+# ════════════════════════════════════════════════════════════════════
+# 1)  ESCRITOR TX sobre el event loop
+# ════════════════════════════════════════════════════════════════════
+class _EscritorAsync(_ColaTX):
+    """
+    Igual que _EscritorTX (misma cola, fusión de PWM y estadísticas)
+    pero escribe desde el event loop: os.write no bloqueante y, si el
+    driver no acepta todo, espera con add_writer a que el fd se libere.
+    Escrito un comando, no toma el siguiente hasta que salió del cable
+    (call_later, sin trabar el loop con tcdrain; si el driver informa
+    out_waiting, además espera a que se vacíe): mientras, las consignas
+    se fusionan.  `encolar` se puede llamar desde cualquier hilo; cada
+    llamada agenda un _escribir_pendientes en el loop (sin banderas
+    compartidas entre hilos) y los que sobran vuelven enseguida.
+    """
+
+    def __init__(self, bucle, fd=None, ser=None, umbral_bloqueo=0.02, baud=None):
+        super().__init__(umbral_bloqueo, baud)
+        self._bucle = bucle
+        self._fd = fd                      # None → se escribe con ser.write
+        self._ser = ser
+        self._actual = None                # [resto, datos, t0, t_origen]
+        self._esperando_fd = False
+        self._en_cable = None              # (datos, t0, t1, t_origen) saliendo
+        self._drenado = None               # asyncio.Future al detener
+        self._cerrado = False
+
+    def _despertar(self):
+        self._bucle.call_soon_threadsafe(self._escribir_pendientes)
+
+    def _escribir_pendientes(self):
+        if self._esperando_fd or self._en_cable is not None or self._cerrado:
+            return                         # sigue _fd_listo / _cable_libre
+        while True:
+            if self._actual is None:
+                with self._cond:
+                    if not self._cola:
+                        break
+                    datos, _, t_origen = self._cola.popleft()
+                self._actual = [memoryview(datos), datos,
+                                time.perf_counter(), t_origen]
+
+            resto = self._actual[0]
+            try:
+                if self._fd is not None:
+                    n = os.write(self._fd, resto)
+                else:
+                    n = self._ser.write(bytes(resto))
+            except BlockingIOError:
+                n = 0
+            except serial.SerialTimeoutException:
+                self.bloqueos_escritura += 1
+                self._actual = None
+                continue
+            except Exception as e:
+                self.errores += 1
+                print(f"[SERIAL] Error TX: {e}")
+                self._actual = None
+                continue
+
+            if n < len(resto):
+                # búfer del driver lleno: se sigue cuando el fd esté listo
+                self._actual[0] = resto[n:]
+                if self._fd is None:
+                    self._bucle.call_later(0.001, self._despertar)
+                else:
+                    self._esperando_fd = True
+                    self._bucle.add_writer(self._fd, self._fd_listo)
+                return
+
+            _, datos, t0, t_origen = self._actual
+            self._actual = None
+            t1 = time.perf_counter()
+            self._en_cable = (datos, t0, t1, t_origen)
+            espera = self._fin_en_cable(len(datos), t0) - t1
+            self._bucle.call_later(max(espera, 0.0), self._cable_libre)
+            return
+
+        if self._drenado is not None and not self._drenado.done():
+            self._drenado.set_result(None)
+
+    def _cable_libre(self):
+        try:
+            resto = self._ser.out_waiting if self._ser is not None else 0
+        except Exception:                  # sin soporte o puerto cerrado
+            resto = 0
+        if resto and not self._cerrado:
+            self._bucle.call_later(max(resto * self.s_por_byte, 0.001),
+                                   self._cable_libre)
+            return
+        datos, t0, t1, t_origen = self._en_cable
+        self._en_cable = None
+        self._registrar_escritura(datos, t0, t1, t_origen, time.perf_counter())
+        self._escribir_pendientes()
+
+    def _fd_listo(self):
+        self._bucle.remove_writer(self._fd)
+        self._esperando_fd = False
+        self._escribir_pendientes()
+
+    def pendientes(self):
+        return (len(self._cola) + (self._actual is not None)
+                + (self._en_cable is not None))
+
+    async def detener(self, timeout=0.5):
+        """Intenta vaciar la cola (hasta `timeout` s) y deja de escribir."""
+        self._vivo = False
+        if self.pendientes():
+            self._drenado = self._bucle.create_future()
+            self._despertar()
+            try:
+                await asyncio.wait_for(self._drenado, timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self._esperando_fd:
+            self._bucle.remove_writer(self._fd)
+            self._esperando_fd = False
+        self._cerrado = True
+
+
+# ════════════════════════════════════════════════════════════════════
+# 2)  SerialCommAsync
+# ════════════════════════════════════════════════════════════════════
+class SerialCommAsync(SerialComm):
+    """
+    SerialComm sobre asyncio.  Reutiliza los mismos protocolos
+    (_LineProtocol / _BinaryProtocol), el búfer circular, las
+    estadísticas y el PIDf por evento; sólo cambia quién lee y escribe.
+
+    • `bucle`: event loop a usar (por defecto bucle_compartido()).  Si la
+      aplicación ya tiene su propio loop corriendo se pasa acá y todo
+      (lectura, PIDf por evento, escritura) corre en él.
+    • start()/stop() se pueden llamar desde cualquier hilo, incluido el
+      del loop.
+    • El protocolo usa esta instancia como transporte (`write`).
+    • negociar: la prueba $PING corre en el ejecutor del loop (no lo
+      traba) y el puerto se registra cuando termina.
+    """
+
+    def __init__(self, *args, bucle=None, periodo_sondeo=0.002, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bucle = bucle or bucle_compartido()
+        self.periodo_sondeo = periodo_sondeo      # sólo sin add_reader
+        self._ser = None
+        self._fd = None
+        self._tarea = None                        # sondeo o simulación
+
+    # ---------------  control --------------------------------------
+    def start(self):
+        if self.running:
+            print("[WARN] SerialComm ya fue iniciado.")
+            return
+
+        self.running = True
+        self._conectado.clear()
+        self._reiniciar_fotos()
+
+        if self.simulate:
+            self._en_bucle(self._iniciar_simulacion)
+            return
+
+        # →  puerto real (timeout=0 → lecturas no bloqueantes)
+        try:
+            self._ser = serial.Serial(self.port, self.baud, timeout=0,
+                                      write_timeout=0.2)
+        except Exception as e:
+            print(f"[SERIAL] Error abriendo {self.port}: {e}")
+            self.rx_queue.put(("ERROR", str(e)))
+            self.running = False
+            return
+        if self.negociar:
+            # la prueba $PING bloquea: corre en un ejecutor y el puerto se
+            # registra en el loop recién cuando termina
+            if self._en_hilo_del_bucle():
+                self.bucle.create_task(self._negociar_y_conectar())
+            else:
+                asyncio.run_coroutine_threadsafe(self._negociar_y_conectar(),
+                                                 self.bucle)
+            return
+        self._preparar()
+        self._en_bucle(self._conectar)
+
+    def _preparar(self):
+        try:
+            self._fd = self._ser.fileno()
+            os.set_blocking(self._fd, False)
+        except (AttributeError, OSError):
+            self._fd = None                       # Windows
+
+        self._protocol = self._crear_protocolo()
+        self._protocol.connection_made(self)
+        self._tx = _EscritorAsync(self.bucle, self._fd, self._ser,
+                                  baud=self.baud)
+
+    async def _negociar_y_conectar(self):
+        ser = self._ser
+        try:
+            await self.bucle.run_in_executor(None, self._negociar, ser)
+        except Exception:
+            if self.running and self._ser is ser:
+                raise
+        if not self.running or self._ser is not ser:      # stop() mientras tanto
+            return
+        self._preparar()
+        self._conectar()
+        self.rx_queue.put(("BAUD", self.baud))
+
+    def stop(self):
+        self.running = False
+        if self._en_hilo_del_bucle():
+            self.bucle.create_task(self._cerrar())
+            return
+        futuro = asyncio.run_coroutine_threadsafe(self._cerrar(), self.bucle)
+        try:
+            futuro.result(timeout=1.0)
+        except concurrent.futures.TimeoutError:
+            print(f"[SERIAL] {self.port}: cierre demorado")
+
+    def write(self, datos: bytes):
+        """Transporte para el protocolo (LineReader.write_line)."""
+        if self._tx is not None:
+            self._tx.encolar(bytes(datos))
+
+    # ---------------  dentro del event loop ------------------------
+    def _conectar(self):
+        try:
+            if self._fd is None:
+                raise NotImplementedError
+            self.bucle.add_reader(self._fd, self._leer_fd)
+        except NotImplementedError:
+            # sin add_reader (ProactorEventLoop) → sondeo
+            self._fd = self._tx._fd = None
+            self._tarea = self.bucle.create_task(self._sondear())
+        self._conectado.set()
+
+    def _leer_fd(self):
+        try:
+            datos = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._perder_conexion(e)
+            return
+        if not datos:
+            self._perder_conexion("el dispositivo devolvió 0 bytes")
+            return
+        self._entregar(datos)
+
+    async def _sondear(self):
+        while self.running:
+            try:
+                n = self._ser.in_waiting
+                datos = self._ser.read(n) if n else b''
+            except serial.SerialException as e:
+                self._perder_conexion(e)
+                return
+            if datos:
+                self._entregar(datos)
+            else:
+                await asyncio.sleep(self.periodo_sondeo)
+
+    def _entregar(self, datos):
+        try:
+            self._protocol.data_received(datos)
+        except Exception as e:
+            print(f"[SERIAL] {self.port}: error procesando datos: {e}")
+
+    def _perder_conexion(self, motivo):
+        print(f"[SERIAL] {self.port}: conexión perdida ({motivo})")
+        self.rx_queue.put(("ERROR", str(motivo)))
+        if self._fd is not None:
+            self.bucle.remove_reader(self._fd)
+        self.running = False
+
+    def _iniciar_simulacion(self):
+        self._tarea = self.bucle.create_task(self._simular())
+        self._conectado.set()
+
+    async def _simular(self):
+        for dt in self._fuente_simulada():
+            await asyncio.sleep(dt)
+
+    async def _cerrar(self):
+        if self._tx is not None:
+            await self._tx.detener()
+            self._tx = None
+        if self._fd is not None:
+            self.bucle.remove_reader(self._fd)
+            self._fd = None
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+        if self._ser is not None:
+            self._ser.close()
+            self._ser = None
+
+    # ---------------  utilidades -----------------------------------
+    def _en_hilo_del_bucle(self):
+        try:
+            return asyncio.get_running_loop() is self.bucle
+        except RuntimeError:
+            return False
+
+    def _en_bucle(self, funcion):
+        """Ejecuta `funcion` en el loop y espera a que termine."""
+        if self._en_hilo_del_bucle():
+            return funcion()
+        futuro = concurrent.futures.Future()
+
+        def envoltura():
+            try:
+                futuro.set_result(funcion())
+            except Exception as e:
+                futuro.set_exception(e)
+
+        self.bucle.call_soon_threadsafe(envoltura)
+        return futuro.result(timeout=1.0)
@@ -6,60 +6,689 @@ import serial
 import serial.threaded          # <— motor de hilos de pyserial
 import threading
 import queue
+import collections
+import os
 import json
 import time
+import struct
+import binascii
+import re
 import numpy as np
 
+from buffer_utils import RingBuffer, TELEMETRIA_DTYPE
+from grabador import GrabadorSesion, LectorSesion
+from pidf import ControladorPIDf
+
+
+# ════════════════════════════════════════════════════════════════════
+# 0)  TRAMA BINARIA ─────────── formato compacto opcional del sketch
+# ════════════════════════════════════════════════════════════════════
+#   AA 55 | seq:u8 | ang:i16 | err:i16 | pwm:i16 | crc16:u16   (11 bytes)
+#   AA 56 | seq:u8 | ang:i16 | err:i16 | pwm:i16 | ms:u16 | crc16  (13 b)
+#   • ang / err en centésimas de grado, pwm en décimas de µs
+#   • ms = millis() del Arduino módulo 65536 (variante con tiempo)
+#   • enteros little-endian (igual que el AVR)
+#   • CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) desde seq hasta el
+#     último campo
+SYNC_BINARIO   = b'\xAA\x55'
+SYNC_BINARIO_T = b'\xAA\x56'
+_CUERPO_BIN    = struct.Struct('<Bhhh')
+_CUERPO_BIN_T  = struct.Struct('<BhhhH')
+_CRC_BIN       = struct.Struct('<H')
+LARGO_BINARIO  = len(SYNC_BINARIO) + _CUERPO_BIN.size + _CRC_BIN.size
+LARGO_BINARIO_T = len(SYNC_BINARIO_T) + _CUERPO_BIN_T.size + _CRC_BIN.size
+ESCALA_ANG     = 100.0
+ESCALA_PWM     = 10.0
+
+# trama de texto típica de enviarDatosALaPC (Serial.print con 4 decimales)
+_TRAMA_TEXTO_TIPICA = b'#-45.1234,-60.1234,1523.4567\r\n'
+
+
+def crc16_ccitt(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE, el mismo que calcula el sketch."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def empaquetar_trama_binaria(seq, ang_deg, err_deg, pwm, t_ms=None) -> bytes:
+    """Arma una trama binaria (útil para pruebas y emuladores)."""
+    campos = (int(seq) & 0xFF,
+              int(round(ang_deg * ESCALA_ANG)),
+              int(round(err_deg * ESCALA_ANG)),
+              int(round(pwm * ESCALA_PWM)))
+    if t_ms is None:
+        sync, cuerpo = SYNC_BINARIO, _CUERPO_BIN.pack(*campos)
+    else:
+        sync, cuerpo = SYNC_BINARIO_T, _CUERPO_BIN_T.pack(*campos,
+                                                          int(t_ms) & 0xFFFF)
+    return sync + cuerpo + _CRC_BIN.pack(crc16_ccitt(cuerpo))
+
+
+def linea_pidf(Tss, Mp, kp, ki, kd, n, pwm, toggle) -> str:
+    """Línea "Tss,Mp,kp,ki,kd,n,pwm,toggle" que espera leerDatosDesdePC()."""
+    datos = [Tss, Mp, kp, ki, kd, n, pwm, 1 if toggle else 0]
+    return ",".join(
+        "nan" if (isinstance(x, float) and np.isnan(x)) else f"{x:.4f}"
+        if isinstance(x, (float, int)) else str(x)
+        for x in datos
+    )
+
+
+def presupuesto_enlace(baud=9600, frecuencia_hz=45.0) -> dict:
+    """
+    Compara el formato texto con el binario para un baud rate dado
+    (8N1 → 10 bits por byte).  Devuelve, por formato: bytes por trama,
+    bytes/s necesarios, tramas/s máximas y % de ocupación del enlace.
+
+    A 9600 baud y 45 Hz:
+        texto   : 30 B/trama → 1350 B/s, máx  32 tramas/s → 141 % (satura)
+        binario : 11 B/trama →  495 B/s, máx  87 tramas/s →  52 %
+    """
+    bytes_por_seg = baud / 10.0
+    res = {}
+    for nombre, largo in (("texto", len(_TRAMA_TEXTO_TIPICA)),
+                          ("binario", LARGO_BINARIO)):
+        res[nombre] = {
+            "bytes_trama":    largo,
+            "bytes_s":        largo * frecuencia_hz,
+            "tramas_s_max":   bytes_por_seg / largo,
+            "ocupacion_pct":  100.0 * largo * frecuencia_hz / bytes_por_seg,
+        }
+    return res
+
+
+# ─── negociación de baud rate (ver procesarComandoEnlace en el sketch) ──
+#   PC → "nan,nan,$BAUD,<b>"  ←  "$OK,<b>"   (a la velocidad vieja)
+#   ambos cambian a <b>
+#   PC → "nan,nan,$PING"      ←  "$PONG,<b>" (a la velocidad nueva)
+# Sin $PONG el sketch vuelve solo a la velocidad anterior a los 500 ms.
+# El prefijo "nan,nan" hace que un sketch viejo ignore los comandos.
+BAUDIOS_NEGOCIABLES = (1000000, 500000, 250000, 115200)
+_TIMEOUT_PING_SKETCH = 0.5       # [s] TIMEOUT_PING_MS del sketch
+
+
+def _esperar_linea(ser, prefijos=None, timeout=0.5):
+    """
+    Lee del puerto hasta una línea que contenga alguno de `prefijos`
+    (None = cualquiera) o hasta `timeout` [s].  Devuelve la línea sin
+    CR/LF (desde el prefijo) o None.  La telemetría que llega en el
+    medio se descarta.
+    """
+    fin = time.monotonic() + timeout
+    buf = bytearray()
+    while time.monotonic() < fin:
+        datos = ser.read(1)              # de a uno: lo que sigue a la
+        if not datos:                    # respuesta queda para el lector
+            time.sleep(0.001)            # puerto con timeout=0
+            continue
+        buf.extend(datos)
+        if datos == b'\n':
+            linea = bytes(buf).strip()
+            buf.clear()
+            if prefijos is None:
+                return linea
+            for prefijo in prefijos:
+                i = linea.find(prefijo)  # con telemetría binaria no hay
+                if i != -1:              # '\n' antes de la respuesta
+                    return linea[i:]
+    return None
+
+
+def negociar_baudios(ser, candidatos=BAUDIOS_NEGOCIABLES, timeout=0.5,
+                     espera_arranque=2.5, reintentos_ping=3) -> int:
+    """
+    Pide al sketch la velocidad más alta de `candidatos` que pase la
+    prueba $PING/$PONG y deja `ser` a esa velocidad.  Devuelve el baud
+    final (el original si ninguno sirve o el sketch no negocia).
+
+    • Antes espera hasta `espera_arranque` s una línea cualquiera: al
+      abrir el puerto el Arduino se resetea y el bootloader no contesta.
+    • Si el primer $BAUD no tiene respuesta se asume un sketch sin
+      negociación y no se insiste.
+    • Si falla el $PING se espera a que el sketch vuelva solo a la
+      velocidad original antes de probar el siguiente.
+    """
+    base = ser.baudrate
+    _esperar_linea(ser, None, espera_arranque)
+    for baud in candidatos:
+        if baud <= base:
+            continue
+        ser.reset_input_buffer()
+        ser.write(f"nan,nan,$BAUD,{baud}\n".encode())
+        resp = _esperar_linea(ser, (b"$OK,", b"$ERR,"), timeout)
+        if resp is None:
+            print(f"[SERIAL] {ser.port}: el sketch no negocia baud rate")
+            break
+        if resp.startswith(b"$ERR"):
+            continue
+
+        ser.baudrate = baud
+        ok = False
+        for _ in range(reintentos_ping):
+            ser.reset_input_buffer()
+            ser.write(b"nan,nan,$PING\n")
+            pong = _esperar_linea(ser, (b"$PONG,",), 0.1)
+            if pong is not None and pong[6:].strip() == str(baud).encode():
+                ok = True
+                break
+        if ok:
+            return baud
+
+        print(f"[SERIAL] {ser.port}: {baud} baud no pasó la prueba; vuelvo a {base}")
+        ser.baudrate = base
+        time.sleep(_TIMEOUT_PING_SKETCH)
+        ser.reset_input_buffer()
+    return base
+
 
 # ════════════════════════════════════════════════════════════════════
 # 1)  PROTOCOLO ────────────── decodifica líneas y las manda a la cola
 # ════════════════════════════════════════════════════════════════════
+# Una trama de texto válida ocupa una línea completa: "#ang,err,pwm"
+# (opcionalmente con un 4º campo = millis() del Arduino)
+_RE_TRAMA_TEXTO = re.compile(
+    rb'^[ \t\r]*#([^,\r\n]*),([^,\r\n]*),([^,\r\n]*?)'
+    rb'(?:,([^,\r\n]*?))?[ \t\r]*$', re.M)
+_RE_BANNER_ESC  = re.compile(rb'^[^\n]*calibre[^\n]*esc[^\n]*$', re.M | re.I)
+
+# vistas estructuradas de las tramas binarias (para decodificar en bloque)
+_DTYPE_BINARIO = np.dtype([('sync', 'u1', (2,)), ('seq', 'u1'),
+                           ('ang', '<i2'), ('err', '<i2'), ('pwm', '<i2'),
+                           ('crc', '<u2')])
+_DTYPE_BINARIO_T = np.dtype([('sync', 'u1', (2,)), ('seq', 'u1'),
+                             ('ang', '<i2'), ('err', '<i2'), ('pwm', '<i2'),
+                             ('ms', '<u2'), ('crc', '<u2')])
+_TIPOS_BINARIOS = {
+    SYNC_BINARIO[1]:   (_DTYPE_BINARIO, LARGO_BINARIO),
+    SYNC_BINARIO_T[1]: (_DTYPE_BINARIO_T, LARGO_BINARIO_T),
+}
+
+
+def _tabla_crc16():
+    tabla = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        tabla[i] = crc & 0xFFFF
+    return tabla
+
+
+_TABLA_CRC16 = _tabla_crc16()
+
+
+def _crc16_ccitt_bloque(cuerpos: np.ndarray) -> np.ndarray:
+    """CRC-16/CCITT de cada fila de una matriz (n, k) de uint8."""
+    crc = np.full(cuerpos.shape[0], 0xFFFF, dtype=np.uint16)
+    for col in cuerpos.T:
+        idx = ((crc >> 8) ^ col) & 0xFF
+        crc = (crc << 8) ^ _TABLA_CRC16[idx]
+    return crc
+
+
+class EstadisticaMovil:
+    """
+    Estadística acumulada de una magnitud (p. ej. intervalo entre
+    tramas): media y máximo sobre toda la corrida, p50/p99 sobre las
+    últimas `ventana` muestras.  `agregar` es O(n) vectorizado y la
+    consulta no bloquea al productor.
+    """
+
+    def __init__(self, ventana=2048):
+        self._ventana = np.zeros(ventana)
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.n = 0
+        self.media = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, valores):
+        valores = np.atleast_1d(np.asarray(valores, dtype=float))
+        k = len(valores)
+        if k == 0:
+            return
+        cap = len(self._ventana)
+        idx = (self.n + np.arange(max(0, k - cap), k)) % cap
+        self._ventana[idx] = valores[-cap:]
+        self.media += float(valores.sum() - k * self.media) / (self.n + k)
+        self.maximo = max(self.maximo, float(valores.max()))
+        self.n += k
+
+    def resumen(self) -> dict:
+        n = min(self.n, len(self._ventana))
+        if n == 0:
+            return {"n": 0, "media": np.nan, "p50": np.nan,
+                    "p99": np.nan, "max": np.nan}
+        p50, p99 = np.percentile(self._ventana[:n], [50, 99])
+        return {"n": self.n, "media": self.media, "p50": float(p50),
+                "p99": float(p99), "max": self.maximo}
+
+
 class _LineProtocol(serial.threaded.LineReader):
     """
-    Lee bytes → arma líneas → parsea tramas válidas y las entrega a la
-    cola pasada en el constructor.
+    Lee bytes → arma líneas → parsea tramas válidas y las escribe en el
+    búfer circular; los avisos van a la cola de eventos.
+
+    Todo lo que ReaderThread entrega en un `data_received` se decodifica
+    de una sola pasada (regex + NumPy) y se publica como *un* bloque
+    con dtype TELEMETRIA_DTYPE.
+
+    Cada trama recibe su marca temporal en este hilo: la hora de la
+    lectura menos el tiempo que tardaron en llegar los bytes que venían
+    detrás de ella (10 bits por byte a `baud`).  Si la trama trae
+    millis() del Arduino se guarda además en `t_mcu`.
+
+    Lo descartado se cuenta por motivo en `rechazos` (sólo sumas por
+    bloque, se deja siempre activo):
+      'campos'       línea "#…" con otra cantidad de campos o cortada
+      'numero'       "#…" con un campo que no es número
+      'desconocida'  línea que no es trama ni banner
+      'crc' / 'sincronia'   trama binaria inválida (_BinaryProtocol)
     """
     TERMINATOR = b'\n'
 
-    def __init__(self, rx_queue, pwm_eq_ref_lambda):
+    def __init__(self, rx_queue, rx_buffer, al_recibir, baud=9600,
+                 estad_llegada=None, estad_mcu=None):
         super().__init__()
-        self.rx_queue = rx_queue
-        self._calc_pwm_sw = pwm_eq_ref_lambda  # función para PWM soft
+        self.rx_queue = rx_queue            # eventos (banner ESC, errores)
+        self.rx_buffer = rx_buffer          # RingBuffer de telemetría
+        self._al_recibir = al_recibir       # completa pwm_sw del bloque
+        self._pendientes = []               # bloques aún sin publicar
+        self._seq = -1                      # último nº de secuencia
+        self._t_byte = 10.0 / baud          # [s] por byte (8N1)
+        self._t_rx = 0.0                    # hora de la última lectura
+        self._bytes_rx = 0                  # bytes recibidos en total
+        self._t_prev = None                 # última marca publicada
+        self._t_mcu_prev = None
+        self.estad_llegada = estad_llegada or EstadisticaMovil()
+        self.estad_mcu = estad_mcu or EstadisticaMovil()
+        self.rechazos = collections.Counter()   # motivo → tramas / líneas
+        self.bytes_descartados = 0          # basura antes de una sincronía
+        self.tramas_perdidas = 0            # huecos en el nº de secuencia
+
+    @property
+    def tramas_rechazadas(self):
+        return sum(self.rechazos.values())
+
+    # ---------- llamada automática por ReaderThread -----------------
+    def data_received(self, data):
+        self._marcar_llegada(data)
+        buf = self.buffer
+        fin = buf.rfind(self.TERMINATOR)
+        if fin == -1:
+            return                                      # sin líneas completas
+        base = self._pos_buffer()
+        region = bytes(buf[:fin + 1])
+        del buf[:fin + 1]
+        self._procesar_texto(region, base)
+        self._vaciar()
 
-    # ---------- llamada automática por LineReader -------------------
     def handle_line(self, line: str) -> None:
         """
-        Se ejecuta en *el hilo interno* de ReaderThread cada vez que
-        llega una línea terminada en '\n'.
+        Procesa una línea suelta (compatibilidad con LineReader).
         Formatos:
-          • #angulo,err,pwm
+          • #angulo,err,pwm[,millis]
           • “calibre ESC …” (aviso)
         """
-        line = line.strip()
-        if not line:
-            return
+        self._t_rx = time.perf_counter()
+        datos = line.encode(self.ENCODING, self.UNICODE_HANDLING)
+        self._procesar_texto(datos, self._bytes_rx - len(datos))
+        self._vaciar()
 
-        if "calibre" in line.lower() and "esc" in line.lower():
-            self.rx_queue.put(("ESC_WARNING", line))
-            return
+    def _marcar_llegada(self, data):
+        self._t_rx = time.perf_counter()
+        self._bytes_rx += len(data)
+        self.buffer.extend(data)
 
-        if not line.startswith('#'):
-            # ignoramos líneas que no son nuestras tramas
-            return
+    def _pos_buffer(self):
+        """Posición absoluta (en bytes) del inicio de self.buffer."""
+        return self._bytes_rx - len(self.buffer)
 
-        payload = line[1:]
-        partes = [p.strip() for p in payload.split(',')]
-        if len(partes) != 3:
-            return
+    # ---------- decodificación en bloque ----------------------------
+    def _procesar_texto(self, region: bytes, base: int) -> int:
+        # el banner es raro: sólo entonces se corta la región para
+        # respetar el orden banner ↔ datos
+        inicio = n = banners = 0
+        malos_numero = self.rechazos['numero']
+        if b'alibre' in region or b'ALIBRE' in region:
+            for m in _RE_BANNER_ESC.finditer(region):
+                banners += 1
+                n += self._parsear_tramas_texto(region[inicio:m.start()],
+                                                base + inicio)
+                self._vaciar()
+                self.rx_queue.put(("ESC_WARNING",
+                                   m.group().decode(self.ENCODING,
+                                                    self.UNICODE_HANDLING).strip()))
+                inicio = m.end()
+        n += self._parsear_tramas_texto(region[inicio:], base + inicio)
 
+        # cada trama de texto tiene un único '#': los que no se
+        # convirtieron en trama son líneas con campos de más o de menos
+        numerales = region.count(b'#')
+        malos = numerales - n - (self.rechazos['numero'] - malos_numero)
+        if malos > 0:
+            self.rechazos['campos'] += malos
+        otras = region.count(b'\n') - numerales - banners
+        if otras > 0:
+            self.rechazos['desconocida'] += otras
+        return n
+
+    def _parsear_tramas_texto(self, region: bytes, base: int) -> int:
+        coincidencias = list(_RE_TRAMA_TEXTO.finditer(region))
+        if not coincidencias:
+            return 0
+        campos = np.array([m.groups(b'nan') for m in coincidencias])
+        fines = base + np.array([m.end() for m in coincidencias])
         try:
-            ang_deg, err_deg, pwm_hw = map(float, partes)
+            valores = campos.astype(float)
         except ValueError:
+            # alguna trama corrupta: se descartan sólo las inválidas
+            validas = []
+            for i, fila in enumerate(campos):
+                try:
+                    validas.append([float(x) for x in fila])
+                except ValueError:
+                    fines[i] = -1
+                    self.rechazos['numero'] += 1
+            if not validas:
+                return 0
+            valores = np.array(validas, dtype=float)
+            fines = fines[fines >= 0]
+
+        n = len(valores)
+        self._agregar(valores[:, 0], valores[:, 1], valores[:, 2],
+                      self._seq + 1 + np.arange(n), fines,
+                      valores[:, 3] / 1000.0)
+        return n
+
+    def _agregar(self, ang, err, pwm_hw, seq, fines, t_mcu=None):
+        bloque = np.empty(len(ang), dtype=TELEMETRIA_DTYPE)
+        bloque['angle'] = ang
+        bloque['error'] = err
+        bloque['pwm_hw'] = pwm_hw
+        bloque['seq'] = seq
+        # los bytes posteriores a cada trama llegaron después de ella
+        bloque['t'] = self._t_rx - (self._bytes_rx - fines) * self._t_byte
+        bloque['t_mcu'] = np.nan if t_mcu is None else t_mcu
+        self._seq = int(seq[-1])
+        self._pendientes.append(bloque)
+
+    def _vaciar(self):
+        """Publica todo lo acumulado como un único bloque."""
+        if not self._pendientes:
             return
+        bloque = (self._pendientes[0] if len(self._pendientes) == 1
+                  else np.concatenate(self._pendientes))
+        self._pendientes = []
+        self._publicar_bloque(bloque)
+
+    def _publicar_bloque(self, bloque):
+        # PWM software (lo calcula el objeto contenedor, en bloque)
+        self._al_recibir(bloque)
+        self._actualizar_estadisticas(bloque)
+        self.rx_buffer.escribir(bloque)
+
+    def _actualizar_estadisticas(self, bloque):
+        t = bloque['t']
+        if self._t_prev is not None:
+            t = np.concatenate(([self._t_prev], t))
+        self.estad_llegada.agregar(np.diff(t))
+        self._t_prev = float(bloque['t'][-1])
+
+        t_mcu = bloque['t_mcu'][~np.isnan(bloque['t_mcu'])]
+        if len(t_mcu):
+            if self._t_mcu_prev is not None:
+                t_mcu = np.concatenate(([self._t_mcu_prev], t_mcu))
+            self.estad_mcu.agregar(np.diff(t_mcu))
+            self._t_mcu_prev = float(t_mcu[-1])
+
+
+class _BinaryProtocol(_LineProtocol):
+    """
+    Igual que _LineProtocol pero además reconoce la trama binaria
+    (SYNC_BINARIO … CRC).  Detecta el formato sobre la marcha: los
+    bytes 0xAA nunca aparecen en el texto ASCII del sketch, así que
+    todo lo que no empieza con la sincronía se trata como línea.
+    De esta forma los sketches viejos (sólo texto) siguen andando y el
+    banner “calibre ESC” llega aunque el sketch mande binario.
+
+    Las corridas de tramas binarias consecutivas se validan (sincronía
+    y CRC) y decodifican juntas con una vista estructurada de NumPy.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formato = None            # 'texto' | 'binario' (último visto)
+        self._seq_prev = None
+        self._ms_prev = None           # millis() de 16 bits → continuo
+        self._ms_abs = None
+
+    def data_received(self, data):
+        self._marcar_llegada(data)
+        buf = self.buffer
+        sync0 = SYNC_BINARIO[0]
+
+        while buf:
+            i = buf.find(sync0)
+            if i == 0:
+                if len(buf) < 2:
+                    break
+                tipo = _TIPOS_BINARIOS.get(buf[1])
+                if tipo is None:
+                    self.rechazos['sincronia'] += 1
+                    del buf[:1]                         # falsa sincronía
+                    continue
+                dtype, largo = tipo
+                n = len(buf) // largo
+                if n == 0:
+                    break                               # trama incompleta
+                base = self._pos_buffer()
+                validas = self._procesar_binarias(bytes(buf[:n * largo]),
+                                                  dtype, base)
+                if validas:
+                    del buf[:validas * largo]
+                else:
+                    self.rechazos['crc'] += 1
+                    del buf[:1]                         # re-sincronizar
+                continue
+
+            limite = len(buf) if i == -1 else i
+            j = buf.rfind(self.TERMINATOR, 0, limite)
+            if j != -1:
+                base = self._pos_buffer()
+                region = bytes(buf[:j + 1])
+                del buf[:j + 1]
+                if self._procesar_texto(region, base):
+                    self.formato = 'texto'
+                continue
+
+            if i > 0:
+                # restos sin '\n' antes de una sincronía → basura
+                self.bytes_descartados += i
+                del buf[:i]
+                continue
+            break                                       # línea incompleta
+
+        self._vaciar()
+
+    def _procesar_binarias(self, datos: bytes, dtype, base: int) -> int:
+        """
+        Decodifica la corrida de tramas de un mismo tipo al inicio de
+        `datos`.  Devuelve cuántas tramas válidas consecutivas se consumieron.
+        """
+        largo = dtype.itemsize
+        tramas = np.frombuffer(datos, dtype=dtype)
+        crudo = np.frombuffer(datos, dtype=np.uint8).reshape(len(tramas), largo)
+        ok = (tramas['sync'][:, 0] == crudo[0, 0]) & \
+             (tramas['sync'][:, 1] == crudo[0, 1])
+        ok &= _crc16_ccitt_bloque(crudo[:, 2:-2]) == tramas['crc']
+        validas = len(ok) if ok.all() else int(np.argmin(ok))
+        if validas == 0:
+            return 0
+
+        tramas = tramas[:validas]
+        # secuencia de 8 bits → secuencia absoluta (sin vueltas)
+        crudo_seq = tramas['seq'].astype(np.int64)
+        previo = crudo_seq[0] - 1 if self._seq_prev is None else self._seq_prev
+        saltos = np.diff(crudo_seq, prepend=previo) & 0xFF
+        self.tramas_perdidas += int((saltos - 1).sum())
+        self._seq_prev = int(crudo_seq[-1])
+        self.formato = 'binario'
+
+        t_mcu = None
+        if 'ms' in dtype.names:
+            ms = tramas['ms'].astype(np.int64)
+            if self._ms_prev is None:
+                self._ms_prev = self._ms_abs = int(ms[0])
+            saltos_ms = np.diff(ms, prepend=self._ms_prev) & 0xFFFF
+            ms_abs = self._ms_abs + np.cumsum(saltos_ms)
+            self._ms_prev, self._ms_abs = int(ms[-1]), int(ms_abs[-1])
+            t_mcu = ms_abs / 1000.0
+
+        self._agregar(tramas['ang'] / ESCALA_ANG,
+                      tramas['err'] / ESCALA_ANG,
+                      tramas['pwm'] / ESCALA_PWM,
+                      self._seq + np.cumsum(saltos),
+                      base + largo * np.arange(1, validas + 1),
+                      t_mcu)
+        return validas
+
+
+# ════════════════════════════════════════════════════════════════════
+# 1b) ESCRITOR TX ──────────── hilo propio para no bloquear la GUI
+# ════════════════════════════════════════════════════════════════════
+class _ColaTX:
+    """
+    Cola de comandos común a los escritores (hilo o asyncio).
+
+    • Los comandos “coalescibles” (consigna de PWM) se fusionan: si el
+      último comando aún sin enviar es de la misma clase (`coalescible`,
+      p. ej. ("pwm", toggle)), se reemplaza por el nuevo (gana el más
+      reciente).  Parámetros, toggles y consignas con otro toggle nunca
+      se fusionan y mantienen su orden.
+    • El escritor no toma el comando siguiente hasta que el anterior
+      salió del cable (drenado del driver y, con `baud`, 10 bits por
+      byte desde que el cable quedó libre): mientras tanto las
+      consignas se acumulan en la cola y se fusionan.
+    • `encolar` nunca bloquea al que llama (GUI o hilo de lectura).
+    • Una escritura que tarda más que `umbral_bloqueo` [s] o que vence
+      por write_timeout cuenta como bloqueo (sin contar la espera del
+      cable, que es la esperada).
+    """
+
+    def __init__(self, umbral_bloqueo=0.02, baud=None):
+        self.umbral_bloqueo = umbral_bloqueo
+        self.s_por_byte = 10.0 / baud if baud else 0.0
+        self._t_cable = 0.0                         # cuándo queda libre el cable
+        self._cola = collections.deque()   # (bytes, coalescible, t_origen)
+        self._cond = threading.Condition()
+        self._vivo = True
+
+        self.bytes_enviados = 0
+        self.comandos_enviados = 0
+        self.comandos_coalescidos = 0
+        self.bloqueos_escritura = 0
+        self.errores = 0
+        self.max_pendientes = 0                     # marca de agua alta
+        self.estad_escritura = EstadisticaMovil()   # duración de write [s]
+        self.estad_latencia = EstadisticaMovil()    # muestra → comando [s]
+
+    def encolar(self, datos: bytes, coalescible=False, t_origen=None):
+        """
+        `t_origen` = llegada de la muestra que originó el comando; si se
+        da, se mide la latencia hasta que el comando termina de escribirse.
+        """
+        with self._cond:
+            if coalescible and self._cola and self._cola[-1][1] == coalescible:
+                self._cola[-1] = (datos, coalescible, t_origen)
+                self.comandos_coalescidos += 1
+            else:
+                self._cola.append((datos, coalescible, t_origen))
+                if len(self._cola) > self.max_pendientes:
+                    self.max_pendientes = len(self._cola)
+            self._cond.notify()
+        self._despertar()
+
+    def _despertar(self):
+        """Avisa al escritor que hay algo nuevo (el hilo usa la Condition)."""
 
-        # PWM software (lo calcula el objeto contenedor mediante lambda)
-        pwm_sw = self._calc_pwm_sw(ang_deg)
-        self.rx_queue.put((ang_deg, err_deg, pwm_hw, pwm_sw))
+    def pendientes(self):
+        return len(self._cola)
+
+    def _fin_en_cable(self, n, t0):
+        """Instante en que los `n` bytes escritos en t0 terminan de salir."""
+        self._t_cable = max(self._t_cable, t0) + n * self.s_por_byte
+        return self._t_cable
+
+    def _registrar_escritura(self, datos, t0, t1, t_origen, t_fin=None):
+        """t1: volvió write(); t_fin: el comando salió del cable."""
+        dt = t1 - t0
+        self.estad_escritura.agregar(dt)
+        if t_origen is not None:
+            self.estad_latencia.agregar((t1 if t_fin is None else t_fin) - t_origen)
+        if dt > self.umbral_bloqueo:
+            self.bloqueos_escritura += 1
+        self.bytes_enviados += len(datos)
+        self.comandos_enviados += 1
+
+    def resumen(self) -> dict:
+        return {
+            "bytes_enviados":       self.bytes_enviados,
+            "comandos_enviados":    self.comandos_enviados,
+            "comandos_coalescidos": self.comandos_coalescidos,
+            "bloqueos_escritura":   self.bloqueos_escritura,
+            "errores":              self.errores,
+            "pendientes":           self.pendientes(),
+            "max_pendientes":       self.max_pendientes,
+            "escritura_s":          self.estad_escritura.resumen(),
+        }
+
+
+class _EscritorTX(_ColaTX, threading.Thread):
+    """Hilo que escribe en el puerto los comandos encolados, en orden."""
+
+    def __init__(self, escribir, umbral_bloqueo=0.02, drenar=None, baud=None):
+        threading.Thread.__init__(self, daemon=True, name="SerialComm-TX")
+        _ColaTX.__init__(self, umbral_bloqueo, baud)
+        self._escribir = escribir          # función bytes → None
+        self._drenar = drenar              # p. ej. ser.flush (tcdrain); None → no
+
+    def detener(self, timeout=0.5):
+        with self._cond:
+            self._vivo = False
+            self._cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._vivo and not self._cola:
+                    self._cond.wait()
+                if not self._cola:
+                    return
+                datos, _, t_origen = self._cola.popleft()
+
+            t0 = time.perf_counter()
+            try:
+                self._escribir(datos)
+                t1 = time.perf_counter()
+                if self._drenar is not None:
+                    self._drenar()
+            except serial.SerialTimeoutException:
+                self.bloqueos_escritura += 1
+                continue
+            except Exception as e:
+                self.errores += 1
+                print(f"[SERIAL] Error TX: {e}")
+                continue
+            # write() vuelve con los bytes en el búfer del driver (y en un
+            # pty o un USB-serie, aun después de drenar): se espera a que
+            # salgan del cable, así lo que llegue mientras se fusiona
+            espera = self._fin_en_cable(len(datos), t0) - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            self._registrar_escritura(datos, t0, t1, t_origen, time.perf_counter())
 
 
 # ════════════════════════════════════════════════════════════════════
@@ -69,28 +698,78 @@ class SerialComm:
     """
     Comunicación serie no-bloqueante con ReaderThread + LineReader.
 
-    • Publica tuplas:
-        (ang_deg, err_deg, pwm_hw, pwm_sw)   ← datos de telemetría
-      y mensajes especiales:
+    • Escribe la telemetría en `rx_buffer` (RingBuffer con dtype
+      TELEMETRIA_DTYPE: t, angle, error, pwm_hw, pwm_sw, seq, t_mcu),
+      un bloque por lectura del puerto.  `t` es la hora de llegada de
+      cada trama (time.perf_counter(), tomada en el hilo de lectura).
+    • estadisticas_llegada() → intervalo entre tramas (media, p50,
+      p99, máx) medido en la PC y, si el sketch lo manda, con millis().
+    • Los comandos salen por un hilo escritor propio (_EscritorTX):
+      send_command/send_pidf_data no bloquean y las consignas de PWM
+      consecutivas se fusionan.  estadisticas_tx() → bytes, fusiones,
+      bloqueos.
+    • set_control_en_lazo(f) → el PIDf de la PC corre por evento en el
+      hilo de lectura; estadisticas_latencia() → muestra → comando.
+    • grabar() → además guarda cada muestra en disco (grabador.py),
+      en el hilo de lectura, apenas se decodifica.
+    • negociar=True (o una lista de baudios) → al abrir el puerto se
+      pide al sketch la velocidad más alta que pase la prueba $PING;
+      `baud` queda en la elegida.  La prueba corre en un hilo propio
+      (start() vuelve enseguida) y al terminar publica ("BAUD", baud);
+      esperar_conexion(timeout) la espera.
+    • estadisticas() → salud del enlace en un solo dict: tramas
+      parseadas y rechazadas por motivo, bytes y % del enlace en cada
+      sentido, marcas de agua de las colas; con tasas por segundo.
+    • reproducir=<sesión grabada> → en lugar del puerto, la telemetría
+      sale de la sesión (a `velocidad`× o sin límite con velocidad=None)
+      por el mismo camino: pwm_sw se recalcula con el PIDf actual.
+    • Publica en `rx_queue` sólo mensajes especiales:
         ("ESC_WARNING", txt)                 ← banner de calibración ESC
-    • Mantiene un pequeño PIDf en SW para producir pwm_sw idéntico
-      al del Arduino (útil para graficar / debug).
+        ("ERROR", txt)                       ← no se pudo abrir el puerto
+        ("BAUD", baud)                       ← terminó la negociación
+    • `pidf` (ControladorPIDf) produce pwm_sw idéntico al del Arduino,
+      una sola vez por muestra y en el hilo de lectura.  Quien consume
+      el búfer usa pwm_sw; si hace falta el mismo lazo en otro objeto
+      (ControlSystem), se comparte la instancia: comm.pidf = ctrl.pidf.
     """
 
     # ---------------------------------------------------------------
-    def __init__(self, port='COM5', baud=9600, simulate=False):
+    def __init__(self, port='COM5', baud=9600, simulate=False,
+                 formato='auto', capacidad=16384,
+                 politica=RingBuffer.SOBRESCRIBIR,
+                 reproducir=None, velocidad=1.0, negociar=False):
         self.port = port
         self.baud = baud
-        self.simulate = simulate                  # TRUE = genera datos fake
+        self.baud_inicial = baud                  # a la que arranca el sketch
+        self.negociar = negociar                  # False | True | [baudios]
+        self.reproducir = reproducir              # ruta de una sesión grabada
+        self.velocidad = velocidad                # 1, N o None (sin límite)
+        # TRUE = genera datos fake (o reproduce una sesión)
+        self.simulate = simulate or reproducir is not None
+        self.formato = formato                    # 'auto' | 'texto'
         self.rx_queue: queue.Queue = queue.Queue()
+        self.rx_buffer = RingBuffer(capacidad, TELEMETRIA_DTYPE, politica)
 
         self._reader_thread = None                # ReaderThread de pyserial
         self._protocol = None                     # instancia _LineProtocol
+        self._tx = None                           # hilo _EscritorTX
+        self._control_en_lazo = None              # PIDf por evento (o None)
         self._simulate_th = None                  # hilo de simulación
+        self._grabador = None                     # GrabadorSesion (o None)
+        self._lock_arranque = threading.Lock()    # negociación vs. stop()
+        self._conectado = threading.Event()       # puerto leyendo (o simulación)
+        self._ser_negociando = None               # puerto mientras se negocia
+        self.tramas = 0                           # muestras entregadas (todas las fuentes)
+        self._fotos = collections.deque(maxlen=64)  # contadores en el tiempo
+        self._foto_inicio = None
         self.running = False
 
-        # ------- coeficientes PIDf SW ---------------
-        self._init_pidf_state()
+        # ------- jitter de llegada -----------------
+        self.estad_llegada = EstadisticaMovil()   # según reloj de la PC
+        self.estad_mcu = EstadisticaMovil()       # según millis() del Arduino
+
+        # ------- PIDf SW (Rig lo comparte con su ControlSystem) -----
+        self.pidf = ControladorPIDf()
 
     # ---------------------------------------------------------------
     #              ==  API esperado por tu GUI  ==
@@ -100,6 +779,16 @@ class SerialComm:
     def queue(self):
         return self.rx_queue
 
+    @property
+    def formato_detectado(self):
+        """'texto' | 'binario' según la última trama válida (None = aún nada)."""
+        return getattr(self._protocol, 'formato', None)
+
+    def estadisticas_llegada(self) -> dict:
+        """Intervalo entre tramas [s]: {'pc': {...}, 'mcu': {...}}."""
+        return {"pc": self.estad_llegada.resumen(),
+                "mcu": self.estad_mcu.resumen()}
+
     # ---------------  control del hilo RX --------------------------
     def start(self):
         if self.running:
@@ -107,11 +796,14 @@ class SerialComm:
             return
 
         self.running = True
+        self._conectado.clear()
+        self._reiniciar_fotos()
 
         if self.simulate:
             self._simulate_th = threading.Thread(
                 target=self._simulate_data, daemon=True)
             self._simulate_th.start()
+            self._conectado.set()
             return
 
         # →  puerto real
@@ -125,107 +817,404 @@ class SerialComm:
             self.running = False
             return
 
+        if self.negociar:
+            # la prueba $PING tarda (con un sketch viejo o un banco
+            # desenchufado, un timeout por candidato): en su propio hilo,
+            # para no trabar a quien llama (la GUI) ni a los demás bancos
+            self._ser_negociando = ser
+            threading.Thread(target=self._negociar_y_conectar, args=(ser,),
+                             daemon=True,
+                             name=f"SerialComm-negociar-{self.port}").start()
+            return
+        self._abrir_lector(ser)
+
+    def esperar_conexion(self, timeout=None) -> bool:
+        """True cuando el puerto ya está leyendo (tras negociar, si se pidió)."""
+        return self._conectado.wait(timeout)
+
+    def _negociar_y_conectar(self, ser):
+        try:
+            self._negociar(ser)
+        except Exception:
+            if self.running:
+                raise
+            return                                # stop() cerró el puerto
+        with self._lock_arranque:
+            self._ser_negociando = None
+            if not self.running:                  # stop() durante la negociación
+                ser.close()
+                return
+            self._abrir_lector(ser)
+        self.rx_queue.put(("BAUD", self.baud))
+
+    def _abrir_lector(self, ser):
         # ReaderThread administra su propio hilo; le pasamos nuestro protocolo
         self._reader_thread = serial.threaded.ReaderThread(
-            ser,
-            lambda: _LineProtocol(self.rx_queue,
-                                  self._calcular_pwm_soft)
-        )
+            ser, self._crear_protocolo)
         self._reader_thread.start()  # arranca hilo interno
         self._protocol = self._reader_thread.connect()[1]
         #  connect() → (serial_instance, protocolo)
 
+        # ReaderThread.write ya serializa el acceso al puerto con un lock
+        self._tx = _EscritorTX(self._reader_thread.write, drenar=ser.flush,
+                               baud=self.baud)
+        self._tx.start()
+        self._conectado.set()
+
+    def _negociar(self, ser):
+        """Antes de arrancar la lectura: sube el baud rate si se pidió."""
+        if not self.negociar:
+            return
+        candidatos = (BAUDIOS_NEGOCIABLES if self.negociar is True
+                      else tuple(self.negociar))
+        ser.baudrate = self.baud_inicial
+        try:
+            self.baud = negociar_baudios(ser, candidatos)
+        except serial.SerialException as e:
+            print(f"[SERIAL] {self.port}: error negociando baud rate: {e}")
+            ser.baudrate = self.baud = self.baud_inicial
+        print(f"[SERIAL] {self.port}: {self.baud} baud")
+        ocupacion = presupuesto_enlace(self.baud)
+        print(f"[SERIAL] ocupación estimada a 45 Hz: texto "
+              f"{ocupacion['texto']['ocupacion_pct']:.0f} %, binario "
+              f"{ocupacion['binario']['ocupacion_pct']:.0f} %")
+        self._reiniciar_fotos()                   # la ventana no incluye la negociación
+
+    # ---------------  salud del enlace -----------------------------
+    _CONTADORES = ("rx_bytes", "tx_bytes", "tramas", "rechazadas", "comandos")
+
+    def _foto(self):
+        p, tx = self._protocol, self._tx
+        return (time.perf_counter(),
+                getattr(p, '_bytes_rx', 0),
+                tx.bytes_enviados if tx is not None else 0,
+                self.tramas,
+                getattr(p, 'tramas_rechazadas', 0),
+                tx.comandos_enviados if tx is not None else 0)
+
+    def _reiniciar_fotos(self):
+        self._fotos.clear()
+        self._foto_inicio = self._foto()
+        self._fotos.append(self._foto_inicio)
+
+    def _tasas(self, ventana):
+        """
+        Tasas por segundo de los contadores en los últimos `ventana` s
+        (None = desde start).  Guarda una foto de los contadores cada
+        ≥ 0.1 s, así varios lectores no se pisan la ventana.
+        """
+        ahora = self._foto()
+        if self._foto_inicio is None:
+            self._foto_inicio = ahora
+        if not self._fotos or ahora[0] - self._fotos[-1][0] >= 0.1:
+            self._fotos.append(ahora)
+        if ventana is None:
+            ref = self._foto_inicio
+        else:
+            ref = self._fotos[0]
+            for f in self._fotos:
+                if f[0] > ahora[0] - ventana:
+                    break
+                ref = f
+        dt = ahora[0] - ref[0]
+        tasas = {c: (a - b) / dt if dt > 0 else 0.0
+                 for c, a, b in zip(self._CONTADORES, ahora[1:], ref[1:])}
+        return tasas, dt
+
+    def estadisticas(self, ventana=2.0) -> dict:
+        """
+        Salud del enlace y del pipeline.  Contadores acumulados desde
+        que se creó el objeto; tasas (…_s) y utilización sobre los
+        últimos `ventana` segundos (None = desde start).  Sólo lee
+        contadores: se puede llamar en cada tick de la GUI.
+        """
+        tasas, dt = self._tasas(ventana)
+        p = self._protocol
+        tx = self.estadisticas_tx()
+        capacidad = self.baud / 10.0                      # bytes/s (8N1)
+        return {
+            "puerto":  str(self.port),
+            "baud":    self.baud,
+            "formato": self.formato_detectado,
+            "ventana_s": dt,
+            "tramas": {
+                "parseadas":    self.tramas,
+                "por_s":        tasas["tramas"],
+                "rechazadas":   dict(getattr(p, 'rechazos', {})),
+                "rechazadas_s": tasas["rechazadas"],
+                "perdidas":     getattr(p, 'tramas_perdidas', 0),
+            },
+            "rx": {
+                "bytes":           getattr(p, '_bytes_rx', 0),
+                "bytes_s":         tasas["rx_bytes"],
+                "utilizacion_pct": 100.0 * tasas["rx_bytes"] / capacidad,
+                "descartados":     getattr(p, 'bytes_descartados', 0),
+            },
+            "tx": {
+                "bytes":           tx.get("bytes_enviados", 0),
+                "bytes_s":         tasas["tx_bytes"],
+                "utilizacion_pct": 100.0 * tasas["tx_bytes"] / capacidad,
+                "comandos":        tx.get("comandos_enviados", 0),
+                "comandos_s":      tasas["comandos"],
+                "coalescidos":     tx.get("comandos_coalescidos", 0),
+                "bloqueos":        tx.get("bloqueos_escritura", 0),
+                "pendientes":      tx.get("pendientes", 0),
+                "max_pendientes":  tx.get("max_pendientes", 0),
+            },
+            "cola": {
+                "ocupacion": len(self.rx_buffer),
+                "max":       self.rx_buffer.max_ocupacion,
+                "capacidad": self.rx_buffer.capacidad,
+                "desbordes": self.rx_buffer.desbordes,
+                "eventos":   self.rx_queue.qsize(),
+            },
+        }
+
+    def utilizacion_enlace(self, ventana=2.0) -> dict:
+        """% de la capacidad (8N1) usado en cada sentido; ver estadisticas()."""
+        e = self.estadisticas(ventana)
+        return {
+            "baud":   self.baud,
+            "rx_B_s": e["rx"]["bytes_s"],
+            "tx_B_s": e["tx"]["bytes_s"],
+            "rx_pct": e["rx"]["utilizacion_pct"],
+            "tx_pct": e["tx"]["utilizacion_pct"],
+        }
+
+    def _crear_protocolo(self):
+        # 'auto' entiende texto y binario; 'texto' = protocolo original
+        protocolo = _LineProtocol if self.formato == 'texto' else _BinaryProtocol
+        return protocolo(self.rx_queue, self.rx_buffer,
+                         self._al_recibir_bloque,
+                         baud=self.baud,
+                         estad_llegada=self.estad_llegada,
+                         estad_mcu=self.estad_mcu)
+
     def stop(self):
-        self.running = False
+        with self._lock_arranque:
+            self.running = False
+            if self._ser_negociando is not None:  # corta la prueba $PING
+                self._ser_negociando.close()
+
+            if self._tx is not None:
+                self._tx.detener()
+                self._tx = None
 
-        if self._reader_thread is not None:
-            self._reader_thread.close()
-            self._reader_thread = None
+            if self._reader_thread is not None:
+                self._reader_thread.close()
+                self._reader_thread = None
 
         if self._simulate_th and self._simulate_th.is_alive():
             self._simulate_th.join(timeout=0.1)
 
+        self.detener_grabacion()
+
     # ---------------  TX genérico ----------------------------------
-    def send_command(self, msg: str):
+    def send_command(self, msg: str, coalescible=False, t_origen=None):
         """
-        Envía una línea cr+lf al Arduino.
+        Encola una línea para el Arduino; la escribe el hilo TX (no bloquea).
         Si estamos en modo simulación se ignora.
         """
-        if self.simulate or self._protocol is None:
+        if self.simulate or self._tx is None:
             return
-        try:
-            self._protocol.transport.write((msg.strip() + '\n').encode())
-        except Exception as e:
-            print(f"[SERIAL] Error TX: {e}")
+        self._tx.encolar((msg.strip() + '\n').encode(), coalescible, t_origen)
 
     # atajo específico de tu sketch
-    def send_pidf_data(self, Tss, Mp, kp, ki, kd, n, pwm, toggle):
-        datos = [Tss, Mp, kp, ki, kd, n, pwm, 1 if toggle else 0]
-        partes = [
-            "nan" if (isinstance(x, float) and np.isnan(x)) else f"{x:.4f}"
-            if isinstance(x, (float, int)) else str(x)
-            for x in datos
-        ]
-        self.send_command(",".join(partes))
+    def send_pidf_data(self, Tss, Mp, kp, ki, kd, n, pwm, toggle,
+                       t_origen=None):
+        partes = linea_pidf(Tss, Mp, kp, ki, kd, n, pwm, toggle).split(",")
+        # sólo consigna de PWM → se puede fusionar con la anterior, si
+        # lleva el mismo toggle (un cambio de toggle nunca se pisa)
+        solo_pwm = all(partes[i] == "nan" for i in range(6)) and partes[6] != "nan"
+        self.send_command(",".join(partes),
+                          coalescible=("pwm", partes[7]) if solo_pwm else False,
+                          t_origen=t_origen)
+
+    def estadisticas_tx(self) -> dict:
+        """Bytes enviados, comandos fusionados y bloqueos de escritura."""
+        if self._tx is None:
+            return {}
+        return self._tx.resumen()
+
+    # ---------------  PC en el lazo (por evento) -------------------
+    @property
+    def control_en_lazo(self):
+        return self._control_en_lazo is not None
+
+    def set_control_en_lazo(self, calcular_pwm=None):
+        """
+        Con `calcular_pwm` (ang_deg → pwm, p. ej. ControlSystem.calcular_pwm)
+        el PIDf corre en el hilo de lectura apenas se decodifica cada trama
+        y el PWM sale de inmediato por el hilo TX.  None → desactiva.
+        Reinicia la estadística de latencia para comparar modos.
+
+        La tasa de envío queda acotada por el enlace: mientras un comando
+        sale por el cable, las consignas nuevas reemplazan a la pendiente
+        (ver _ColaTX), así a baud bajo se manda la más reciente en vez de
+        encolar una por trama.  calcular_pwm debe ser seguro entre hilos
+        (ControlSystem.calcular_pwm lo es: ver ControladorPIDf).
+        """
+        self._control_en_lazo = calcular_pwm
+        self.reiniciar_latencia()
+
+    def estadisticas_latencia(self) -> dict:
+        """
+        Latencia muestra → comando fuera del cable [s] (media, p50, p99,
+        máx): hasta que el puerto drenó y pasó el tiempo de cable del
+        comando a este baud, no hasta que volvió write().
+        """
+        if self._tx is None:
+            return EstadisticaMovil().resumen()
+        return self._tx.estad_latencia.resumen()
+
+    def reiniciar_latencia(self):
+        if self._tx is not None:
+            self._tx.estad_latencia.reiniciar()
+
+    def _al_recibir_bloque(self, bloque):
+        """Hilo de lectura: completa pwm_sw, cierra el lazo y graba."""
+        self.tramas += len(bloque)
+        f = self._control_en_lazo
+        if f is None:
+            bloque['pwm_sw'] = self.pidf.lote(bloque['angle'])
+        else:
+            for i, ang_deg in enumerate(bloque['angle']):
+                bloque['pwm_sw'][i] = f(ang_deg)
+            self.send_pidf_data(np.nan, np.nan, np.nan, np.nan, np.nan, np.nan,
+                                float(bloque['pwm_sw'][-1]), 1,
+                                t_origen=float(bloque['t'][-1]))
+        self._grabar(bloque)
+
+    # ---------------  grabación en disco ---------------------------
+    @property
+    def grabando(self):
+        return self._grabador is not None
+
+    def grabar(self, ruta=None, filas_por_bloque=65536) -> str:
+        """
+        Empieza a grabar toda la telemetría (t, angle, error, pwm_hw,
+        pwm_sw, seq, t_mcu) en una sesión nueva.  Por defecto en
+        sesiones/AAAAMMDD-HHMMSS_<puerto>.  Devuelve la ruta.
+        """
+        if ruta is None:
+            puerto = os.path.basename(str(self.port)) or "sim"
+            ruta = os.path.join("sesiones",
+                                f"{time.strftime('%Y%m%d-%H%M%S')}_{puerto}")
+        self.detener_grabacion()
+        self._grabador = GrabadorSesion(
+            ruta, TELEMETRIA_DTYPE, filas_por_bloque,
+            meta={"puerto": str(self.port), "baud": self.baud,
+                  "formato": self.formato, "simulado": self.simulate})
+        print(f"[GRAB] Grabando en {ruta}")
+        return ruta
+
+    def detener_grabacion(self):
+        g, self._grabador = self._grabador, None
+        if g is not None:
+            g.cerrar()
+            print(f"[GRAB] {g.ruta}: {g.n} muestras")
+
+    def _grabar(self, bloque):
+        g = self._grabador
+        if g is not None:
+            g.agregar(bloque)
 
     # ════════════════════════════════════════════════════════════════
     #                PIDf software  (idéntico a Arduino)
     # ══════════════════════════════════════════════════════­═══════
-    def _init_pidf_state(self):
-        self.a0 = self.a1 = self.a2 = 0.0
-        self.a3 = 1.0
-        self.a4 = self.a5 = 0.0
-        self.e_km1 = self.e_km2 = 0.0
-        self.u_km1 = self.u_km2 = 0.0
-        self.pwm_eq = 1500.0
-        self.ref = 0.0
-
-    def set_pidf(self, kp, ki, kd, n, Ts, pwm_eq=1500.0):
-        a = kp + kd * n
-        b = kp * n + ki
-        c = ki * n
-        d = n
-
-        K1 = (b * d - c) / d**2
-        K2 = c / d
-        K3 = (a * d**2 - b * d + c) / d**2
-
-        self.a0 = K1 + K3
-        self.a1 = -K1 - K1*np.exp(-d*Ts) + K2*Ts - 2*K3
-        self.a2 = K1*np.exp(-d*Ts) - K2*Ts*np.exp(-d*Ts) + K3
-        self.a3 = 1.0
-        self.a4 = -np.exp(-d*Ts) - 1.0
-        self.a5 = np.exp(-d*Ts)
-        self.pwm_eq = pwm_eq
+    def set_pidf(self, kp, ki, kd, n, Ts, pwm_eq=None):
+        with self.pidf:                    # el hilo de lectura ve todo o nada
+            self.pidf.set_ganancias(kp, ki, kd, n, Ts)
+            if pwm_eq is not None:
+                self.pidf.pwm_eq = pwm_eq
 
     def set_referencia(self, ref_deg):
-        self.ref = np.radians(ref_deg)
-
-    def _calcular_pwm_soft(self, ang_deg):
-        ang_rad = np.radians(ang_deg)
-        error   = self.ref - ang_rad
-
-        u = (1.0/self.a3) * (
-            self.a0*error + self.a1*self.e_km1 + self.a2*self.e_km2
-            - self.a4*self.u_km1 - self.a5*self.u_km2
-        )
-        pwm = np.clip(u + self.pwm_eq, 1000, 2000)
-
-        # roll de estados
-        self.e_km2, self.e_km1 = self.e_km1, error
-        self.u_km2, self.u_km1 = self.u_km1, u
-        return pwm
+        self.pidf.ref_rad = np.radians(ref_deg)
 
     # ════════════════════════════════════════════════════════════════
     #               GENERADOR SIMULADO (opcional)
     # ══════════════════════════════════════════════════════­═══════
     def _simulate_data(self):
+        for dt in self._fuente_simulada():
+            time.sleep(dt)
+
+    def _fuente_simulada(self):
+        """Generador de la fuente sin puerto: sesión grabada o sintética."""
+        if self.reproducir is not None:
+            return self._reproduccion()
+        return self._simulacion()
+
+    def _reproduccion(self, max_bloque=512):
+        """
+        Reproduce una sesión de grabador.py conservando los tiempos
+        originales en `t`.  Con `velocidad` = N las muestras salen cuando
+        corresponde a N× el tiempo original; con None salen en bloques
+        lo más rápido posible, pero esperando a que el consumidor libere
+        el búfer circular (nada se pisa).  Si la sesión se sigue grabando, la
+        sigue hasta que se cierre.  Al terminar avisa en rx_queue:
+        ("REPRODUCCION_FIN", ruta).
+        """
+        lector = LectorSesion(self.reproducir)
+        n = lector.actualizar()
+        columnas = [c for c in lector.columnas() if c in TELEMETRIA_DTYPE.names]
+        t_prev = None
+        i = 0
+        t0 = None
+        t_ini = time.perf_counter()
+
+        while self.running:
+            if i >= n:
+                if lector.cerrada:
+                    break
+                n = lector.actualizar()         # sesión en vivo
+                if i >= n:
+                    yield 0.02
+                continue
+            if t0 is None:
+                t0 = float(lector['t'][0])
+
+            if self.velocidad:
+                ahora = t0 + (time.perf_counter() - t_ini) * self.velocidad
+                j = int(np.searchsorted(lector['t'][i:n], ahora, side='right')) + i
+                if j == i:
+                    yield min((float(lector['t'][i]) - ahora) / self.velocidad, 0.05)
+                    continue
+                j = min(j, i + max_bloque)
+            else:
+                libre = self.rx_buffer.capacidad - len(self.rx_buffer)
+                if libre < min(max_bloque, self.rx_buffer.capacidad // 2):
+                    yield 0.001
+                    continue
+                j = min(n, i + max_bloque, i + libre)
+
+            bloque = np.zeros(j - i, dtype=TELEMETRIA_DTYPE)
+            for c in columnas:
+                bloque[c] = lector[c][i:j]
+            self._al_recibir_bloque(bloque)     # pwm_sw con el PIDf actual
+            t = bloque['t']
+            if t_prev is not None:
+                t = np.concatenate(([t_prev], t))
+            self.estad_llegada.agregar(np.diff(t))
+            t_prev = float(bloque['t'][-1])
+            self.rx_buffer.escribir(bloque)
+            i = j
+            yield 0.0
+
+        if i >= n:
+            self.rx_queue.put(("REPRODUCCION_FIN", self.reproducir))
+            print(f"[REPRO] {self.reproducir}: {i} muestras reproducidas")
+
+    def _simulacion(self):
+        """Genera una muestra por paso y devuelve (yield) cuánto esperar."""
         import random
         dt    = 0.02
         y     = -45.0
         dy    = 0.0
         ref   = 15.0
         wn, zeta = 2.0, 0.6
+        muestra = np.zeros(1, dtype=TELEMETRIA_DTYPE)
+        muestra['t_mcu'] = np.nan
+        t_prev = None
 
         while self.running:
             err = ref - y
@@ -233,11 +1222,20 @@ class SerialComm:
             dy += ddy*dt
             y  += dy*dt
 
-            pwm_hw = self.pwm_eq + 12*err + random.uniform(-3, 3)
+            pwm_hw = self.pidf.pwm_eq + 12*err + random.uniform(-3, 3)
             pwm_hw = np.clip(pwm_hw, 1000, 2000)
 
-            self.rx_queue.put((y, err, pwm_hw, pwm_hw))
-            time.sleep(dt)
+            ahora = time.perf_counter()
+            muestra['t'] = ahora
+            muestra['angle'], muestra['error'] = y, err
+            muestra['pwm_hw'] = pwm_hw
+            muestra['seq'] += 1
+            self._al_recibir_bloque(muestra)    # como una trama del puerto
+            self.rx_buffer.escribir(muestra)
+            if t_prev is not None:
+                self.estad_llegada.agregar(ahora - t_prev)
+            t_prev = ahora
+            yield dt
 
 
 # ===================================================================
@@ -1,4 +1,4 @@
-import sys, numpy as np
+import os, sys, numpy as np
 from functools import partial
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -11,8 +11,10 @@ from PySide6.QtWidgets import QColorDialog
 from pyqtgraph import mkColor
 from PySide6.QtCore import Qt
 import time
-from io_utils import SerialComm, save_config, load_config
-from control_utils import ControlSystem
+from io_utils import save_config, load_config
+from control_utils import ControlSystem, CACHE_RESPUESTAS
+from autotuner import autoajustar
+from rigs import GestorRigs
 from control import TransferFunction, feedback
 from pz_charts_matplotlib import PZChartMatplotlib as PZChart
 import pyqtgraph as pg
@@ -23,38 +25,57 @@ from PySide6.QtCore import QRunnable, QThreadPool
 from PySide6.QtCore import QThread, Signal, Slot
 import csv
 
-MAX_SAMPLES = 3000          # lo que quieras que quepa en la gráfica
+MAX_SAMPLES = 3000          # ventana visible (muestras de a una por tick)
+COLUMNAS_GRAFICO = 1000     # resolución de la envolvente mín/máx (≈ px)
+# respuestas al escalón entre sesiones: por usuario, fuera del repo
+DIR_CACHE = os.path.join(os.environ.get("LOCALAPPDATA")
+                         or os.environ.get("XDG_CACHE_HOME")
+                         or os.path.join(os.path.expanduser("~"), ".cache"),
+                         "helicoptero_1dof", "respuestas")
 MAX_BATCH   = 200           # p. ej. límite de seguridad
 
 class StepWorker(QThread):
     finished = Signal(np.ndarray, np.ndarray, np.ndarray, object, object)
 
-    def __init__(self, Gp, Gm, C_tf,
-                 t_pre, t_vis, u_vis, y_offset,
-                 ctrl, parent=None):
+    def __init__(self, Gp, Gm, C_tf, ang_ini_rad, ref_rad, duracion,
+                 ctrl, lineal=False, parent=None):
         super().__init__(parent)
         self.Gp, self.Gm, self.C_tf = Gp, Gm, C_tf
-        self.t_pre, self.t_vis, self.u_vis = t_pre, t_vis, u_vis
-        self.y_offset = y_offset          # <<< nuevo
+        self.ang_ini_rad, self.ref_rad = ang_ini_rad, ref_rad
+        self.duracion = duracion
         self.ctrl = ctrl
+        self.lineal = lineal
 
     def run(self):
-        T_closed = feedback(self.C_tf * self.Gp * self.Gm, 1)
-        _, y_vis = forced_response(T_closed, T=self.t_vis, U=self.u_vis)
+        # PIDf manual: lazo real muestreado (simulador.py); otro C(s):
+        # lazo lineal C·Gp·Gm.  Memoizados en control_utils
+        t, y_vis, pwm_vis, poles, zeros = self.ctrl.respuesta_escalon(
+            self.C_tf, self.Gp, self.Gm, self.ang_ini_rad, self.ref_rad,
+            self.duracion, lineal=self.lineal)
+        self.finished.emit(t, y_vis, pwm_vis, poles, zeros)
 
-        # Añadimos el ángulo inicial
-        y_vis = y_vis + self.y_offset     # <<< aquí
 
-        err_vis = self.ctrl.anguloReferencia_rad - y_vis
 
-        _, delta_pwm = forced_response(self.C_tf, T=self.t_vis, U=err_vis)
-        pwm_eq = self.ctrl.pwm_equilibrio()
-        pwm_vis = np.clip(delta_pwm + pwm_eq, 1000, 2000)
+class AutotunerWorker(QThread):
+    """autotuner.autoajustar fuera del hilo de la GUI."""
+    finished = Signal(object)
 
-        poles, zeros = T_closed.poles(), T_closed.zeros()
-        self.finished.emit(self.t_vis - self.t_vis[0],
-                           y_vis, pwm_vis, poles, zeros)
+    def __init__(self, ctrl, Tss, Mp, ang_ini_rad, ref_rad, Ts, inicial,
+                 parent=None):
+        super().__init__(parent)
+        self.ctrl = ctrl
+        self.args = (Tss, Mp, ang_ini_rad, ref_rad)
+        self.Ts, self.inicial = Ts, inicial
 
+    def run(self):
+        try:
+            r = autoajustar(self.ctrl, *self.args, Ts=self.Ts,
+                            inicial=self.inicial,
+                            detener=self.isInterruptionRequested)
+        except Exception as e:
+            print("[ERROR autotuner]:", e)
+            r = None
+        self.finished.emit(r)
 
 
 class BlockDiagramCanvas(QLabel):
@@ -75,24 +96,38 @@ class BlockDiagramCanvas(QLabel):
             self.setPixmap(pixmap)
 
 class ControlApp(QMainWindow):   
-    def __init__(self):
+    def __init__(self, puertos=None):
         super().__init__()
 
         self._error_km1 = 0.0
         self._error_km2 = 0.0
         self._u_km1 = 0.0
         self._u_km2 = 0.0
-        self._Ts = 0.02  # Asumiendo 50 Hz
         self._last_tss = 12.0      # mismo valor que tiene el sketch al arrancar
         self._last_mp  = 0.20
 
         self.setWindowTitle("Control Helicóptero 1‑DOF")
         self.resize(1200, 800)
 
-        self.comm = SerialComm(simulate=False)
-        self.comm.start()
-        self.ctrlsys = ControlSystem()
+        # un banco por puerto (python main.py COM5 COM6 …); el panel
+        # izquierdo actúa sobre el banco activo (self.comm / self.ctrlsys).
+        # Una carpeta de sesión grabada en lugar de un puerto la reproduce.
+        self.rigs = GestorRigs(max_muestras=MAX_SAMPLES,
+                               columnas=COLUMNAS_GRAFICO)
+        for puerto in puertos or ['COM5']:
+            if os.path.isdir(puerto):
+                self.rigs.agregar(os.path.basename(os.path.normpath(puerto)),
+                                  reproducir=puerto)
+            else:
+                self.rigs.agregar(puerto, port=puerto, simulate=False,
+                                  negociar=True)   # sube de 9600 si el sketch puede
+                                                   # (en su hilo, no traba la GUI)
+        self.rigs.start()
+        self._rig = self.rigs[0]
+        self.rigs_visibles = set(self.rigs.nombres())
+        self._curvas_rig = {}                # nombre → curvas de los otros bancos
         self.C_tf = self.ctrlsys.pidf_tf(1, 0, 0, 10)
+        self._C_es_pidf = False              # ¿C_tf es el PIDf de los spin boxes?
 
         central = QWidget()
         self.setCentralWidget(central)
@@ -122,9 +157,9 @@ class ControlApp(QMainWindow):
         kd = self.spin_kd.value()
         n  = self.spin_n.value()
 
-        self.ctrlsys.set_pidf_coefs(kp, ki, kd, n, self._Ts)
-
-        self.comm.set_referencia(self.ref_spin.value())
+        for rig in self.rigs:
+            rig.ctrlsys.set_pidf_coefs(kp, ki, kd, n, rig.ctrlsys.Ts)
+            rig.comm.set_referencia(self.ref_spin.value())
 
         self.setup_tab_simulacion()
         self.setup_tab_estilo()
@@ -238,7 +273,6 @@ class ControlApp(QMainWindow):
 
         self.timer = QTimer(); self.timer.setInterval(50)
         self.timer.timeout.connect(self._update)
-        self._buff = []
 
         self.cb_m.currentIndexChanged.connect(lambda: self._update_diagram_labels())
         self.cb_e.currentIndexChanged.connect(lambda: self._update_diagram_labels())
@@ -251,7 +285,31 @@ class ControlApp(QMainWindow):
         self._actualizar_constantes_modelo()
 
         self.sim_data = {"t": [], "y": [], "error": [], "pwm": []}
-        self.real_data = {"t_ang": ([],), "angle": [], "error": [], "pwm": []}
+        self._t0_real = 0.0                  # origen de la X de las curvas "real"
+
+    # — banco activo —
+    @property
+    def comm(self):
+        return self._rig.comm
+
+    @property
+    def ctrlsys(self):
+        return self._rig.ctrlsys
+
+    @property
+    def real_data(self):
+        """
+        Muestras del banco activo (una por tick, como se guardan en
+        rig.buff), t en segundos desde la primera.  Sólo para exportar:
+        las curvas se dibujan desde rig.envolvente.
+        """
+        buff = self._rig.buff
+        if not buff:
+            return {"t_ang": ([],), "angle": [], "error": [], "pwm": []}
+        ts_pc, ang, err, pwm = zip(*buff)
+        t0 = ts_pc[0]
+        return {"t_ang": ([t - t0 for t in ts_pc],),
+                "angle": ang, "error": err, "pwm": pwm}
 
     def _update_reference_lines(self):
         """Recoloca las tres líneas horizontales de referencia."""
@@ -606,6 +664,7 @@ class ControlApp(QMainWindow):
         self.cb_m.currentIndexChanged.connect(self._actualizar_modelo_dinamico)
         self.cb_e.currentIndexChanged.connect(self._actualizar_modelo_dinamico)
         self.cb_c.currentIndexChanged.connect(self._actualizar_modelo_dinamico)
+        self._set_controlador(self.C_tf, es_pidf=False)
 
         # === Grupo: Parámetros del sistema ===
         group_param = QGroupBox("Parámetros del sistema")
@@ -658,6 +717,17 @@ class ControlApp(QMainWindow):
         btn_enviar.clicked.connect(self._enviar_pid_a_arduino)
         pid_layout.addRow(btn_enviar)
 
+        # ITAE mínimo con ts ≤ Tss y sobrepaso ≤ Mp; el ganador se aplica y se envía
+        self.btn_autotuner = QPushButton("Autoajustar (ITAE)")
+        self.btn_autotuner.clicked.connect(self._autoajustar_pid)
+        pid_layout.addRow(self.btn_autotuner)
+
+        # PIDf de la PC con ganancias según el ángulo medido (Tss/Mp actuales)
+        self.cb_programar = QCheckBox("Ganancias programadas por ángulo")
+        self.cb_programar.setChecked(False)
+        self.cb_programar.toggled.connect(self._on_programacion_toggled)
+        pid_layout.addRow(self.cb_programar)
+
 
         layout_principal.addWidget(group_pid)
 
@@ -713,6 +783,52 @@ class ControlApp(QMainWindow):
 
 
 
+    def _autoajustar_pid(self):
+        if self.cb_c.currentText() == "Asign polos" and hasattr(self, "tss_spin"):
+            tss, mp = self.tss_spin.value(), self.mp_spin.value()
+        else:
+            tss, mp = self._last_tss, self._last_mp
+        ganancias = (self.spin_kp.value(), self.spin_ki.value(),
+                     self.spin_kd.value(), self.spin_n.value())
+        self.btn_autotuner.setEnabled(False)
+        self.btn_autotuner.setText("Autoajustando…")
+        self.autotuner_thread = AutotunerWorker(
+            self.ctrlsys, tss, mp,
+            ang_ini_rad=np.radians(self.init_spin.value()),
+            ref_rad=self.anguloReferencia,
+            Ts=self.ctrlsys.Ts,                # el T del sketch
+            inicial=ganancias if all(ganancias) else None
+        )
+        self.autotuner_thread.finished.connect(self._on_autotuner_finished)
+        self.autotuner_thread.start()
+
+    @Slot(object)
+    def _on_autotuner_finished(self, r):
+        self.btn_autotuner.setEnabled(True)
+        self.btn_autotuner.setText("Autoajustar (ITAE)")
+        if r is None:
+            return
+        if not r["factible"]:
+            print("[Advertencia] El autoajuste no cumple Tss/Mp/saturación; se aplica igual el mejor.")
+        self._last_tss, self._last_mp = r["Tss"], r["Mp"]
+        self.spin_kp.setValue(r["Kp"])
+        self.spin_ki.setValue(r["Ki"])
+        self.spin_kd.setValue(r["Kd"])
+        self.spin_n.setValue(r["N"])
+        # mismo camino que a mano: set_pidf_coefs + send_pidf_data
+        self._actualizar_pid_manual()
+        self._enviar_pid_a_arduino()
+
+    def _on_programacion_toggled(self, checked):
+        """Tabla de puntos de operación para Tss/Mp, en todos los bancos."""
+        if self.cb_c.currentText() == "Asign polos" and hasattr(self, "tss_spin"):
+            tss, mp = self.tss_spin.value(), self.mp_spin.value()
+        else:
+            tss, mp = self._last_tss, self._last_mp
+        for rig in self.rigs:
+            tabla = rig.ctrlsys.tabla_operacion(tss, mp, rig.ctrlsys.Ts) if checked else None
+            rig.ctrlsys.set_programacion(tabla)
+
     def _actualizar_modelo_dinamico(self):
         # Limpiar contenedor dinámico
         while self.model_dynamics_container.count():
@@ -803,6 +919,67 @@ class ControlApp(QMainWindow):
 
         layout.addLayout(hrun)
 
+        # === PC en el lazo: por temporizador (50 ms) o por evento ===
+        self.cb_lazo_evento = QCheckBox("PIDf por evento (hilo serie)")
+        self.cb_lazo_evento.setChecked(False)
+        self.cb_lazo_evento.toggled.connect(lambda _: self._aplicar_modo_lazo())
+        layout.addWidget(self.cb_lazo_evento)
+
+        # === Grabación de toda la telemetría en disco (grabador.py) ===
+        self.cb_grabar = QCheckBox("Grabar sesión en disco")
+        self.cb_grabar.setChecked(False)
+        self.cb_grabar.toggled.connect(self._on_grabar_toggled)
+        layout.addWidget(self.cb_grabar)
+
+        self.lbl_latencia = QLabel("Latencia muestra→PWM: —")
+        self.lbl_latencia.setStyleSheet("font-family: monospace;")
+        layout.addWidget(self.lbl_latencia)
+
+        # === Salud del enlace del banco activo (SerialComm.estadisticas) ===
+        box_enlace = QGroupBox("Enlace")
+        lay_enlace = QVBoxLayout(box_enlace)
+        self.lbl_enlace = QLabel("—")
+        self.lbl_enlace.setStyleSheet("font-family: monospace;")
+        lay_enlace.addWidget(self.lbl_enlace)
+        layout.addWidget(box_enlace)
+        self._t_panel_enlace = 0.0
+
+        # === Último cambio de referencia, medido en vivo (metricas_online.py) ===
+        box_escalon = QGroupBox("Escalón (en línea)")
+        lay_escalon = QVBoxLayout(box_escalon)
+        self.lbl_escalon = QLabel("—")
+        self.lbl_escalon.setStyleSheet("font-family: monospace;")
+        lay_escalon.addWidget(self.lbl_escalon)
+        layout.addWidget(box_escalon)
+
+        # === Parámetros reestimados en vivo (identificacion.py) ===
+        box_ident = QGroupBox("Identificación (RLS)")
+        lay_ident = QVBoxLayout(box_ident)
+        self.lbl_ident = QLabel("—")
+        self.lbl_ident.setStyleSheet("font-family: monospace;")
+        lay_ident.addWidget(self.lbl_ident)
+        self.btn_ident = QPushButton("Actualizar modelo con lo estimado")
+        self.btn_ident.setEnabled(False)
+        self.btn_ident.clicked.connect(self._aplicar_identificacion)
+        lay_ident.addWidget(self.btn_ident)
+        layout.addWidget(box_ident)
+
+        # === Bancos: cuál se edita y cuáles se grafican ===
+        box_rigs = QGroupBox("Bancos")
+        lay_rigs = QVBoxLayout(box_rigs)
+        fila_rig = QHBoxLayout()
+        fila_rig.addWidget(QLabel("Activo:"))
+        self.cb_rig_activo = QComboBox()
+        self.cb_rig_activo.addItems(self.rigs.nombres())
+        self.cb_rig_activo.currentTextChanged.connect(self._on_rig_activo_changed)
+        fila_rig.addWidget(self.cb_rig_activo)
+        lay_rigs.addLayout(fila_rig)
+        for nombre in self.rigs.nombres():
+            cb = QCheckBox(f"Mostrar {nombre}")
+            cb.setChecked(True)
+            cb.toggled.connect(partial(self._on_rig_visible_toggled, nombre))
+            lay_rigs.addWidget(cb)
+        layout.addWidget(box_rigs)
 
         layout.addSpacing(10)
 
@@ -887,7 +1064,7 @@ class ControlApp(QMainWindow):
             C_tf, zeta, wn = self.ctrlsys.assignment_tf(Tss, Mp)
 
             # Asignar a atributos
-            self.C_tf = C_tf
+            self._set_controlador(C_tf, es_pidf=False)
 
             # Actualizar las etiquetas
             self.lbl_zeta.setText(f"ζ = {zeta:.3f}")
@@ -919,17 +1096,18 @@ class ControlApp(QMainWindow):
 
     def _run(self, start: bool):
         if start:
-            # en lugar de vaciar toda la cola:
-            for _ in range(100):
-                try:    self.comm.queue.get_nowait()
-                except queue.Empty:
-                    break
+            # descartar la telemetría vieja acumulada mientras estaba parado
+            # (de una sesión reproducida no se descarta nada)
+            for rig in self.rigs:
+                if rig.comm.reproducir is None:
+                    rig.comm.rx_buffer.vaciar()
             self.timer.start()
             QTimer.singleShot(200, lambda: self._update(force=True))
         else:
             self.timer.stop()
-        # enviar toggle…
-        self.comm.send_pidf_data(
+        self._aplicar_modo_lazo()
+        # enviar toggle… (a todos los bancos)
+        self.rigs.send_pidf_data(
             np.nan, np.nan,
             np.nan, np.nan, np.nan, np.nan,
             np.nan, 1 if start else 0
@@ -938,31 +1116,95 @@ class ControlApp(QMainWindow):
 
     def _pause(self): self.timer.setEnabled(not self.timer.isActive())
 
+    def _aplicar_modo_lazo(self):
+        """El PIDf por evento sólo corre mientras el lazo está en marcha."""
+        por_evento = self.cb_lazo_evento.isChecked() and self.timer.isActive()
+        if por_evento != self.comm.control_en_lazo:
+            self.rigs.set_control_en_lazo(por_evento)
+            print(f"[Lazo] PIDf {'por evento' if por_evento else 'por temporizador'}")
+
+    def _on_grabar_toggled(self, checked):
+        """Una sesión por banco en sesiones/; sin límite de MAX_SAMPLES."""
+        for rig in self.rigs:
+            if checked:
+                try:
+                    rig.comm.grabar()
+                except OSError as e:
+                    print(f"[GRAB] {rig.nombre}: no se pudo grabar: {e}")
+            else:
+                rig.comm.detener_grabacion()
+
+    def _actualizar_latencia(self):
+        lat = self.comm.estadisticas_latencia()
+        if not lat["n"]:
+            return
+        modo = "evento" if self.comm.control_en_lazo else "timer"
+        self.lbl_latencia.setText(
+            f"Latencia muestra→PWM ({modo}):\n"
+            f"  p50 {lat['p50']*1e3:6.1f} ms   p99 {lat['p99']*1e3:6.1f} ms\n"
+            f"  media {lat['media']*1e3:5.1f} ms  máx {lat['max']*1e3:6.1f} ms")
+
+    def _actualizar_panel_enlace(self):
+        """A lo sumo dos veces por segundo: sólo lee contadores."""
+        ahora = time.perf_counter()
+        if ahora - self._t_panel_enlace < 0.5:
+            return
+        self._t_panel_enlace = ahora
+        self._actualizar_panel_escalon()
+        self._actualizar_panel_identificacion()
+        e = self.comm.estadisticas()
+        tr, rx, tx, cola = e["tramas"], e["rx"], e["tx"], e["cola"]
+        rechazos = ", ".join(f"{k} {v}" for k, v in sorted(tr["rechazadas"].items()))
+        fin = self._rig.reproduccion_terminada
+        self.lbl_enlace.setText(
+            (f"reproducción terminada: {os.path.basename(os.path.normpath(fin))}\n"
+             if fin is not None else "") +
+            f"{e['baud']} baud"
+            f"{' (negociado)' if self._rig.baud_negociado is not None else ''}"
+            f"  {e['formato'] or '—'}\n"
+            f"tramas  {tr['parseadas']:>8}  {tr['por_s']:6.1f}/s  perdidas {tr['perdidas']}\n"
+            f"rechazo {rechazos or '—'}\n"
+            f"RX {rx['utilizacion_pct']:5.1f} %  {rx['bytes_s']:8.0f} B/s  basura {rx['descartados']} B\n"
+            f"TX {tx['utilizacion_pct']:5.1f} %  {tx['bytes_s']:8.0f} B/s  cola máx {tx['max_pendientes']}\n"
+            f"búfer máx {cola['max']}/{cola['capacidad']}  desbordes {cola['desbordes']}")
+
+    def _on_rig_activo_changed(self, nombre):
+        """Los controles (PIDf, referencia, modelo) pasan a actuar sobre `nombre`."""
+        self._rig = self.rigs[nombre]
+        self._actualizar_constantes_modelo()
+        self._update_reference_lines()
+        self.lbl_latencia.setText("Latencia muestra→PWM: —")
+        self._actualizar_panel_escalon()
+        self._update(force=True)
+        print(f"[Bancos] Banco activo: {nombre}")
+
+    def _on_rig_visible_toggled(self, nombre, checked):
+        if checked:
+            self.rigs_visibles.add(nombre)
+        else:
+            self.rigs_visibles.discard(nombre)
+        self._update(force=True)
+
     def _reset_real_data(self):
-        self._buff.clear()
-        self.real_data = {
-            "t_ang": ([],),
-            "angle": [],
-            "error": [],
-            "pwm": [],
-        }
+        for rig in self.rigs:
+            rig.reiniciar()
         self._update_plot_visibility()
         print("[Datos reales] Reiniciados")
 
-        # Enviar toggle = 1 al Arduino para activar/controlar el sistema
-        self.comm.send_pidf_data(
+        # Enviar toggle = 1 a los Arduino para activar/controlar el sistema
+        self.rigs.send_pidf_data(
             np.nan, np.nan,
             np.nan, np.nan, np.nan, np.nan,
             np.nan, 1
         )
 
     def _edit_pid(self):
-        self.C_tf = self.ctrlsys.pidf_tf(2.0, 1.0, 0.5, 10.0)
+        self._set_controlador(self.ctrlsys.pidf_tf(2.0, 1.0, 0.5, 10.0), es_pidf=False)
 
     def _edit_poles(self):
         Tss = 2.0
         Mp  = 0.2
-        self.C_tf = self.ctrlsys.assignment_tf(Tss, Mp)
+        self._set_controlador(self.ctrlsys.assignment_tf(Tss, Mp)[0], es_pidf=False)
         self._update_metrics(Tss, Mp)
 
     def _on_angle_changed(self, value_deg):
@@ -1003,24 +1245,22 @@ class ControlApp(QMainWindow):
         self.cb_m.setCurrentText(cfg["motor"])
         self.cb_e.setCurrentText(cfg["mech"])
         self.cb_c.setCurrentText(cfg["ctrl"])
-        self.C_tf = TransferFunction(cfg["C_num"], cfg["C_den"])
+        self._set_controlador(TransferFunction(cfg["C_num"], cfg["C_den"]), es_pidf=False)
 
     def _update_plot_visibility(self):
-        # Real
-        if self.display_flags["angle_real"]:
-            self.curve_angle_real.setData(*self.real_data["t_ang"], self.real_data["angle"])
-        else:
-            self.curve_angle_real.clear()
-
-        if self.display_flags["error_real"]:
-            self.curve_error_real.setData(*self.real_data["t_ang"], self.real_data["error"])
-        else:
-            self.curve_error_real.clear()
-
-        if self.display_flags["pwm_real"]:
-            self.curve_pwm_real.setData(*self.real_data["t_ang"], self.real_data["pwm"])
-        else:
-            self.curve_pwm_real.clear()
+        # Real (banco activo): envolvente mín/máx, el costo depende del
+        # ancho del gráfico y no de cuánta historia haya
+        activo_visible = self._rig.nombre in self.rigs_visibles
+        env = self._rig.envolvente
+        for serie, (flag, curva) in enumerate((
+                ("angle_real", self.curve_angle_real),
+                ("error_real", self.curve_error_real),
+                ("pwm_real",   self.curve_pwm_real))):
+            if self.display_flags[flag] and activo_visible:
+                x, y = env.curva(serie)
+                curva.setData(x - self._t0_real, y)
+            else:
+                curva.clear()
 
         # Simulado
         if self.display_flags["angle_sim"]:
@@ -1039,110 +1279,170 @@ class ControlApp(QMainWindow):
             self.curve_pwm_sim.clear()
 
 
+    def _actualizar_panel_escalon(self):
+        est = self._rig.escalon
+        r = est.resultado()
+        if r is None and self._rig.reproduccion_terminada is not None and est.historial:
+            r = est.historial[-1]           # el último de la sesión reproducida
+        if r is None:
+            self.lbl_escalon.setText("—")
+            return
+
+        def f(v, fmt=".2f"):
+            return "—" if v is None else format(v, fmt)
+        self.lbl_escalon.setText(
+            f"{r['desde']:+6.1f}° → {r['ref']:+6.1f}°   hace {r['duracion']:5.1f} s\n"
+            f"subida {f(r['t_subida'])} s   Mp {r['sobrepaso']:5.1f} %  (pico {f(r['t_pico'])} s)\n"
+            f"ts 2 % {f(r['ts2'])} s   ts 5 % {f(r['ts5'])} s\n"
+            f"error de régimen {f(r['ess'], '+.3f')}°")
+
+    def _actualizar_panel_identificacion(self):
+        ident = self._rig.identificador
+        if not ident.muestras:
+            self.lbl_ident.setText("— (sin muestras con empuje)")
+            self.btn_ident.setEnabled(False)
+            return
+        est = ident.estimaciones(self.ctrlsys.theta_eq_rad)
+        deriva = ident.deriva(self.ctrlsys)
+        sugerencia = ident.sugerencia(self.ctrlsys)
+        filas = [f"{p:<2} {est[p][0]:+.6g} ± {est[p][1]:.2g}  ({deriva[p]*100:+5.1f} %)"
+                 + (" *" if p in sugerencia else "")
+                 for p in ("m", "r", "C")]
+        self.lbl_ident.setText(
+            "\n".join(filas) +
+            f"\nA  {est['A'][0]:.4f} (fijo)   B {est['B'][0]:+.4f}\n"
+            f"{ident.muestras} muestras")
+        self.btn_ident.setEnabled(bool(sugerencia))
+
+    def _aplicar_identificacion(self):
+        """Los parámetros marcados con * pasan al ControlSystem del banco activo."""
+        sugerencia = self._rig.identificador.sugerencia(self.ctrlsys)
+        if not sugerencia:
+            return
+        self.ctrlsys.set_parametros_fisicos(**sugerencia)
+        self._rig.identificador.reiniciar(self.ctrlsys)
+        if self.cb_programar.isChecked():
+            self._on_programacion_toggled(True)
+        self._actualizar_constantes_modelo()
+        print("[Identificación] Modelo actualizado: "
+              + ", ".join(f"{p}={v:.6g}" for p, v in sugerencia.items()))
+
     def _update(self, force: bool = False):
         """
-        Vacía la cola de recepción, actualiza la gráfica y envía **sólo
-        el último pwm_sw** al Arduino sin asumir un período fijo: la X real
-        se toma del instante de llegada (time.perf_counter()).
+        Atiende a todos los bancos (GestorRigs.procesar): cada uno lee su
+        búfer circular (pwm_sw ya calculado en el hilo serie) y envía
+        **sólo su último pwm_sw**, sin asumir un período fijo: la X real
+        es el instante de llegada de cada trama, que SerialComm marca en
+        el hilo de lectura (time.perf_counter()).  El banco activo va en
+        las curvas "real"; los demás bancos visibles, en curvas propias.
         """
-        last_sample = None           # (t_pc, ang_deg, err_deg, pwm_sw)
-        n_read = 0
-
-        while n_read < MAX_BATCH:
-            try:
-                item = self.comm.queue.get_nowait()
-            except queue.Empty:
-                break
-            n_read += 1
-
-            # — banner ESC —
-            if isinstance(item, tuple) and item[0] == "ESC_WARNING":
-                self.lbl_serial_warning.setText(f"⚠️ {item[1]}")
-                self.lbl_serial_warning.show()
-                self._esc_last_received = time.time()
-                continue
-
-            # — datos numéricos —
-            if isinstance(item, (tuple, list)) and len(item) == 4:
-                ang_deg, err_deg, _, _ = item
-                try:
-                    pwm_sw = self.ctrlsys.calcular_pwm(ang_deg)
-                except Exception as e:
-                    print("[PWM-SW] error:", e)
-                    pwm_sw = -1
-                now = time.perf_counter()                # ⟵ marca temporal real
-                last_sample = (now, ang_deg, err_deg, pwm_sw)
+        resultados = self.rigs.procesar(MAX_BATCH)
+
+        # — eventos (banner ESC) de cualquier banco —
+        for nombre, (_, eventos) in resultados.items():
+            for item in eventos:
+                if isinstance(item, tuple) and item[0] == "ESC_WARNING":
+                    prefijo = f"[{nombre}] " if len(self.rigs) > 1 else ""
+                    self.lbl_serial_warning.setText(f"⚠️ {prefijo}{item[1]}")
+                    self.lbl_serial_warning.show()
+                    self._esc_last_received = time.time()
+                elif isinstance(item, tuple) and \
+                        item[0] in ("REPRODUCCION_FIN", "BAUD"):
+                    # Rig.procesar ya lo registró: el panel se refresca ya
+                    self._t_panel_enlace = 0.0
 
         # ocultar banner ESC al cabo de 1 s
         if hasattr(self, "_esc_last_received") and \
                 time.time() - self._esc_last_received > 1:
             self.lbl_serial_warning.hide()
 
-        # — enviamos SOLO el último PWM —
+        last_sample = resultados[self._rig.nombre][0]  # (t_pc, ang, err, pwm_sw)
         if last_sample is not None:
-            _, _, _, pwm_sw = last_sample
-            self.comm.send_pidf_data(np.nan, np.nan,
-                                    np.nan, np.nan, np.nan, np.nan,
-                                    pwm_sw, 1)
-            self._buff.append(last_sample)
+            self._actualizar_latencia()
+        self._actualizar_panel_enlace()
 
-        if not last_sample and not force:
+        hay_datos = any(ultima is not None for ultima, _ in resultados.values())
+        if not hay_datos and not force:
             return
 
-        # recortar búfer
-        if len(self._buff) > MAX_SAMPLES:
-            self._buff = self._buff[-MAX_SAMPLES:]
-
-        # graficar con tiempo real
+        # graficar con tiempo real (mismo origen para todos los bancos)
         try:
-            ts_pc, ang, err, pwm = zip(*self._buff)
-            t0 = ts_pc[0]
-            ts = [t - t0 for t in ts_pc]       # segundos desde el arranque
-
-            self.real_data = {
-                "t_ang": (ts,),
-                "angle": ang,
-                "error": err,
-                "pwm":   pwm,
-            }
+            # segundos desde la muestra más vieja del banco activo
+            t0 = self._rig.envolvente.t_inicio
+            self._t0_real = t0 if t0 is not None else time.perf_counter()
             self._update_plot_visibility()
+            self._graficar_otros_rigs(self._t0_real)
         except Exception as e:
             print("[GUI] error al graficar:", e)
 
+    def _graficar_otros_rigs(self, t0):
+        paleta = [(255, 200, 0), (0, 200, 255), (255, 100, 255),
+                  (120, 255, 120), (255, 140, 60), (200, 200, 200)]
+        for i, rig in enumerate(self.rigs):
+            curvas = self._curvas_rig.get(rig.nombre)
+            visible = (rig is not self._rig and rig.nombre in self.rigs_visibles
+                       and len(rig.envolvente) > 0)
+            if not visible:
+                if curvas is not None:
+                    for curva in curvas:
+                        curva.clear()
+                continue
+            if curvas is None:
+                pen = pg.mkPen(color=paleta[i % len(paleta)], width=1)
+                curvas = (self.plot_angle.plot(pen=pen, name=f"Ángulo ({rig.nombre})"),
+                          self.plot_error.plot(pen=pen, name=f"Error ({rig.nombre})"),
+                          self.plot_pwm.plot(pen=pen, name=f"PWM ({rig.nombre})"))
+                self._curvas_rig[rig.nombre] = curvas
+
+            for serie, (curva, flag) in enumerate(zip(
+                    curvas, ("angle_real", "error_real", "pwm_real"))):
+                if self.display_flags[flag]:
+                    x, y = rig.envolvente.curva(serie)
+                    curva.setData(x - t0, y)
+                else:
+                    curva.clear()
+
 
     def _pz_moved(self, poles, zeros):
         num = np.real_if_close(np.poly(zeros), tol=1e-9)
         den = np.real_if_close(np.poly(poles), tol=1e-9)
-        self.C_tf = TransferFunction(num.tolist(), den.tolist())
+        self._set_controlador(TransferFunction(num.tolist(), den.tolist()), es_pidf=False)
 
     def closeEvent(self, ev):
-        self.comm.stop()
+        hilo = getattr(self, "autotuner_thread", None)
+        if hilo is not None and hilo.isRunning():
+            hilo.requestInterruption()
+            hilo.wait()
+        self.rigs.stop()
         super().closeEvent(ev)
 
-    def _recalcular_step(self):
-        t_pre  = 60.0
-        t_real = self.step_time_spin.value()
-        t      = np.linspace(0, t_pre + t_real, 2000)
-
-        ref1 = np.radians(self.init_spin.value())   # ángulo inicial
-        ref2 = self.anguloReferencia                # nueva referencia
-        delta = ref2 - ref1                         # salto a simular
-
-        # entrada: 0 antes de t_pre, salto = delta después
-        u = np.where(t < t_pre, 0.0, delta)
-
-        mask = t >= t_pre
-        t_vis = t[mask]
-        u_vis = u[mask]
+    def _set_controlador(self, C_tf, es_pidf):
+        """
+        C(s) de la simulación.  Con el PIDf manual el escalón sale del lazo
+        real no lineal (planta de ControlSystem, no los modelos lineales
+        elegidos), así que los combos de motor y mecánica no aplican y se
+        deshabilitan; con cualquier otro C(s) se simula C·Gp·Gm.
+        """
+        self.C_tf = C_tf
+        self._C_es_pidf = es_pidf
+        aviso = ("El PIDf manual se simula con la planta no lineal "
+                 "(I, C, Lm, m, r); los modelos lineales sólo dan el "
+                 "diagrama de polos y ceros.") if es_pidf else ""
+        for cb in (self.cb_m, self.cb_e):
+            cb.setEnabled(not es_pidf)
+            cb.setToolTip(aviso)
 
+    def _recalcular_step(self):
         Gp = self.ctrlsys.get_motor_tf(self.cb_m.currentText())
         Gm = self.ctrlsys.get_mech_tf(self.cb_e.currentText())
 
         self.step_thread = StepWorker(
             Gp, Gm, self.C_tf,
-            t_pre, t_vis, u_vis,
-            y_offset=ref1,                # <<< nuevo
-            ctrl=self.ctrlsys
+            ang_ini_rad=np.radians(self.init_spin.value()),
+            ref_rad=self.anguloReferencia,
+            duracion=self.step_time_spin.value(),
+            ctrl=self.ctrlsys,
+            lineal=not self._C_es_pidf
         )
         self.step_thread.finished.connect(self._on_step_finished)
         self.step_thread.start()
@@ -1168,9 +1468,8 @@ class ControlApp(QMainWindow):
         n  = self.spin_n.value()
         
         print(f"[PID manual] Aplicando Kp={kp}, Ki={ki}, Kd={kd}, N={n}")
-        self.C_tf = self.ctrlsys.pidf_tf(kp, ki, kd, n)
-        self.ctrlsys.set_pidf_coefs(kp, ki, kd, n, self._Ts)
-        self.comm.set_pidf(kp, ki, kd, n, self._Ts, self.ctrlsys.pwm_equilibrio())
+        self.ctrlsys.set_pidf_coefs(kp, ki, kd, n, self.ctrlsys.Ts)   # = self.comm.pidf
+        self._set_controlador(self.ctrlsys.pidf_tf(kp, ki, kd, n), es_pidf=True)
 
         self._actualizar_constantes_modelo()
         self._update_reference_lines()
@@ -1179,6 +1478,7 @@ class ControlApp(QMainWindow):
     def _on_reference_changed(self, value_deg):
         self.anguloReferencia = np.radians(value_deg)
         self.comm.set_referencia(value_deg)
+        self._rig.marcar_referencia(value_deg)
 
         print(f"[Referencia] Ángulo de referencia actualizado a {value_deg}°")
 
@@ -1189,6 +1489,7 @@ class ControlApp(QMainWindow):
             self.ref_spin.setValue(valor_eq)
             self.anguloReferencia = np.radians(valor_eq)
             self.comm.set_referencia(valor_eq) 
+            self._rig.marcar_referencia(valor_eq)
 
             print(f"[Referencia] Sincronizado con ángulo de equilibrio: {valor_eq}°")
         else:
@@ -1199,5 +1500,6 @@ class ControlApp(QMainWindow):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    win = ControlApp(); win.show()
+    CACHE_RESPUESTAS.usar_disco(DIR_CACHE)
+    win = ControlApp(sys.argv[1:]); win.show()
     sys.exit(app.exec())
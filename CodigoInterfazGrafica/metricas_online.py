@@ -0,0 +1,159 @@
+# metricas_online.py  – métricas del escalón en vivo, muestra a muestra
+# --------------------------------------------------------------------
+# En lugar de mirar las curvas (o correr ObtenerTiempoEstablecimiento):
+# cada cambio de referencia abre un "escalón" y, a medida que llegan
+# muestras del ángulo, se actualizan
+#   • t_subida        10 % → 90 % del salto [s]
+#   • sobrepaso       [%] del salto, y t_pico [s]
+#   • ts2 / ts5       tiempo de establecimiento en banda ±2 % / ±5 % [s]
+#                     (desde el escalón hasta la última entrada a la
+#                     banda; None mientras esté afuera)
+#   • ess             error de régimen [°]: media exponencial (τ) del
+#                     error desde que entró en la banda del 5 %
+# con O(1) por muestra y sin volver a recorrer el búfer.  Al abrir el
+# escalón siguiente, el anterior queda en `historial` y se imprime.
+#
+#   est = EstimadorEscalon()
+#   est.referencia(10.0, t_cambio)             # _on_reference_changed
+#   est.agregar(vista['t'], vista['angle'])    # bloques del búfer
+#   est.resultado()                            # dict, para la GUI
+# --------------------------------------------------------------------
+import math
+import collections
+
+
+class EstimadorEscalon:
+    """
+    Métricas de respuesta al escalón calculadas en línea.
+
+    • referencia(ref_deg, t=None): si cambió, el escalón empieza en la
+      primera muestra con t ≥ `t` (None → la próxima que llegue); el
+      punto de partida es el ángulo de esa muestra.
+    • agregar(t, ang_deg): bloques (arreglos o listas), t no decreciente.
+    • resultado() → dict del escalón en curso (None si no hay).
+    • cerrar(): da por terminado el escalón en curso (fin de los datos).
+    • historial: los últimos `max_historial` escalones cerrados.
+    Saltos menores que `salto_min` [°] no abren escalón (sólo cambian
+    la referencia).
+    """
+
+    def __init__(self, salto_min=0.5, tau_ess=1.0, max_historial=50,
+                 nombre=None):
+        self.salto_min = float(salto_min)
+        self.tau_ess = float(tau_ess)
+        self.nombre = nombre
+        self.historial = collections.deque(maxlen=max_historial)
+        self.ref = None
+        self._pendiente = None              # (ref, t_cambio)
+        self._activo = False
+
+    def reiniciar(self):
+        """Descarta el escalón en curso (la referencia se conserva)."""
+        self._activo = False
+        if self.ref is not None:
+            self._pendiente = (self.ref, None)
+
+    def cerrar(self):
+        """Pasa el escalón en curso al historial; el próximo abre con referencia()."""
+        self._cerrar()
+        self._activo = False
+
+    # ---------------------------------------------------------------
+    def referencia(self, ref_deg, t=None):
+        ref_deg = float(ref_deg)
+        objetivo = self._pendiente[0] if self._pendiente is not None else self.ref
+        if objetivo is None or abs(ref_deg - objetivo) > 1e-9:   # ida y vuelta por rad
+            self._pendiente = (ref_deg, t)
+
+    def agregar(self, t, ang_deg):
+        if hasattr(t, 'tolist'):
+            t, ang_deg = t.tolist(), ang_deg.tolist()
+        muestra = self._muestra
+        for ti, yi in zip(t, ang_deg):
+            muestra(ti, yi)
+
+    def _muestra(self, t, y):
+        if self._pendiente is not None and \
+                (self._pendiente[1] is None or t >= self._pendiente[1]):
+            self._abrir(self._pendiente[0], t, y)
+        if not self._activo:
+            return
+
+        p = (y - self._y0) / self._salto            # avance: 0 → 1
+        if self._t10 is None and p >= 0.1:
+            self._t10 = t
+        if self._t90 is None and p >= 0.9:
+            self._t90 = t
+        if p > self._p_max:
+            self._p_max = p
+            self._t_pico = t
+
+        e = self.ref - y
+        ae = abs(e)
+        if ae > self._banda2:
+            self._t_entra2 = None
+        elif self._t_entra2 is None:
+            self._t_entra2 = t
+        if ae > self._banda5:
+            self._t_entra5 = None
+        elif self._t_entra5 is None:
+            self._t_entra5 = t
+
+        if self._t_entra5 is not None:              # régimen: media exponencial
+            if self._ess is None:
+                self._ess = e
+            else:
+                self._ess += (1.0 - math.exp(-(t - self._t_ult) / self.tau_ess)) \
+                    * (e - self._ess)
+        self._t_ult = t
+
+    def _abrir(self, ref, t, y):
+        self._cerrar()
+        self._pendiente = None
+        self.ref = ref
+        salto = ref - y
+        self._activo = abs(salto) >= self.salto_min
+        if not self._activo:
+            return
+        self._t0, self._y0, self._salto = t, y, salto
+        self._banda2 = 0.02 * abs(salto)
+        self._banda5 = 0.05 * abs(salto)
+        self._t10 = self._t90 = self._t_pico = None
+        self._p_max = 0.0
+        self._t_entra2 = self._t_entra5 = None
+        self._ess = None
+        self._t_ult = t
+
+    def _cerrar(self):
+        r = self.resultado()
+        if r is None:
+            return
+        self.historial.append(r)
+        prefijo = f"{self.nombre}: " if self.nombre else ""
+        print(f"[ESCALON] {prefijo}{r['desde']:+.1f}° → {r['ref']:+.1f}°  "
+              f"tr={_fmt(r['t_subida'])} s  Mp={r['sobrepaso']:.1f} %  "
+              f"ts2={_fmt(r['ts2'])} s  ts5={_fmt(r['ts5'])} s  "
+              f"ess={_fmt(r['ess'], '.3f')}°  ({r['duracion']:.1f} s)")
+
+    # ---------------------------------------------------------------
+    def resultado(self):
+        if not self._activo:
+            return None
+        t0 = self._t0
+        return {
+            "ref": self.ref,
+            "desde": self._y0,
+            "salto": self._salto,
+            "t_inicio": t0,
+            "duracion": self._t_ult - t0,
+            "t_subida": None if self._t90 is None else self._t90 - self._t10,
+            "sobrepaso": max(self._p_max - 1.0, 0.0) * 100.0,
+            "t_pico": None if self._t_pico is None else self._t_pico - t0,
+            "ts2": None if self._t_entra2 is None else self._t_entra2 - t0,
+            "ts5": None if self._t_entra5 is None else self._t_entra5 - t0,
+            "ess": self._ess,
+        }
+
+
+def _fmt(v, formato='.2f'):
+    return "—" if v is None else format(v, formato)
@@ -0,0 +1,383 @@
+# pidf.py  – el PIDf discreto del sketch, en un solo lugar
+# --------------------------------------------------------------------
+# Ecuación en diferencias de Principal.ino:
+#     e[k]   = ref - radianes(ángulo)
+#     u[k]   = (a0·e[k] + a1·e[k-1] + a2·e[k-2] - a4·u[k-1] - a5·u[k-2]) / a3
+#     pwm[k] = clip(u[k] + pwm_eq, 1000, 2000)
+#
+#   • coeficientes_pidf()  → (a0 … a5) a partir de Kp, Ki, Kd, N, Ts
+#                            (el ÚNICO lugar donde se calculan)
+#   • ControladorPIDf      → coeficientes + estado de un lazo; lo
+#                            comparten ControlSystem y SerialComm
+#   • pwm_pidf_lote()      → logs enteros / muchos juegos de ganancias
+#
+# El paso es una función suelta sobre un vector de estado; con numba se
+# compila (@njit), sin numba corre igual en Python puro con `math`:
+#
+#   c = ControladorPIDf(); c.set_ganancias(kp, ki, kd, n, 0.022)
+#   c.ref_rad, c.pwm_eq = 0.0, 1500.0
+#   pwm = c.paso(ang_deg)              # una muestra
+#   pwm = c.lote(bloque['angle'])      # un bloque, mismo estado
+#   c.programar(-90.0, 1.0, filas)     # ganancias programadas por ángulo
+# --------------------------------------------------------------------
+import math
+import threading
+
+import numpy as np
+from scipy.signal import lfilter, lfiltic
+
+try:
+    from numba import njit
+    HAY_NUMBA = True
+except ImportError:                     # numba es opcional
+    HAY_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+PWM_MIN = 1000.0
+PWM_MAX = 2000.0
+# sin numba, lfilter (≈170 µs fijos por llamada) le gana al bucle en
+# Python (≈1.4 µs por muestra) recién con bloques de más de ~130; sólo
+# con lote(..., exacto=False), porque no da el mismo último bit
+LOTE_LFILTER = 128
+
+# posiciones en el vector de estado del controlador
+_A0, _A1, _A2, _A3, _A4, _A5 = range(6)
+_E1, _E2, _U1, _U2 = range(6, 10)
+_REF, _EQ, _MIN, _MAX = range(10, 14)
+_LARGO = 14
+
+
+# ════════════════════════════════════════════════════════════════════
+# 1)  Coeficientes
+# ════════════════════════════════════════════════════════════════════
+def coeficientes_pidf(Kp, Ki, Kd, N, Ts):
+    """
+    (a0, a1, a2, a3, a4, a5) de la ecuación en diferencias del sketch.
+    Acepta arreglos: K juegos de ganancias → arreglo (K, 6).
+    """
+    Kp, Ki, Kd, N = np.broadcast_arrays(*(np.asarray(x, dtype=float)
+                                          for x in (Kp, Ki, Kd, N)))
+    a = Kp + Kd * N
+    b = Kp * N + Ki
+    c = Ki * N
+    d = N
+
+    K1 = (b * d - c) / (d * d)
+    K2 = c / d
+    K3 = (a * d * d - b * d + c) / (d * d)
+    ed = np.exp(-d * Ts)
+    return np.stack((K1 + K3,
+                     -K1 - K1 * ed + K2 * Ts - 2.0 * K3,
+                     K1 * ed - K2 * Ts * ed + K3,
+                     np.ones_like(d),
+                     -ed - 1.0,
+                     ed), axis=-1)
+
+
+# ════════════════════════════════════════════════════════════════════
+# 2)  Paso (compilado con numba si está)
+# ════════════════════════════════════════════════════════════════════
+@njit(cache=True)
+def _paso(x, ang_deg):
+    """Una muestra: lee y rola el estado `x` (in situ); devuelve el PWM."""
+    e = x[_REF] - math.radians(ang_deg)
+    u = (1.0 / x[_A3]) * (x[_A0] * e + x[_A1] * x[_E1] + x[_A2] * x[_E2]
+                          - x[_A4] * x[_U1] - x[_A5] * x[_U2])
+    x[_E2] = x[_E1]
+    x[_E1] = e
+    x[_U2] = x[_U1]
+    x[_U1] = u
+    return min(max(u + x[_EQ], x[_MIN]), x[_MAX])
+
+
+@njit(cache=True)
+def _pasos(x, ang_deg, pwm):
+    """_paso sobre un arreglo de ángulos; escribe en `pwm`."""
+    for i in range(len(ang_deg)):
+        pwm[i] = _paso(x, ang_deg[i])
+
+
+@njit(cache=True)
+def _programar(x, tabla, ang0, inv_paso, ang_deg):
+    """
+    Ganancias programadas: a0 … a5 y pwm_eq interpolados linealmente de
+    `tabla` (filas a0 … a5, pwm_eq sobre una grilla uniforme de ángulos
+    que arranca en ang0) en ang_deg.  Fuera de la grilla, el extremo.
+    """
+    f = (ang_deg - ang0) * inv_paso
+    ult = len(tabla) - 1
+    if not f > 0.0:                      # también NaN
+        i = 0
+        w = 0.0
+    elif f >= ult:
+        i = ult - 1
+        w = 1.0
+    else:
+        i = int(f)
+        w = f - i
+    fila = tabla[i]
+    sig = tabla[i + 1]
+    for j in range(6):
+        x[_A0 + j] = fila[j] + w * (sig[j] - fila[j])
+    x[_EQ] = fila[6] + w * (sig[6] - fila[6])
+
+
+@njit(cache=True)
+def _paso_programado(x, tabla, ang0, inv_paso, ang_deg):
+    _programar(x, tabla, ang0, inv_paso, ang_deg)
+    return _paso(x, ang_deg)
+
+
+@njit(cache=True)
+def _pasos_programados(x, tabla, ang0, inv_paso, ang_deg, pwm):
+    for i in range(len(ang_deg)):
+        pwm[i] = _paso_programado(x, tabla, ang0, inv_paso, ang_deg[i])
+
+
+# ════════════════════════════════════════════════════════════════════
+# 3)  ControladorPIDf
+# ════════════════════════════════════════════════════════════════════
+class ControladorPIDf:
+    """
+    Coeficientes y estado de un PIDf (una sola copia por lazo).
+
+    • set_ganancias(Kp, Ki, Kd, N, Ts) recalcula a0 … a5 sin tocar el
+      estado (igual que el sketch al recibir un Tss/Mp nuevo);
+      reiniciar() pone el estado en cero.
+    • paso(ang_deg) → PWM de una muestra.  lote(ang_deg) → PWM de un
+      arreglo, con el mismo estado y bit a bit igual a llamar paso()
+      muestra por muestra.  exacto=False (modo rápido, a pedido): sin
+      numba y desde LOTE_LFILTER muestras usa lfilter, que difiere en
+      el último bit.
+    • programar(ang0_deg, paso_deg, filas) → ganancias programadas: en
+      cada muestra, antes del paso, a0 … a5 y pwm_eq se interpolan de
+      `filas` en el ángulo medido (O(1), sin armar funciones de
+      transferencia).  programar(None) vuelve a coeficientes fijos (los
+      últimos interpolados).  Ver control_utils.TablaPuntosOperacion.
+    • El estado vive en un solo vector (`_x`): un arreglo de numpy si
+      hay numba, una lista si no (en Python puro indexar una lista es
+      bastante más rápido).  La tabla, igual.
+    • Hilos: paso/lote corren en el hilo de lectura (modo evento) y la
+      configuración llega desde la GUI.  Todo pasa por un RLock, así un
+      paso nunca ve a0 … a5 a medio escribir; `with c:` agrupa varios
+      cambios (p. ej. ganancias + reinicio) en uno solo.
+    """
+
+    __slots__ = ('_x', '_tabla', '_lock', 'Kp', 'Ki', 'Kd', 'N', 'Ts')
+
+    def __init__(self, pwm_eq=1500.0, pwm_min=PWM_MIN, pwm_max=PWM_MAX):
+        x = [0.0] * _LARGO
+        x[_A3] = 1.0
+        x[_EQ], x[_MIN], x[_MAX] = float(pwm_eq), float(pwm_min), float(pwm_max)
+        self._x = np.array(x) if HAY_NUMBA else x
+        self._tabla = None                 # (filas, ang0, 1/paso) o None
+        self._lock = threading.RLock()
+        self.Kp = self.Ki = self.Kd = 0.0
+        self.N = 1.0
+        self.Ts = 0.022
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    # ---------------  configuración --------------------------------
+    def set_ganancias(self, Kp, Ki, Kd, N, Ts):
+        coefs = coeficientes_pidf(Kp, Ki, Kd, N, Ts)
+        with self._lock:
+            self.set_coeficientes(coefs)
+            self.Kp, self.Ki, self.Kd, self.N, self.Ts = Kp, Ki, Kd, N, Ts
+
+    def set_coeficientes(self, coefs):
+        coefs = [float(a) for a in coefs]
+        with self._lock:
+            for i, a in enumerate(coefs):
+                self._x[_A0 + i] = a
+
+    def programar(self, ang0_deg, paso_deg=None, filas=None):
+        """filas: (n, 7) = a0 … a5, pwm_eq en ang0, ang0+paso, … (n ≥ 2)."""
+        if ang0_deg is None:
+            with self._lock:
+                self._tabla = None
+            return
+        filas = np.asarray(filas, dtype=float)
+        if filas.ndim != 2 or filas.shape[1] != 7 or len(filas) < 2:
+            raise ValueError(f"Tabla de ganancias inválida: forma {filas.shape}")
+        filas = np.ascontiguousarray(filas) if HAY_NUMBA else filas.tolist()
+        with self._lock:
+            self._tabla = (filas, float(ang0_deg), 1.0 / float(paso_deg))
+
+    @property
+    def programado(self):
+        return self._tabla is not None
+
+    def copia(self, con_estado=False):
+        """Otro controlador con los mismos coeficientes (para simular)."""
+        c = ControladorPIDf.__new__(ControladorPIDf)
+        with self._lock:
+            c._x = self._x.copy()
+            c._tabla = self._tabla
+            c.Kp, c.Ki, c.Kd, c.N, c.Ts = self.Kp, self.Ki, self.Kd, self.N, self.Ts
+        c._lock = threading.RLock()
+        if not con_estado:
+            c.reiniciar()
+        return c
+
+    def reiniciar(self):
+        with self._lock:
+            for i in (_E1, _E2, _U1, _U2):
+                self._x[i] = 0.0
+
+    @property
+    def coeficientes(self):
+        """(a0, a1, a2, a3, a4, a5)"""
+        return tuple(float(a) for a in self._x[_A0:_A5 + 1])
+
+    @property
+    def estado(self):
+        """(e_km1, e_km2, u_km1, u_km2), mismo orden que pwm_pidf_lote."""
+        return tuple(float(v) for v in self._x[_E1:_U2 + 1])
+
+    @estado.setter
+    def estado(self, valores):
+        valores = [float(v) for v in valores]
+        with self._lock:
+            for i, v in zip((_E1, _E2, _U1, _U2), valores):
+                self._x[i] = v
+
+    @property
+    def ref_rad(self):
+        return float(self._x[_REF])
+
+    @ref_rad.setter
+    def ref_rad(self, valor):
+        self._x[_REF] = float(valor)
+
+    @property
+    def pwm_eq(self):
+        return float(self._x[_EQ])
+
+    @pwm_eq.setter
+    def pwm_eq(self, valor):
+        self._x[_EQ] = float(valor)
+
+    # ---------------  cálculo --------------------------------------
+    def paso(self, ang_deg):
+        with self._lock:
+            if self._tabla is not None:
+                return _paso_programado(self._x, *self._tabla, float(ang_deg))
+            return _paso(self._x, float(ang_deg))
+
+    __call__ = paso                      # sirve de set_control_en_lazo(f)
+
+    def lote(self, ang_deg, exacto=True):
+        ang = np.ascontiguousarray(ang_deg, dtype=float)
+        with self._lock:
+            return self._lote(ang, exacto)
+
+    def _lote(self, ang, exacto):
+        x, tabla = self._x, self._tabla
+        if HAY_NUMBA:
+            pwm = np.empty(len(ang))
+            if tabla is not None:
+                _pasos_programados(x, *tabla, ang, pwm)
+            else:
+                _pasos(x, ang, pwm)
+            return pwm
+        if tabla is not None:            # coeficientes variables: sin lfilter
+            return np.array([_paso_programado(x, *tabla, a) for a in ang.tolist()],
+                            dtype=float)
+        if exacto or len(ang) < LOTE_LFILTER:
+            return np.array([_paso(x, a) for a in ang.tolist()], dtype=float)
+        pwm, fin = pwm_pidf_lote(ang, x[_A0:_A5 + 1], x[_REF], x[_EQ],
+                                 x[_E1:_U2 + 1], x[_MIN], x[_MAX], exacto=False)
+        self.estado = fin
+        return pwm
+
+    def __repr__(self):
+        a = ", ".join(f"{v:.4g}" for v in self.coeficientes)
+        return (f"ControladorPIDf(Kp={self.Kp:.4g}, Ki={self.Ki:.4g}, "
+                f"Kd={self.Kd:.4g}, N={self.N:.4g}; a=({a}))")
+
+
+# ════════════════════════════════════════════════════════════════════
+# 4)  Lote: logs enteros, muchas ganancias
+# ════════════════════════════════════════════════════════════════════
+def pwm_pidf_lote(ang_deg, coefs, ref_rad=0.0, pwm_eq=1500.0, estado=None,
+                  pwm_min=PWM_MIN, pwm_max=PWM_MAX, exacto=True):
+    """
+    PWM del PIDf para una secuencia de ángulos en una sola llamada.
+    Misma ecuación que ControladorPIDf.paso; el estado guarda u sin
+    recortar, como el sketch.
+
+    • ang_deg: (T,) un log, o (K, T) un log por juego de ganancias.
+    • coefs:   (6,) o (K, 6), p. ej. coeficientes_pidf(...).
+    • ref_rad, pwm_eq: escalares o (K,).
+    • estado:  (e_km1, e_km2, u_km1, u_km2), (4,) o (K, 4); None = ceros.
+    Devuelve (pwm, estado_final): pwm (T,) si hay un solo juego de
+    ganancias y un solo log, si no (K, T); estado_final (K, 4) o (4,).
+
+    • exacto=True (por defecto) → la recurrencia con las mismas
+      operaciones en el mismo orden que _paso: bit a bit igual a
+      ControladorPIDf.paso; el bucle es sobre el tiempo y vectorizado
+      sobre los K juegos (rinde con K grande).
+    • exacto=False → modo rápido: lfilter por juego de ganancias (bucle
+      en C); difiere del camino escalar en el último bit (otro orden de
+      las sumas).
+
+    Para recalcular una sesión grabada con otras ganancias:
+        s = LectorSesion(ruta)
+        coefs = coeficientes_pidf(kp_arr, ki_arr, kd_arr, n_arr, 0.022)
+        pwm, _ = pwm_pidf_lote(s["angle"], coefs, ref, pwm_eq)
+    """
+    coefs = np.asarray(coefs, dtype=float)
+    ang = np.asarray(ang_deg, dtype=float)
+    un_juego = coefs.ndim == 1 and ang.ndim == 1
+    coefs = np.atleast_2d(coefs)
+    K = max(len(coefs), ang.shape[0] if ang.ndim == 2 else 1)
+    coefs = np.broadcast_to(coefs, (K, 6))
+    T = ang.shape[-1]
+
+    ref = np.broadcast_to(np.asarray(ref_rad, dtype=float), (K,))
+    error = ref[:, None] - np.radians(np.broadcast_to(ang, (K, T)))
+    est = np.zeros((K, 4)) if estado is None else \
+        np.array(np.broadcast_to(np.asarray(estado, dtype=float), (K, 4)))
+
+    u = np.empty((K, T))
+    if T and exacto:
+        a0, a1, a2, a3, a4, a5 = coefs.T
+        inv_a3 = 1.0 / a3
+        e1, e2, u1, u2 = (est[:, i].copy() for i in range(4))
+        for j in range(T):
+            e = error[:, j]
+            uj = inv_a3 * (a0 * e + a1 * e1 + a2 * e2 - a4 * u1 - a5 * u2)
+            u[:, j] = uj
+            e2, e1 = e1, e
+            u2, u1 = u1, uj
+    elif T:
+        for k in range(K):
+            a0, a1, a2, a3, a4, a5 = coefs[k]
+            b, a = (a0, a1, a2), (a3, a4, a5)
+            e1, e2, u1, u2 = est[k]
+            zi = lfiltic(b, a, (u1, u2), (e1, e2))
+            u[k], _ = lfilter(b, a, error[k], zi=zi)
+
+    if T:
+        # estado final: las dos últimas muestras (o las del estado inicial)
+        e_hist = np.concatenate((est[:, 1::-1], error), axis=1)
+        u_hist = np.concatenate((est[:, :1:-1], u), axis=1)
+        est = np.column_stack((e_hist[:, -1], e_hist[:, -2],
+                               u_hist[:, -1], u_hist[:, -2]))
+
+    pwm_eq = np.broadcast_to(np.asarray(pwm_eq, dtype=float), (K,))
+    pwm = np.clip(u + pwm_eq[:, None], pwm_min, pwm_max)
+    if un_juego:
+        return pwm[0], est[0]
+    return pwm, est
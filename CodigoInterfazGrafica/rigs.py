@@ -0,0 +1,268 @@
+# rigs.py  – varios bancos (helicópteros 1-DOF) desde un solo proceso
+# --------------------------------------------------------------------
+# GestorRigs es dueño de N pares SerialComm / ControlSystem.  Cada banco
+# tiene su puerto, su hilo de lectura, su hilo TX, su búfer circular y
+# su PIDf: un banco lento o desconectado no frena a los demás.
+#
+#   rigs = GestorRigs()
+#   rigs.agregar("A", port="COM5")
+#   rigs.agregar("B", port="COM6")
+#   rigs.start()
+#   ...
+#   for nombre, (ultima, eventos) in rigs.procesar().items(): ...
+# --------------------------------------------------------------------
+import math
+import time
+import queue
+import collections
+
+import numpy as np
+
+from io_utils import SerialComm
+from control_utils import ControlSystem
+from decimacion import DecimadorEnvolvente
+from metricas_online import EstimadorEscalon
+from identificacion import IdentificadorRLS
+
+
+class Rig:
+    """
+    Un banco: su SerialComm, su ControlSystem y las últimas muestras.
+    Nada se comparte con los otros bancos.
+
+    • buff: la última muestra de cada procesar() (para exportar).
+    • envolvente: mín/máx de *todas* las muestras por columna de píxel
+      (ángulo, error, pwm_sw), lo que se grafica.  Cubre el mismo
+      tramo de tiempo que buff.
+    • comm y ctrlsys comparten el ControladorPIDf: el PIDf corre una
+      sola vez por muestra, en el hilo de lectura (pwm_sw del búfer).
+    • escalon: métricas en vivo del último cambio de referencia
+      (EstimadorEscalon), con las mismas muestras que la envolvente.
+    • identificador: m, r, C reestimados con RLS (IdentificadorRLS) a
+      partir del ángulo y el PWM aplicado (pwm_hw).
+    • t_ultimo: `t` de la última muestra procesada, en la base de
+      tiempo del flujo (perf_counter en vivo, la grabación al
+      reproducir); marcar_referencia() fecha los escalones con ella.
+    • Al terminar una reproducción (("REPRODUCCION_FIN", ruta) en los
+      eventos) queda `reproduccion_terminada` = ruta y el escalón en
+      curso se cierra (pasa al historial) tras las últimas muestras.
+    • baud_negociado: el baud que dejó la negociación (evento
+      ("BAUD", baud)); None mientras no termine o si no se negocia.
+    • Si el hilo de lectura sobrescribió filas mientras se leían las
+      vistas (consumir() > 0), lo leído no es confiable: envolvente,
+      escalón e identificador se reinician y no se envía PWM.
+    """
+
+    def __init__(self, nombre, comm, ctrlsys=None, max_muestras=3000,
+                 columnas=1000):
+        self.nombre = nombre
+        self.comm = comm
+        self.ctrlsys = ctrlsys if ctrlsys is not None else ControlSystem()
+        self.comm.pidf = self.ctrlsys.pidf
+        self.buff = collections.deque(maxlen=max_muestras)  # (t, ang, err, pwm)
+        self.envolvente = DecimadorEnvolvente(columnas, series=3)
+        self.escalon = EstimadorEscalon(nombre=nombre)
+        self.identificador = IdentificadorRLS(self.ctrlsys)
+        self.baud_negociado = None
+        self.tramas = 0                  # muestras procesadas
+        self.t_inicio = None
+        self.t_ultimo = None
+        self.reproduccion_terminada = None
+        self._fin_pendiente = None
+
+    def procesar(self, max_batch=200):
+        """
+        Lo que ControlApp._update hace por banco: saca los eventos, lee
+        hasta `max_batch` muestras del anillo sin copiar (pwm_sw ya viene
+        calculado del hilo serie), alimenta la envolvente y, salvo que el
+        lazo se cierre por evento, envía sólo el último PWM.  Devuelve
+        (última muestra o None, eventos).
+        """
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.comm.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        por_evento = self.comm.control_en_lazo
+        ultima = None                    # (t_pc, ang_deg, err_deg, pwm_sw)
+        n = 0
+        # por si la referencia cambió sin pasar por escalon.referencia()
+        self.escalon.referencia(math.degrees(self.ctrlsys.pidf.ref_rad))
+        for vista in self.comm.rx_buffer.vistas(max_batch):
+            self.envolvente.agregar(vista['t'], vista['angle'],
+                                    vista['error'], vista['pwm_sw'])
+            self.escalon.agregar(vista['t'], vista['angle'])
+            self.identificador.agregar(vista['angle'], vista['pwm_hw'], vista['seq'],
+                                      vista['t_mcu'])
+            n += len(vista)
+            ultima = (vista['t'][-1], vista['angle'][-1],
+                      vista['error'][-1], vista['pwm_sw'][-1])
+        pisadas = self.comm.rx_buffer.consumir(n)
+        if pisadas:
+            print(f"[RIG] {self.nombre}: {pisadas} muestras sobrescritas "
+                  f"durante la lectura; se descarta lo procesado")
+            self._descartar_lectura()
+            return None, eventos
+
+        if ultima is not None:
+            self.t_ultimo = float(ultima[0])
+            if self.t_inicio is None:
+                self.t_inicio = time.perf_counter()
+            self.tramas += n
+            if not por_evento:
+                self.comm.send_pidf_data(np.nan, np.nan,
+                                         np.nan, np.nan, np.nan, np.nan,
+                                         ultima[3], 1, t_origen=ultima[0])
+            self.buff.append(ultima)
+            if len(self.buff) == self.buff.maxlen:
+                self.envolvente.recortar(self.buff[0][0])
+
+        for item in eventos:
+            if isinstance(item, tuple) and item[0] == "REPRODUCCION_FIN":
+                self._fin_pendiente = item[1]
+            elif isinstance(item, tuple) and item[0] == "BAUD":
+                self.baud_negociado = item[1]
+                print(f"[RIG] {self.nombre}: enlace a {item[1]} baud")
+        # el aviso sale detrás del último bloque: se cierra cuando el
+        # búfer quedó vacío (puede faltar más de un max_batch)
+        if self._fin_pendiente is not None and not len(self.comm.rx_buffer):
+            self.reproduccion_terminada, self._fin_pendiente = self._fin_pendiente, None
+            self.escalon.cerrar()
+            print(f"[RIG] {self.nombre}: reproducción terminada "
+                  f"({self.reproduccion_terminada})")
+        return ultima, eventos
+
+    def marcar_referencia(self, ref_deg):
+        """Cambio de referencia desde la GUI, fechado en el tiempo del flujo."""
+        if self.comm.reproducir is not None:
+            t = self.t_ultimo            # las muestras traen su t grabado
+        else:
+            t = time.perf_counter()
+        self.escalon.referencia(ref_deg, t)
+
+    def _descartar_lectura(self):
+        """Lo alimentado con filas pisadas: vuelve a empezar."""
+        self.buff.clear()
+        self.envolvente.reiniciar()
+        self.escalon.reiniciar()
+        self.identificador.reiniciar(self.ctrlsys)
+
+    def reiniciar(self):
+        self.buff.clear()
+        self.envolvente.reiniciar()
+        self.escalon.reiniciar()
+        self.tramas = 0
+        self.t_inicio = None
+        self.t_ultimo = None
+        self.reproduccion_terminada = None
+        self._fin_pendiente = None
+
+    def estadisticas(self) -> dict:
+        dt = time.perf_counter() - self.t_inicio if self.t_inicio else 0.0
+        return {
+            "puerto": self.comm.port,
+            "baud": self.comm.baud,
+            "tramas": self.tramas,
+            "fps": self.tramas / dt if dt > 0 else 0.0,
+            "desbordes": self.comm.rx_buffer.desbordes,
+            "llegada": self.comm.estadisticas_llegada(),
+            "tx": self.comm.estadisticas_tx(),
+            "enlace": self.comm.estadisticas(),
+        }
+
+
+class GestorRigs:
+    """
+    Dueño de N bancos, en el orden en que se agregan.
+
+    • backend='hilos'   → SerialComm (ReaderThread + hilo TX por banco)
+      backend='asyncio' → SerialCommAsync (un solo event loop para todos)
+    • procesar() atiende a todos los bancos; una excepción en uno se
+      informa y no corta a los demás.
+    • Se accede por índice o por nombre: rigs[0], rigs["A"].
+    """
+
+    def __init__(self, backend='hilos', max_muestras=3000, columnas=1000):
+        if backend not in ('hilos', 'asyncio'):
+            raise ValueError(f"Backend desconocido: {backend}")
+        self.backend = backend
+        self.max_muestras = max_muestras
+        self.columnas = columnas                  # resolución de la envolvente
+        self._rigs = collections.OrderedDict()
+
+    # ---------------  alta / baja ----------------------------------
+    def agregar(self, nombre, ctrlsys=None, **kwargs_comm) -> Rig:
+        """kwargs_comm → SerialComm (port, baud, simulate, formato, …)."""
+        if nombre in self._rigs:
+            raise ValueError(f"Ya existe un banco llamado {nombre!r}")
+        if self.backend == 'asyncio':
+            from io_async import SerialCommAsync
+            comm = SerialCommAsync(**kwargs_comm)
+        else:
+            comm = SerialComm(**kwargs_comm)
+        rig = Rig(nombre, comm, ctrlsys, self.max_muestras, self.columnas)
+        self._rigs[nombre] = rig
+        return rig
+
+    def quitar(self, nombre):
+        rig = self._rigs.pop(nombre)
+        rig.comm.stop()
+
+    def __len__(self):
+        return len(self._rigs)
+
+    def __iter__(self):
+        return iter(list(self._rigs.values()))
+
+    def __getitem__(self, clave) -> Rig:
+        if isinstance(clave, int):
+            return list(self._rigs.values())[clave]
+        return self._rigs[clave]
+
+    def nombres(self):
+        return list(self._rigs)
+
+    # ---------------  control --------------------------------------
+    def start(self):
+        for rig in self:
+            rig.comm.start()
+
+    def stop(self):
+        for rig in self:
+            rig.comm.stop()
+
+    def procesar(self, max_batch=200) -> dict:
+        """{nombre: (última muestra o None, eventos)} de todos los bancos."""
+        salida = {}
+        for rig in self:
+            try:
+                salida[rig.nombre] = rig.procesar(max_batch)
+            except Exception as e:
+                print(f"[RIG] {rig.nombre}: error procesando:", e)
+                salida[rig.nombre] = (None, [])
+        return salida
+
+    def set_control_en_lazo(self, activo):
+        """PIDf por evento en todos los bancos, cada uno con su ControlSystem."""
+        for rig in self:
+            if activo != rig.comm.control_en_lazo:
+                rig.comm.set_control_en_lazo(
+                    rig.ctrlsys.calcular_pwm if activo else None)
+
+    def send_pidf_data(self, *args, **kwargs):
+        """Mismo comando a todos los bancos (p. ej. el toggle de marcha)."""
+        for rig in self:
+            rig.comm.send_pidf_data(*args, **kwargs)
+
+    def estadisticas(self) -> dict:
+        por_rig = {rig.nombre: rig.estadisticas() for rig in self}
+        return {
+            "rigs": por_rig,
+            "total": {
+                "tramas": sum(r["tramas"] for r in por_rig.values()),
+                "fps": sum(r["fps"] for r in por_rig.values()),
+                "desbordes": sum(r["desbordes"] for r in por_rig.values()),
+            },
+        }
@@ -0,0 +1,237 @@
+# robustez.py  – Monte Carlo sobre la incertidumbre de los parámetros físicos
+# --------------------------------------------------------------------
+# ControlSystem tiene I, C, Lm, m, r como valores puntuales y las
+# ganancias se validan sólo contra ellos.  Acá se sortean esos cinco
+# parámetros de distribuciones dadas, se simula el lazo (mismo PIDf,
+# mismo PWM_eq nominal: el controlador no sabe que la planta cambió)
+# para cada sorteo y se resumen las distribuciones de
+#   • sobrepaso [%], ts [s] (banda ±2 %)
+#   • tiempo con el PWM saturado [s]
+#   • tasa de no establecidos y de inestables (oscilación que no decae
+#     en el último cuarto del horizonte, o NaN)
+#
+# Los sorteos se simulan en lotes vectorizados (simular_lote con una
+# planta por fila) repartidos en un ProcessPoolExecutor: cada tarea
+# recibe sólo sus parámetros y devuelve sólo métricas, así que el
+# tiempo baja casi lineal con los núcleos.
+#
+#   d = incertidumbre_relativa(ctrl, 0.10)          # normal, σ = 10 %
+#   d["I"] = ("uniforme", 0.015, 0.019)
+#   r = analizar(ctrl, d, sorteos=5000, ang_ini_rad=np.radians(-50),
+#                ref_rad=0.0)
+#   r["resumen"]["sobrepaso"]["p95"], r["resumen"]["tasa_inestable"]
+#
+#   python robustez.py --rel 0.1 --dist I=uniforme:0.015:0.019 --sorteos 5000
+# --------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+from barrido import metricas_escalon, planta_de
+from simulador import simular_lote, LIMITES_DEG
+
+PARAMETROS = ("I", "C", "Lm", "m", "r")
+DISTRIBUCIONES = ("normal", "uniforme", "lognormal", "fijo")
+PERCENTILES = (5, 50, 95)
+
+
+def incertidumbre_relativa(sistema, rel=0.10):
+    """Normal alrededor de cada valor nominal, con σ = rel·|nominal|."""
+    return {p: ("normal", getattr(sistema, p), rel * abs(getattr(sistema, p)))
+            for p in PARAMETROS}
+
+
+def sortear(distribuciones, sistema, n, semilla=None):
+    """
+    {parámetro: (n,)}.  Cada distribución es una tupla:
+      ("normal", media, σ) · ("uniforme", mín, máx)
+      ("lognormal", mediana, σ_log) · ("fijo", valor)
+    Los parámetros que no aparecen quedan en el valor de `sistema`.
+    """
+    rng = np.random.default_rng(semilla)
+    muestras = {}
+    for p in PARAMETROS:
+        tipo, *args = distribuciones.get(p, ("fijo", getattr(sistema, p)))
+        if tipo == "normal":
+            muestras[p] = rng.normal(args[0], args[1], n)
+        elif tipo == "uniforme":
+            muestras[p] = rng.uniform(args[0], args[1], n)
+        elif tipo == "lognormal":
+            muestras[p] = args[0] * np.exp(rng.normal(0.0, args[1], n))
+        elif tipo == "fijo":
+            muestras[p] = np.full(n, float(args[0]))
+        else:
+            raise ValueError(f"Distribución desconocida para {p}: {tipo!r} "
+                             f"(válidas: {', '.join(DISTRIBUCIONES)})")
+    # un momento de inercia ≤ 0 no es una planta
+    muestras["I"] = np.maximum(muestras["I"], 1e-6)
+    return muestras
+
+
+def _evaluar_sorteos(planta, coefs, pwm_eq, ang_ini_rad, ref_rad, duracion,
+                     Ts, limites_deg):
+    """Un lote de sorteos (lo que corre cada proceso del pool)."""
+    t, ang, pwm = simular_lote(planta, coefs, pwm_eq, ang_ini_rad, ref_rad,
+                               duracion, Ts, limites_deg=limites_deg)
+    m = metricas_escalon(t, ang, pwm, ang_ini_rad, ref_rad)
+    # inestable: en el último cuarto la oscilación no es menor que en el
+    # cuarto anterior y sigue fuera de la banda del 5 %
+    n = ang.shape[1] // 4
+    e = np.abs(ref_rad - ang)
+    fin, antes = e[:, -n:].max(axis=1), e[:, -2 * n:-n].max(axis=1)
+    banda = 0.05 * max(abs(ref_rad - ang_ini_rad), 1e-9)
+    with np.errstate(invalid='ignore'):
+        m["inestable"] = ~np.isfinite(fin) | ((fin > banda) & (fin >= 0.9 * antes))
+    m["t_saturado"] = m.pop("saturacion") * duracion
+    return m
+
+
+def _resumen(valores):
+    v = valores[np.isfinite(valores)]
+    if not len(v):
+        return {"media": None, **{f"p{q}": None for q in PERCENTILES}, "max": None}
+    return {"media": float(v.mean()),
+            **{f"p{q}": float(x) for q, x in zip(PERCENTILES, np.percentile(v, PERCENTILES))},
+            "max": float(v.max())}
+
+
+def analizar(sistema, distribuciones, sorteos=2000, ang_ini_rad=np.radians(-50.0),
+             ref_rad=0.0, duracion=10.0, Ts=None, coefs=None, semilla=None,
+             procesos=None, por_lote=512, limites_deg=LIMITES_DEG):
+    """
+    Monte Carlo del lazo de `sistema` (ControlSystem) con sus ganancias
+    actuales (o `coefs`, de coeficientes_pidf) y su PWM_eq nominal.
+
+    • distribuciones: ver sortear(); p. ej. incertidumbre_relativa(sistema).
+    • Ts: None → el de las ganancias del controlador.
+    • procesos: None → uno por núcleo; 1 → en este proceso.
+    Devuelve {"sorteos": {parámetro: (n,)}, "metricas": {métrica: (n,)},
+    "resumen": {...}, "meta": {...}}.
+    """
+    t0 = time.perf_counter()
+    Ts = sistema.pidf.Ts if Ts is None else Ts
+    coefs = np.asarray(sistema.pidf.coeficientes if coefs is None else coefs,
+                       dtype=float)
+    muestras = sortear(distribuciones, sistema, sorteos, semilla)
+    procesos = procesos or os.cpu_count() or 1
+    por_lote = max(1, min(por_lote, -(-sorteos // procesos)))
+    tramos = [slice(i, min(i + por_lote, sorteos)) for i in range(0, sorteos, por_lote)]
+    argumentos = [(tuple(muestras[p][s] for p in PARAMETROS), coefs,
+                   sistema.PWM_eq, ang_ini_rad, ref_rad, duracion, Ts, limites_deg)
+                  for s in tramos]
+    if procesos == 1 or len(tramos) == 1:
+        partes = [_evaluar_sorteos(*a) for a in argumentos]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(procesos) as pool:
+            partes = list(pool.map(_evaluar_sorteos, *zip(*argumentos)))
+    metricas = {k: np.concatenate([p[k] for p in partes]) for k in partes[0]}
+
+    inestable = metricas["inestable"]
+    estable = ~inestable
+    resumen = {
+        "tasa_inestable": float(inestable.mean()),
+        "tasa_no_establecido": float(np.isnan(metricas["ts"]).mean()),
+        # de los estables: con los inestables, sobrepaso y ts no dicen nada
+        "sobrepaso": _resumen(metricas["sobrepaso"][estable]),
+        "ts": _resumen(metricas["ts"][estable]),
+        "t_saturado": _resumen(metricas["t_saturado"]),
+        "pwm_max": _resumen(metricas["pwm_max"]),
+    }
+    meta = {"sorteos": sorteos, "procesos": procesos, "lotes": len(tramos),
+            "duracion": duracion, "Ts": Ts, "ang_ini_rad": float(ang_ini_rad),
+            "ref_rad": float(ref_rad), "nominal": dict(zip(PARAMETROS, planta_de(sistema))),
+            "distribuciones": {p: list(d) for p, d in distribuciones.items()},
+            "segundos": time.perf_counter() - t0}
+    print(f"[ROBUSTEZ] {sorteos} sorteos en {meta['segundos']:.2f} s "
+          f"({procesos} procesos)  inestables {resumen['tasa_inestable']*100:.1f} %  "
+          f"no establecidos {resumen['tasa_no_establecido']*100:.1f} %")
+    return {"sorteos": muestras, "metricas": metricas, "resumen": resumen, "meta": meta}
+
+
+def graficar_histogramas(resultado, ruta=None):
+    import matplotlib
+    if ruta is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    m = resultado["metricas"]
+    estable = ~m["inestable"]
+    series = [("sobrepaso [%]", m["sobrepaso"][estable]),
+              ("ts [s]", m["ts"][estable]),
+              ("PWM saturado [s]", m["t_saturado"])]
+    fig, ejes = plt.subplots(1, 3, figsize=(12, 3.5))
+    for ax, (titulo, v) in zip(ejes, series):
+        ax.hist(v[np.isfinite(v)], bins=40)
+        ax.set_title(titulo)
+    fig.suptitle(f"{resultado['meta']['sorteos']} sorteos — inestables "
+                 f"{resultado['resumen']['tasa_inestable']*100:.1f} %")
+    if ruta is not None:
+        fig.savefig(ruta, dpi=120, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+def _distribucion(texto):
+    """'I=uniforme:0.015:0.019' → ('I', ('uniforme', 0.015, 0.019))."""
+    nombre, _, resto = texto.partition("=")
+    tipo, *args = resto.split(":")
+    if nombre not in PARAMETROS or tipo not in DISTRIBUCIONES:
+        raise argparse.ArgumentTypeError(f"--dist inválida: {texto!r}")
+    return nombre, (tipo, *(float(a) for a in args))
+
+
+def main(argv=None):
+    from control_utils import ControlSystem
+
+    ap = argparse.ArgumentParser(description="Monte Carlo del lazo PIDf sobre I, C, Lm, m, r")
+    ap.add_argument("--rel", type=float, default=0.10,
+                    help="σ relativa (normal) de los parámetros sin --dist")
+    ap.add_argument("--dist", type=_distribucion, action="append", default=[],
+                    metavar="P=tipo:a[:b]",
+                    help=f"tipo ∈ {', '.join(DISTRIBUCIONES)}; se puede repetir")
+    ap.add_argument("--pid", type=float, nargs=4, metavar=("KP", "KI", "KD", "N"),
+                    help="por defecto, asignación de polos con --tss/--mp")
+    ap.add_argument("--tss", type=float, default=12.0)
+    ap.add_argument("--mp", type=float, default=0.2)
+    ap.add_argument("--ts", type=float, default=ControlSystem().Ts,
+                    help="período de muestreo [s] (por defecto el del sketch)")
+    ap.add_argument("--eq", type=float, default=0.0, help="θ_eq [°]")
+    ap.add_argument("--inicial", type=float, default=-50.0, help="[°]")
+    ap.add_argument("--ref", type=float, default=0.0, help="[°]")
+    ap.add_argument("--duracion", type=float, default=10.0, help="[s]")
+    ap.add_argument("--sorteos", type=int, default=2000)
+    ap.add_argument("--procesos", type=int, default=None)
+    ap.add_argument("--semilla", type=int, default=None)
+    ap.add_argument("--salida", help="archivo JSON con el resumen (por defecto stdout)")
+    ap.add_argument("--png", help="histogramas")
+    args = ap.parse_args(argv)
+
+    ctrl = ControlSystem()
+    ctrl.set_equilibrium_angle_deg(args.eq)
+    ganancias = args.pid or ctrl.pidf_asignacion_polos(args.tss, args.mp)
+    ctrl.set_pidf_coefs(*ganancias, args.ts)
+    distribuciones = incertidumbre_relativa(ctrl, args.rel)
+    distribuciones.update(args.dist)
+
+    r = analizar(ctrl, distribuciones, args.sorteos, np.radians(args.inicial),
+                 np.radians(args.ref), args.duracion, semilla=args.semilla,
+                 procesos=args.procesos)
+    texto = json.dumps({"resumen": r["resumen"], "meta": r["meta"],
+                        "ganancias": [float(g) for g in ganancias]}, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+    if args.png:
+        graficar_histogramas(r, args.png)
+
+
+if __name__ == "__main__":
+    main()
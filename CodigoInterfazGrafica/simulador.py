@@ -0,0 +1,178 @@
+# simulador.py  – el lazo real muestreado: planta no lineal + PIDf discreto
+# --------------------------------------------------------------------
+# En lugar de forced_response sobre el lazo lineal continuo (con 60 s de
+# pre-roll que se tiran y el PWM en una segunda pasada):
+#   • planta no lineal  I·θ'' = Lm·F + C·cos θ,  F = máx(0, m·PWM + r)
+#     (la misma que emulador_arduino.py), con topes mecánicos
+#   • cada Ts: se lee θ, el PIDf del sketch (pidf._paso, con ganancias
+#     programadas si el controlador las tiene) da el PWM recortado a
+#     1000–2000 y se mantiene constante hasta la próxima muestra (ZOH)
+#   • RK4 con `subpasos` pasos por período (con Ts = 22 ms uno alcanza:
+#     con 8 el ángulo cambia < 1e-8 rad), desde el ángulo inicial dado
+#     (sin pre-roll)
+# Una sola pasada produce ángulo, error y PWM.  El bucle es una función
+# suelta que numba compila si está (@njit); si no, Python puro con
+# `math`, que igual es >10× más rápido que el camino anterior.
+#
+#   r = simular_lazo(ctrl, ctrl.pidf, np.radians(-50), 5.0, np.radians(10))
+#   r["t"], r["angulo"], r["error"], r["pwm"]        # [s], [rad], [rad], [µs]
+# --------------------------------------------------------------------
+import math
+
+import numpy as np
+
+from pidf import HAY_NUMBA, njit, _paso, _paso_programado
+
+LIMITES_DEG = (-50.4, 50.4)        # topes mecánicos del banco (emulador)
+
+
+@njit(cache=True)
+def _simular(x, tabla, ang0, inv_paso, planta, theta0, omega0, Ts, subpasos,
+             lo, hi, ang, pwm):
+    """
+    Llena `ang` [rad] y `pwm` [µs], una muestra por período.  `x` es el
+    vector del ControladorPIDf (se rola in situ); inv_paso = 0 → sin
+    ganancias programadas (`tabla` no se usa).
+    """
+    I, C, Lm, m, r = planta
+    h = Ts / subpasos
+    h2 = 0.5 * h
+    h6 = h / 6.0
+    c = C / I                                      # θ'' = a + c·cos θ
+    th = theta0
+    om = omega0
+    for k in range(len(ang)):
+        ang[k] = th
+        if inv_paso > 0.0:
+            p = _paso_programado(x, tabla, ang0, inv_paso, math.degrees(th))
+        else:
+            p = _paso(x, math.degrees(th))
+        pwm[k] = p
+
+        fuerza = m * p + r
+        a = Lm * fuerza / I if p > 1000.0 and fuerza > 0.0 else 0.0
+        for _ in range(subpasos):                  # RK4, PWM constante
+            k1o = a + c * math.cos(th)
+            k2t = om + h2 * k1o
+            k2o = a + c * math.cos(th + h2 * om)
+            k3t = om + h2 * k2o
+            k3o = a + c * math.cos(th + h2 * k2t)
+            k4t = om + h * k3o
+            k4o = a + c * math.cos(th + h * k3t)
+            th += h6 * (om + 2.0 * (k2t + k3t) + k4t)
+            om += h6 * (k1o + 2.0 * (k2o + k3o) + k4o)
+            if th <= lo or th >= hi:               # tope: choque plástico
+                th = min(max(th, lo), hi)
+                om = 0.0
+
+
+def simular_lazo(sistema, controlador, ang_ini_rad, duracion, ref_rad=None,
+                 Ts=None, subpasos=1, omega_ini=0.0, limites_deg=LIMITES_DEG):
+    """
+    Simula `duracion` segundos del lazo cerrado desde `ang_ini_rad`.
+
+    • sistema: ControlSystem (I, C, Lm, m, r).
+    • controlador: ControladorPIDf; se usa una copia con estado en cero
+      (coeficientes, PWM_eq y, si tiene, la tabla de ganancias).
+    • ref_rad: None → la referencia del controlador.
+    • Ts: None → el Ts con que se calcularon los coeficientes.
+    • limites_deg: topes mecánicos; None → sin topes.
+    Devuelve {"t", "angulo", "error", "pwm"} (ángulo y error en rad).
+    """
+    c = controlador.copia()
+    if ref_rad is not None:
+        c.ref_rad = ref_rad
+    Ts = c.Ts if Ts is None else Ts
+    n = int(round(duracion / Ts)) + 1
+    lo, hi = (-math.inf, math.inf) if limites_deg is None else \
+        (math.radians(limites_deg[0]), math.radians(limites_deg[1]))
+    planta = tuple(float(v) for v in (sistema.I, sistema.C, sistema.Lm,
+                                      sistema.m, sistema.r))
+
+    if c._tabla is not None:
+        tabla, ang0, inv_paso = c._tabla
+    else:
+        tabla = np.zeros((2, 7)) if HAY_NUMBA else [[0.0] * 7] * 2
+        ang0, inv_paso = 0.0, 0.0
+
+    # sin numba, escribir en listas es más barato que en arreglos
+    ang = np.empty(n) if HAY_NUMBA else [0.0] * n
+    pwm = np.empty(n) if HAY_NUMBA else [0.0] * n
+    _simular(c._x, tabla, ang0, inv_paso, planta, float(ang_ini_rad),
+             float(omega_ini), float(Ts), int(subpasos), lo, hi, ang, pwm)
+    ang = np.asarray(ang)
+    return {
+        "t": np.arange(n) * Ts,
+        "angulo": ang,
+        "error": c.ref_rad - ang,
+        "pwm": np.asarray(pwm),
+    }
+
+
+# ════════════════════════════════════════════════════════════════════
+#  Muchos controladores a la vez (barridos de ganancias)
+# ════════════════════════════════════════════════════════════════════
+def simular_lote(planta, coefs, pwm_eq, ang_ini_rad, ref_rad, duracion,
+                 Ts=0.022, subpasos=1, limites_deg=LIMITES_DEG,
+                 pwm_min=1000.0, pwm_max=2000.0):
+    """
+    El mismo lazo que _simular para K juegos de coeficientes, con el
+    bucle sobre el tiempo y cada operación vectorizada sobre los K
+    (mismas operaciones en el mismo orden: con K = 1 da lo mismo que
+    simular_lazo).
+
+    • planta: (I, C, Lm, m, r); cada uno escalar o (K,) (una planta
+      por simulación, p. ej. sorteos de Monte Carlo).
+    • coefs: (K, 6) de coeficientes_pidf, o (6,) para todas.
+    • pwm_eq, ang_ini_rad, ref_rad: escalares o (K,).
+    Devuelve (t, ángulo (K, T) [rad], pwm (K, T)).
+    """
+    coefs = np.atleast_2d(np.asarray(coefs, dtype=float))
+    K = max([len(coefs)] + [np.size(v) for v in planta])
+    coefs = np.broadcast_to(coefs, (K, 6))
+    I, C, Lm, m, r = (np.broadcast_to(np.asarray(v, dtype=float), (K,))
+                      for v in planta)
+    n = int(round(duracion / Ts)) + 1
+    lo, hi = (-math.inf, math.inf) if limites_deg is None else \
+        (math.radians(limites_deg[0]), math.radians(limites_deg[1]))
+    a0, a1, a2, a3, a4, a5 = (np.ascontiguousarray(c) for c in coefs.T)
+    inv_a3 = 1.0 / a3
+    eq = np.broadcast_to(np.asarray(pwm_eq, dtype=float), (K,))
+    ref = np.broadcast_to(np.asarray(ref_rad, dtype=float), (K,))
+
+    h = Ts / subpasos
+    h2 = 0.5 * h
+    h6 = h / 6.0
+    c = C / I
+    th = np.array(np.broadcast_to(np.asarray(ang_ini_rad, dtype=float), (K,)))
+    om = np.zeros(K)
+    e1, e2, u1, u2 = (np.zeros(K) for _ in range(4))
+    ang = np.empty((K, n))
+    pwm = np.empty((K, n))
+    with np.errstate(over='ignore', invalid='ignore'):
+        for k in range(n):
+            ang[:, k] = th
+            e = ref - np.radians(np.degrees(th))     # como _paso(math.degrees(θ))
+            u = inv_a3 * (a0 * e + a1 * e1 + a2 * e2 - a4 * u1 - a5 * u2)
+            e2, e1 = e1, e
+            u2, u1 = u1, u
+            p = np.minimum(np.maximum(u + eq, pwm_min), pwm_max)
+            pwm[:, k] = p
+
+            fuerza = m * p + r
+            a = np.where((p > 1000.0) & (fuerza > 0.0), Lm * fuerza / I, 0.0)
+            for _ in range(subpasos):
+                k1o = a + c * np.cos(th)
+                k2t = om + h2 * k1o
+                k2o = a + c * np.cos(th + h2 * om)
+                k3t = om + h2 * k2o
+                k3o = a + c * np.cos(th + h2 * k2t)
+                k4t = om + h * k3o
+                k4o = a + c * np.cos(th + h * k3t)
+                th = th + h6 * (om + 2.0 * (k2t + k3t) + k4t)
+                om = om + h6 * (k1o + 2.0 * (k2o + k3o) + k4o)
+                tope = (th <= lo) | (th >= hi)
+                if tope.any():
+                    th = np.clip(th, lo, hi)
+                    om = np.where(tope, 0.0, om)
+    return np.arange(n) * Ts, ang, pwm
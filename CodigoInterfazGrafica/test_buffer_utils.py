@@ -0,0 +1,69 @@
+# test_buffer_utils.py  – RingBuffer: vuelta, desbordes y filas pisadas
+# --------------------------------------------------------------------
+#   python -m pytest -q test_buffer_utils.py
+# --------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from buffer_utils import RingBuffer
+
+
+def _bloque(desde, n):
+    return np.arange(desde, desde + n, dtype=float).astype([('v', 'f8')])
+
+
+def _valores(vistas):
+    return np.concatenate([v['v'] for v in vistas]).tolist() if vistas else []
+
+
+def test_vuelta_en_dos_vistas_en_orden():
+    buf = RingBuffer(8, dtype=[('v', 'f8')])
+    buf.escribir(_bloque(0, 6))
+    buf.consumir(6)
+    buf.escribir(_bloque(6, 5))                         # 6, 7 | 8, 9, 10
+    vistas = buf.vistas()
+    assert len(vistas) == 2
+    assert _valores(vistas) == [6, 7, 8, 9, 10]
+    assert _valores(buf.vistas(3)) == [6, 7, 8]
+    assert buf.consumir(5) == 0 and len(buf) == 0
+
+
+def test_sobrescribir_pierde_las_viejas():
+    buf = RingBuffer(8, dtype=[('v', 'f8')])
+    buf.escribir(_bloque(0, 5))
+    buf.escribir(_bloque(5, 6))                         # 3 de más
+    assert _valores(buf.vistas()) == list(range(3, 11))
+    assert buf.desbordes == 3
+    buf.escribir(_bloque(100, 20))                      # más grande que el búfer
+    assert _valores(buf.vistas()) == list(range(112, 120))
+
+
+def test_descartar_pierde_las_nuevas():
+    buf = RingBuffer(8, dtype=[('v', 'f8')], politica=RingBuffer.DESCARTAR)
+    assert buf.escribir(_bloque(0, 5)) == 5
+    assert buf.escribir(_bloque(5, 6)) == 3
+    assert _valores(buf.vistas()) == list(range(8))
+    assert buf.desbordes == 3
+
+
+def test_consumir_cuenta_las_filas_pisadas_durante_la_lectura():
+    buf = RingBuffer(8, dtype=[('v', 'f8')])
+    buf.escribir(_bloque(0, 8))
+    vistas = buf.vistas()                               # el consumidor empieza…
+    buf.escribir(_bloque(8, 3))                         # …y el productor da la vuelta
+    assert _valores(vistas)[:3] == [8, 9, 10]           # las vistas no son copias
+    assert buf.consumir(8) == 3
+    assert buf.desbordes == 3
+    assert _valores(buf.vistas()) == [8, 9, 10]
+
+
+def test_consumir_ve_la_escritura_en_curso():
+    buf = RingBuffer(8, dtype=[('v', 'f8')])
+    buf.escribir(_bloque(0, 8))
+    buf._w_reservado = buf._w + 2                       # escribir() a medio copiar
+    assert buf.consumir(4) == 2
+
+
+def test_politica_desconocida():
+    with pytest.raises(ValueError):
+        RingBuffer(8, politica='otra')
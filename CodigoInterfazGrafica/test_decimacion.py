@@ -0,0 +1,46 @@
+# test_decimacion.py  – envolvente mín/máx: tamaño acotado y picos
+# --------------------------------------------------------------------
+#   python -m pytest -q test_decimacion.py
+# --------------------------------------------------------------------
+import numpy as np
+
+from decimacion import DecimadorEnvolvente
+
+
+def test_puntos_acotados_y_min_max_exactos():
+    env = DecimadorEnvolvente(columnas=50, series=2)
+    t = np.arange(100_000) * 0.001
+    y = np.sin(t * 3.0)
+    for i in range(0, len(t), 777):                     # bloques de cualquier largo
+        env.agregar(t[i:i + 777], y[i:i + 777], -y[i:i + 777])
+    assert env.muestras == len(t)
+    assert env.t_inicio == t[0]
+    for serie, signo in ((0, 1.0), (1, -1.0)):
+        x, yy = env.curva(serie)
+        assert len(x) <= 4 * env.columnas
+        assert np.all(np.diff(x) >= 0)
+        assert yy.max() == (signo * y).max() and yy.min() == (signo * y).min()
+
+
+def test_un_pico_de_una_muestra_no_se_pierde():
+    env = DecimadorEnvolvente(columnas=20)
+    t = np.arange(50_000) * 0.001
+    y = np.zeros_like(t)
+    y[31_337] = 45.0
+    y[40_001] = -12.0
+    env.agregar(t, y)
+    x, yy = env.curva()
+    assert len(x) <= 4 * env.columnas
+    assert yy.max() == 45.0 and yy.min() == -12.0
+    pico = x[np.argmax(yy)]
+    assert abs(pico - t[31_337]) <= env.dt          # en su columna
+
+
+def test_recortar_descarta_las_columnas_viejas():
+    env = DecimadorEnvolvente(columnas=10)
+    t = np.arange(1000) * 0.01
+    env.agregar(t, t)
+    env.recortar(5.0)
+    x, yy = env.curva()
+    assert x[-1] == t[-1] and yy.max() == t[-1]
+    assert env.t_inicio > 4.0 and yy.min() > 4.0
@@ -0,0 +1,82 @@
+# test_grabador.py  – sesión en disco: ida y vuelta y reproducción
+# --------------------------------------------------------------------
+#   python -m pytest -q test_grabador.py
+# --------------------------------------------------------------------
+import os
+import time
+
+import numpy as np
+
+from buffer_utils import TELEMETRIA_DTYPE
+from grabador import GrabadorSesion, LectorSesion
+from io_utils import SerialComm
+
+
+def _telemetria(n, dt=0.022, t0=100.0):
+    b = np.zeros(n, dtype=TELEMETRIA_DTYPE)
+    b['t'] = t0 + np.arange(n) * dt
+    b['angle'] = np.sin(np.arange(n) * 0.05) * 30.0
+    b['error'] = -b['angle']
+    b['pwm_hw'] = 1500.0 + b['angle']
+    b['seq'] = np.arange(n)
+    b['t_mcu'] = np.nan
+    return b
+
+
+def test_ida_y_vuelta_en_bloques(tmp_path):
+    ruta = str(tmp_path / "s")
+    datos = _telemetria(1000)
+    g = GrabadorSesion(ruta, filas_por_bloque=64)      # obliga a agrandar
+    lector = LectorSesion(ruta)
+    for i in range(0, len(datos), 300):
+        g.agregar(datos[i:i + 300])
+        assert lector.actualizar() == min(i + 300, len(datos))   # en vivo
+    assert not lector.cerrada
+    g.cerrar()
+    assert lector.cerrada
+    for c in TELEMETRIA_DTYPE.names:
+        np.testing.assert_array_equal(lector[c], datos[c])
+    assert os.path.getsize(os.path.join(ruta, "angle.bin")) == 8 * len(datos)
+
+
+def _reproducir(ruta, velocidad, capacidad=16384):
+    comm = SerialComm(reproducir=ruta, velocidad=velocidad, capacidad=capacidad)
+    leidas = []
+    fin = None
+    t0 = time.perf_counter()
+    comm.start()
+    try:
+        while True:
+            if fin is None and not comm.queue.empty():
+                fin = comm.queue.get_nowait()        # sale tras el último bloque
+            for vista in comm.rx_buffer.vistas():
+                leidas.append(vista.copy())
+                comm.rx_buffer.consumir(len(vista))
+            if fin is not None and not len(comm.rx_buffer):
+                break
+            assert time.perf_counter() - t0 < 10.0
+            time.sleep(0.005)
+    finally:
+        comm.stop()
+    return np.concatenate(leidas), time.perf_counter() - t0, fin
+
+
+def test_reproduccion_respeta_la_velocidad(tmp_path):
+    ruta = str(tmp_path / "s")
+    datos = _telemetria(100)                            # 2.18 s grabados
+    with GrabadorSesion(ruta) as g:
+        g.agregar(datos)
+    filas, segundos, evento = _reproducir(ruta, velocidad=4.0)
+    assert evento == ("REPRODUCCION_FIN", ruta)
+    np.testing.assert_array_equal(filas['t'], datos['t'])   # tiempos originales
+    np.testing.assert_array_equal(filas['angle'], datos['angle'])
+    assert 0.45 <= segundos <= 1.5                      # 2.18 s / 4
+
+
+def test_reproduccion_sin_velocidad_no_pisa_nada(tmp_path):
+    ruta = str(tmp_path / "s")
+    datos = _telemetria(5000)
+    with GrabadorSesion(ruta) as g:
+        g.agregar(datos)
+    filas, _, _ = _reproducir(ruta, velocidad=None, capacidad=1024)
+    np.testing.assert_array_equal(filas['seq'], datos['seq'])
@@ -0,0 +1,70 @@
+# test_identificacion.py  – IdentificadorRLS contra el emulador del sketch
+# --------------------------------------------------------------------
+# La telemetría sale del loop() de EmuladorArduino (rampa del ESC,
+# período alargado por la rampa, PIDf del sketch) con la referencia
+# alternando ±20° cada 4 s.  Sin ruido y con la planta nominal no tiene
+# que aparecer ninguna sugerencia; con m cambiado, sí.
+#
+#   python -m pytest -q test_identificacion.py
+# --------------------------------------------------------------------
+import math
+
+import numpy as np
+
+from control_utils import ControlSystem
+from emulador_arduino import EmuladorArduino
+from identificacion import IdentificadorRLS
+
+
+def _telemetria(planta, con_tiempo, duracion=80.0):
+    """(ang, pwm_hw, seq, t_mcu) de `duracion` segundos emulados."""
+    emu = EmuladorArduino(planta, tiempo_real=False, con_tiempo=con_tiempo)
+    emu.controlActivo = True
+    emu._calcular_pidf_completo()
+    emu._leer_datos_desde_pc = lambda: (False, None)
+    filas = []
+
+    def enviar(ang_deg, err_deg, pwm):
+        ms = round((emu.t_sim + emu._t_cuerpo) * 1000.0)
+        filas.append((ang_deg, pwm, len(filas),
+                      ms / 1000.0 if con_tiempo else math.nan))
+        ref = 20.0 if (emu.t_sim // 4.0) % 2 else -20.0
+        emu.anguloReferencia_rad = math.radians(ref)
+        emu._vivo = emu.t_sim < duracion
+
+    emu._enviar_datos_a_la_pc = enviar
+    emu._vivo = True
+    emu._loop()
+    return np.array(filas).T
+
+
+def _identificar(ctrl, ang, pwm, seq, t_mcu, bloque=50):
+    ident = IdentificadorRLS(ctrl)
+    for i in range(0, len(seq), bloque):
+        s = slice(i, i + bloque)
+        ident.agregar(ang[s], pwm[s], seq[s], t_mcu[s])
+    return ident
+
+
+def test_planta_nominal_sin_sugerencia():
+    ctrl = ControlSystem()
+    for con_tiempo in (False, True):
+        ident = _identificar(ctrl, *_telemetria(ControlSystem(), con_tiempo))
+        assert ident.muestras >= ident.min_muestras
+        assert ident.sugerencia(ctrl) == {}
+        assert all(abs(d) < 0.01 for d in ident.deriva(ctrl).values())
+
+
+def test_toma_ts_del_sistema():
+    ctrl = ControlSystem()
+    assert IdentificadorRLS(ctrl).Ts == ctrl.Ts
+
+
+def test_detecta_cambio_de_m():
+    ctrl = ControlSystem()
+    planta = ControlSystem()
+    planta.set_parametros_fisicos(m=1.15 * ctrl.m)
+    ident = _identificar(ctrl, *_telemetria(planta, con_tiempo=False))
+    sugerencia = ident.sugerencia(ctrl)
+    assert set(sugerencia) == {"m"}
+    assert abs(sugerencia["m"] / planta.m - 1.0) < 0.01
@@ -0,0 +1,77 @@
+# test_pidf.py  – paso, lote y pwm_pidf_lote dan lo mismo bit a bit
+# --------------------------------------------------------------------
+# lote() y pwm_pidf_lote() son exactos por defecto (misma recurrencia
+# que paso()); exacto=False es el modo rápido con lfilter, que puede
+# diferir en el último bit.  simular_lote con un solo juego de
+# ganancias es simular_lazo.
+#
+#   python -m pytest -q test_pidf.py
+# --------------------------------------------------------------------
+import numpy as np
+
+from control_utils import ControlSystem
+from pidf import LOTE_LFILTER, ControladorPIDf, coeficientes_pidf, pwm_pidf_lote
+from simulador import simular_lazo, simular_lote
+
+
+def _controlador():
+    c = ControladorPIDf(pwm_eq=1480.0)
+    c.set_ganancias(5.9067, 0.2765, 30.9819, 10.0, 0.022)
+    c.ref_rad = np.radians(10.0)
+    return c
+
+
+def _angulos(n=3 * LOTE_LFILTER + 17, semilla=1):
+    rng = np.random.default_rng(semilla)
+    return np.cumsum(rng.normal(0.0, 2.0, n)) - 40.0     # satura a ratos
+
+
+def test_lote_igual_a_paso_bit_a_bit():
+    ang = _angulos()
+    c = _controlador()
+    uno_a_uno = np.array([c.paso(a) for a in ang])
+    d = _controlador()
+    # bloques chicos y grandes (≥ LOTE_LFILTER): el por defecto es exacto
+    partes = [d.lote(b) for b in np.split(ang, [5, 5 + 2 * LOTE_LFILTER])]
+    assert np.array_equal(np.concatenate(partes), uno_a_uno)
+    assert d.estado == c.estado
+
+
+def test_pwm_pidf_lote_exacto_por_defecto():
+    ang = _angulos()
+    c = _controlador()
+    uno_a_uno = np.array([c.paso(a) for a in ang])
+    pwm, estado = pwm_pidf_lote(ang, c.coeficientes, c.ref_rad, c.pwm_eq)
+    assert np.array_equal(pwm, uno_a_uno)
+    assert tuple(estado) == c.estado
+
+
+def test_modo_rapido_cerca():
+    ang = _angulos()
+    exacto = _controlador().lote(ang)
+    rapido = _controlador().lote(ang, exacto=False)
+    np.testing.assert_allclose(rapido, exacto, rtol=0, atol=1e-6)
+
+
+def test_lote_muchas_ganancias():
+    ang = _angulos(200)
+    kps = (1.0, 3.0, 5.9067)
+    coefs = np.array([coeficientes_pidf(kp, 0.2765, 30.9819, 10.0, 0.022) for kp in kps])
+    pwm, _ = pwm_pidf_lote(ang, coefs, np.radians(10.0), 1480.0)
+    for fila, kp in zip(pwm, kps):
+        c = _controlador()
+        c.set_ganancias(kp, 0.2765, 30.9819, 10.0, 0.022)
+        assert np.array_equal(fila, [c.paso(a) for a in ang])
+
+
+def test_simular_lote_igual_a_simular_lazo():
+    ctrl = ControlSystem()
+    ctrl.set_pidf_coefs(*ctrl.pidf_asignacion_polos(12.0, 0.2), ctrl.Ts)
+    ang0, ref = np.radians(-50.0), np.radians(10.0)
+    r = simular_lazo(ctrl, ctrl.pidf, ang0, 5.0, ref)
+    t, ang, pwm = simular_lote((ctrl.I, ctrl.C, ctrl.Lm, ctrl.m, ctrl.r),
+                               ctrl.pidf.coeficientes, ctrl.pidf.pwm_eq,
+                               ang0, ref, 5.0, Ts=ctrl.pidf.Ts)
+    np.testing.assert_array_equal(t, r["t"])
+    assert np.array_equal(ang[0], r["angulo"])
+    assert np.array_equal(pwm[0], r["pwm"])
@@ -0,0 +1,85 @@
+# test_protocolo.py  – parser de tramas (texto y binaria) y CRC
+# --------------------------------------------------------------------
+# Los bytes entran por data_received() como los entrega ReaderThread,
+# partidos en cualquier lugar; lo que sale se lee del búfer circular.
+#
+#   python -m pytest -q test_protocolo.py
+# --------------------------------------------------------------------
+import queue
+
+import numpy as np
+
+from buffer_utils import RingBuffer
+from io_utils import (_BinaryProtocol, _LineProtocol, _crc16_ccitt_bloque,
+                      crc16_ccitt, empaquetar_trama_binaria)
+
+
+def _protocolo(clase=_BinaryProtocol):
+    eventos, buf = queue.Queue(), RingBuffer(1024)
+    p = clase(eventos, buf, lambda bloque: None, baud=115200)
+    return p, buf, eventos
+
+
+def _leer(buf):
+    vistas = buf.vistas()
+    filas = np.concatenate(vistas) if vistas else np.zeros(0, buf.dtype)
+    buf.consumir(len(filas))
+    return filas
+
+
+def test_crc_ccitt_false():
+    assert crc16_ccitt(b"123456789") == 0x29B1          # valor de referencia
+    cuerpos = np.frombuffer(b"123456789" * 3, dtype=np.uint8).reshape(3, 9)
+    assert (_crc16_ccitt_bloque(cuerpos) == 0x29B1).all()
+
+
+def test_texto_en_pedazos():
+    p, buf, eventos = _protocolo(_LineProtocol)
+    datos = b"#-45.1234,-60.1234,1523.4567\r\n#1.5,2.5,1600,1234\r\n"
+    for i in range(0, len(datos), 7):
+        p.data_received(datos[i:i + 7])
+    filas = _leer(buf)
+    assert filas['angle'].tolist() == [-45.1234, 1.5]
+    assert filas['pwm_hw'].tolist() == [1523.4567, 1600.0]
+    assert filas['seq'].tolist() == [0, 1]
+    assert np.isnan(filas['t_mcu'][0]) and filas['t_mcu'][1] == 1.234
+    assert eventos.empty() and p.tramas_rechazadas == 0
+
+
+def test_texto_rechazos_y_banner():
+    p, buf, eventos = _protocolo(_LineProtocol)
+    p.data_received(b"#1,2\n#1,x,3\nhola\nCalibre el ESC\n#4,5,1500\n")
+    assert _leer(buf)['angle'].tolist() == [4.0]
+    assert p.rechazos == {'campos': 1, 'numero': 1, 'desconocida': 1}
+    assert eventos.get_nowait()[0] == "ESC_WARNING"
+
+
+def test_binaria_crc_y_resincronizacion():
+    p, buf, _ = _protocolo()
+    buenas = [empaquetar_trama_binaria(s, s * 1.25, -s, 1500 + s) for s in range(4)]
+    mala = bytearray(empaquetar_trama_binaria(9, 0, 0, 1500))
+    mala[-1] ^= 0xFF                                    # CRC roto
+    p.data_received(buenas[0] + buenas[1] + bytes(mala) + buenas[2] + buenas[3])
+    filas = _leer(buf)
+    assert filas['angle'].tolist() == [0.0, 1.25, 2.5, 3.75]
+    assert filas['pwm_hw'].tolist() == [1500.0, 1501.0, 1502.0, 1503.0]
+    assert p.rechazos['crc'] >= 1 and p.formato == 'binario'
+
+
+def test_binaria_secuencia_y_millis_dan_la_vuelta():
+    p, buf, _ = _protocolo()
+    seqs = [254, 255, 0, 2]                             # falta la 1
+    ms = [65534, 65535, 0, 40]
+    p.data_received(b"".join(empaquetar_trama_binaria(s, 0, 0, 1500, t)
+                             for s, t in zip(seqs, ms)))
+    filas = _leer(buf)
+    assert np.diff(filas['seq']).tolist() == [1, 1, 2]
+    assert p.tramas_perdidas == 1
+    assert np.allclose(np.diff(filas['t_mcu']), [0.001, 0.001, 0.040])
+
+
+def test_binaria_y_texto_mezclados():
+    p, buf, _ = _protocolo()
+    p.data_received(b"#1,0,1500\n" + empaquetar_trama_binaria(7, 2.0, 0, 1500)
+                    + b"#3,0,1500\n")
+    assert _leer(buf)['angle'].tolist() == [1.0, 2.0, 3.0]
@@ -0,0 +1,62 @@
+# test_tx.py  – cola TX: fusión de consignas de PWM y espera del cable
+# --------------------------------------------------------------------
+#   python -m pytest -q test_tx.py
+# --------------------------------------------------------------------
+import math
+import threading
+import time
+
+from io_utils import SerialComm, _ColaTX, _EscritorTX
+
+
+def _comandos(cola):
+    return [datos for datos, _, _ in cola._cola]
+
+
+def test_fusiona_solo_la_misma_clase():
+    cola = _ColaTX()
+    cola.encolar(b"p1", ("pwm", "1"))
+    cola.encolar(b"p2", ("pwm", "1"))
+    cola.encolar(b"p3", ("pwm", "1"))                 # la clave sobrevive a la fusión
+    cola.encolar(b"parametros")
+    cola.encolar(b"p4", ("pwm", "1"))
+    cola.encolar(b"p5", ("pwm", "0"))                 # otro toggle: no se pisa
+    assert _comandos(cola) == [b"p3", b"parametros", b"p4", b"p5"]
+    assert cola.comandos_coalescidos == 2
+
+
+def test_send_pidf_data_no_pisa_un_cambio_de_toggle():
+    comm = SerialComm(port=None)
+    comm._tx = _ColaTX()
+    nan = (math.nan,) * 6
+    comm.send_pidf_data(*nan, 1500, 1)
+    comm.send_pidf_data(*nan, 1510, 1)
+    comm.send_pidf_data(*nan, 1520, 0)
+    comm.send_pidf_data(12, 0.2, 1, 1, 1, 10, 1530, 0)  # con parámetros
+    lineas = [c.decode().split(",") for c in _comandos(comm._tx)]
+    assert [(l[6], l[7]) for l in lineas] == [("1510.0000", "1.0000\n"),
+                                              ("1520.0000", "0.0000\n"),
+                                              ("1530.0000", "0.0000\n")]
+
+
+def test_escritor_espera_el_cable_y_fusiona():
+    escritos = []
+    primero = threading.Event()
+
+    def escribir(datos):
+        escritos.append(datos)
+        primero.set()
+
+    # 9600 baud: cada comando de 10 bytes ocupa el cable ~10 ms
+    tx = _EscritorTX(escribir, baud=9600)
+    tx.start()
+    tx.encolar(b"x" * 10, ("pwm", "1"), time.perf_counter())
+    primero.wait(1.0)
+    for i in range(20):                                # llegan mientras sale el 1º
+        tx.encolar(b"%09d" % i + b"\n", ("pwm", "1"), time.perf_counter())
+    tx.detener(timeout=1.0)
+    assert escritos[-1] == b"000000019\n"
+    assert len(escritos) < 5 and tx.comandos_coalescidos > 15
+    # la latencia incluye el tiempo de cable, no sólo la vuelta de write()
+    assert tx.estad_latencia.n == len(escritos)
+    assert tx.estad_latencia.maximo >= 10 * 10 / 9600
@@ -39,6 +39,88 @@ void enviarDatosSerial(float* vector, int cantidad) {
 // === Función para comunicación de datos específicos ===
 #include <math.h>  // Para isnan()
 
+// === Negociación de baud rate con la PC ===
+// La PC manda comandos de enlace como líneas "nan,nan,$CMD[,arg]":
+// con el prefijo "nan,nan" un sketch viejo los descarta (no hay ningún
+// campo válido) en lugar de tomar "$BAUD" como Tss = 0.
+//   PC: nan,nan,$BAUD,<baud>  →  $OK,<baud>   (a la velocidad vieja)
+//       ... ambos pasan a <baud> ...
+//   PC: nan,nan,$PING         →  $PONG,<baud> (a la velocidad nueva)
+// Si el $PING no llega en TIMEOUT_PING_MS se vuelve a la velocidad
+// anterior: un cable o adaptador que no soporta <baud> no deja al
+// Arduino mudo.  Mientras se espera el $PING el loop queda detenido
+// (se negocia al conectar, antes de arrancar el control).
+static const uint32_t BAUDIOS_PERMITIDOS[] = {115200, 250000, 500000, 1000000};
+static const unsigned long TIMEOUT_PING_MS = 500;
+uint32_t baudiosActuales = BAUD_INICIAL;
+
+static bool esBaudPermitido(uint32_t baud) {
+    for (uint8_t i = 0; i < sizeof(BAUDIOS_PERMITIDOS) / sizeof(BAUDIOS_PERMITIDOS[0]); i++) {
+        if (BAUDIOS_PERMITIDOS[i] == baud) return true;
+    }
+    return baud == BAUD_INICIAL;
+}
+
+static void responderEnlace(const char* cmd, uint32_t baud) {
+    Serial.print(cmd); Serial.print(","); Serial.println(baud);
+}
+
+// Espera una línea con "$PING" a la velocidad nueva y contesta $PONG.
+static bool esperarPing(uint32_t baud) {
+    char linea[24];
+    uint8_t i = 0;
+    unsigned long t0 = millis();
+    while (millis() - t0 < TIMEOUT_PING_MS) {
+        if (!Serial.available()) continue;
+        char c = Serial.read();
+        if (c == '\r') continue;
+        if (c != '\n') {
+            if (i < sizeof(linea) - 1) linea[i++] = c;
+            continue;
+        }
+        linea[i] = '\0';
+        i = 0;
+        if (strstr(linea, "$PING")) {
+            responderEnlace("$PONG", baud);
+            Serial.flush();
+            return true;
+        }
+    }
+    return false;
+}
+
+// Devuelve true si la línea era un comando de enlace (ya atendido).
+static bool procesarComandoEnlace(const char* linea) {
+    const char* cmd = strchr(linea, '$');
+    if (!cmd) return false;
+
+    if (strncmp(cmd, "$BAUD,", 6) == 0) {
+        uint32_t nuevo = strtoul(cmd + 6, nullptr, 10);
+        if (!esBaudPermitido(nuevo)) {
+            responderEnlace("$ERR", nuevo);
+            return true;
+        }
+        responderEnlace("$OK", nuevo);
+        Serial.flush();                     // que el $OK salga a la velocidad vieja
+        uint32_t anterior = baudiosActuales;
+        Serial.end();
+        Serial.begin(nuevo);
+        if (esperarPing(nuevo)) {
+            baudiosActuales = nuevo;
+        } else {
+            Serial.end();
+            Serial.begin(anterior);         // vuelta segura
+        }
+        return true;
+    }
+    if (strncmp(cmd, "$PING", 5) == 0) {
+        responderEnlace("$PONG", baudiosActuales);
+        return true;
+    }
+    return true;                            // comando desconocido: se ignora
+}
+
+
 bool leerDatosDesdePC(float& Tss_ref, float& Mp_ref,
                       float& kp_pc, float& ki_pc,
                       float& kd_pc, float& n_pc,
@@ -55,6 +137,8 @@ bool leerDatosDesdePC(float& Tss_ref, float& Mp_ref,
             buf[idx] = '\0';
             idx = 0;
             // acá tenés una línea completa en buf[]
+            if (procesarComandoEnlace(buf)) return false;
+
             float datos[10];
             int leidos = 0;
             char *tok = strtok(buf, ",");
@@ -122,3 +206,55 @@ void enviarDatosALaPC(float angulo_deg, float error_deg, float pwm) {
     Serial.println(pwm, 4);
 }
 
+// Igual que enviarDatosALaPC pero con millis() como 4º campo,
+// así la PC conoce el instante real de muestreo.
+void enviarDatosALaPCConTiempo(float angulo_deg, float error_deg, float pwm) {
+    Serial.print("#");
+    Serial.print(angulo_deg, 4); Serial.print(",");
+    Serial.print(error_deg, 4);  Serial.print(",");
+    Serial.print(pwm, 4);        Serial.print(",");
+    Serial.println(millis());
+}
+
+
+
+// === Trama binaria compacta (11 bytes, o 13 con tiempo) ===
+// AA 55 | seq | ang*100 (int16) | err*100 (int16) | pwm*10 (int16) | CRC16
+// AA 56 | seq | ang*100 | err*100 | pwm*10 | millis() & 0xFFFF (uint16) | CRC16
+// El CRC-16/CCITT-FALSE cubre desde seq hasta el último campo
+// (little-endian, igual que el AVR).
+uint16_t crc16_ccitt(const uint8_t* datos, uint8_t largo) {
+    uint16_t crc = 0xFFFF;
+    for (uint8_t i = 0; i < largo; i++) {
+        crc ^= (uint16_t)datos[i] << 8;
+        for (uint8_t b = 0; b < 8; b++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+        }
+    }
+    return crc;
+}
+
+void enviarDatosALaPCBinario(float angulo_deg, float error_deg, float pwm,
+                             bool conTiempo) {
+    static uint8_t seq = 0;
+    uint8_t trama[13];
+    uint8_t largo = conTiempo ? 13 : 11;
+    int16_t ang = (int16_t)lround(angulo_deg * 100.0f);
+    int16_t err = (int16_t)lround(error_deg * 100.0f);
+    int16_t pw  = (int16_t)lround(pwm * 10.0f);
+
+    trama[0] = 0xAA;
+    trama[1] = conTiempo ? 0x56 : 0x55;
+    trama[2] = seq++;
+    memcpy(&trama[3], &ang, 2);
+    memcpy(&trama[5], &err, 2);
+    memcpy(&trama[7], &pw,  2);
+    if (conTiempo) {
+        uint16_t ms = (uint16_t)millis();
+        memcpy(&trama[9], &ms, 2);
+    }
+    uint16_t crc = crc16_ccitt(&trama[2], largo - 4);
+    memcpy(&trama[largo - 2], &crc, 2);
+
+    Serial.write(trama, largo);
+}
@@ -3,6 +3,11 @@
 
 #include <Arduino.h>
 
+// Velocidad con la que arranca el sketch y a la que se vuelve si falla
+// la negociación ($BAUD / $PING, ver CodigoComunicacionSoftware.cpp)
+#define BAUD_INICIAL 9600UL
+extern uint32_t baudiosActuales;
+
 void recibirDatosSerial(float* vector, int maxValores, int* cantidadLeida);
 void enviarDatosSerial(float* vector, int cantidad);
 
@@ -11,5 +16,9 @@ bool leerDatosDesdePC(float& Tss_ref, float& Mp_ref,
                       float& kp_pc, float& ki_pc, float& kd_pc, float& n_pc,
                       float& pwm_pc, bool& toggle_pc);
 void enviarDatosALaPC(float angulo_deg, float error_deg, float pwm);
+void enviarDatosALaPCConTiempo(float angulo_deg, float error_deg, float pwm);
+void enviarDatosALaPCBinario(float angulo_deg, float error_deg, float pwm,
+                             bool conTiempo = false);
+uint16_t crc16_ccitt(const uint8_t* datos, uint8_t largo);
 
 #endif
@@ -14,6 +14,13 @@ const float I  = 0.0167f;
 const float m  = 0.001586f;
 const float r  = -1.692631f;
 
+// === Telemetría ===
+// 1 = trama binaria de 11 bytes (entra holgada a 9600 baud),
+// 0 = texto "#ang,err,pwm" (≈30 bytes, satura el enlace a ~45 Hz)
+#define TELEMETRIA_BINARIA 0
+// 1 = agrega millis() a cada trama (la PC mide el jitter real del lazo)
+#define TELEMETRIA_CON_TIEMPO 0
+
 // === Tiempos ===
 const float T = 22.0f;                     // [ms] período de muestreo
 const float T_procesamiento_total = 1.0f;  // [ms] tiempo de cómputo estimado
@@ -103,7 +110,7 @@ void calcularPIDfCompleto(float ang_eq, float Mp_val, float Tss_val) {
 
 // ----------------------------------------------------------------------
 void setup() {
-    Serial.begin(9600);
+    Serial.begin(BAUD_INICIAL);   // la PC puede pedir más ($BAUD)
     pinMode(pin_test_tiempo_muestreo, OUTPUT);
 
     inicializarMotor();
@@ -212,7 +219,14 @@ void loop() {
     }
 
     // 8) Enviar datos a PC
+#if TELEMETRIA_BINARIA
+    enviarDatosALaPCBinario(anguloActual_deg, errorActual_deg, pwmAplicado,
+                            TELEMETRIA_CON_TIEMPO);
+#elif TELEMETRIA_CON_TIEMPO
+    enviarDatosALaPCConTiempo(anguloActual_deg, errorActual_deg, pwmAplicado);
+#else
     enviarDatosALaPC(anguloActual_deg, errorActual_deg, pwmAplicado);
+#endif
 
     digitalWrite(pin_test_tiempo_muestreo, LOW);
 }
\ No newline at end of file